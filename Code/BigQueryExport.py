@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+BigQueryExport.py
+
+Export BigQuery tables to local Parquet files, in parallel and page by page.
+
+GetAllTablesBigquery.py runs `SELECT *` on each table in turn and keeps every
+table as a DataFrame in one dict, so the largest table (and then all of
+them) must fit in memory, and an interrupted run starts over. Here:
+
+* tables are exported concurrently (a thread per table, up to --workers);
+* each table is read with list_rows() (the tabledata API, which needs no
+  query job) one page at a time. Each page goes straight to its own Parquet
+  part file, so memory is bounded by page_rows x workers;
+* every table directory has a _manifest.json recording the committed parts.
+  Parts are written to a temporary name and renamed, and the manifest is
+  rewritten after each part. An interrupted export resumes from the first
+  missing row (list_rows start_index). A table whose row count changed since
+  the manifest was written is exported again from scratch;
+* every page is cast to one Arrow schema derived from the BigQuery schema,
+  so the parts of a table always concatenate.
+
+Layout: OUTPUT_DIR/<dataset>/<table>/part-<start row>.parquet + _manifest.json.
+Read a table back with read_table() or pd.read_parquet(<table dir>).
+
+The client is passed in, and only this part of google.cloud.bigquery.Client
+is used, so a fake client can stand in for tests:
+    list_datasets(project) -> items with .dataset_id
+    list_tables(dataset_id) -> items with .table_id
+    get_table(table_id) -> object with .num_rows and .schema
+        (SchemaField-like: .name, .field_type, .mode)
+    list_rows(table, start_index=, page_size=) -> iterator with .pages,
+        each page an iterable of Row objects (mapping-like, .items()).
+    When the iterator has to_arrow_iterable() (the real client), pages are
+    taken from it as Arrow record batches instead.
+
+Usage:
+    python BigQueryExport.py OUTPUT_DIR [--project imi-datathon] [--credentials key.json]
+                             [--dataset IMI_Dataset ...] [--table abm ...]
+                             [--workers 4] [--page-rows 100000]
+"""
+
+import argparse
+import glob
+import json
+import os
+import shutil
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PROJECT = "imi-datathon"
+PAGE_ROWS = 100_000
+WORKERS = 4
+MANIFEST = "_manifest.json"
+
+# BigQuery column type -> Arrow type. Unlisted types are exported as strings.
+ARROW_TYPES = {
+    "STRING": pa.string(),
+    "INTEGER": pa.int64(), "INT64": pa.int64(),
+    "FLOAT": pa.float64(), "FLOAT64": pa.float64(),
+    "NUMERIC": pa.float64(), "BIGNUMERIC": pa.float64(),
+    "BOOLEAN": pa.bool_(), "BOOL": pa.bool_(),
+    "DATE": pa.date32(),
+    "DATETIME": pa.timestamp("us"),
+    "TIMESTAMP": pa.timestamp("us", tz="UTC"),
+    "TIME": pa.time64("us"),
+    "BYTES": pa.binary(),
+}
+
+
+def make_client(project=PROJECT, credentials=None):
+    """A google.cloud.bigquery.Client, from a service-account file when given."""
+    from google.cloud import bigquery
+
+    if credentials is None:
+        return bigquery.Client(project=project)
+    from google.oauth2 import service_account
+
+    scoped = service_account.Credentials.from_service_account_file(
+        credentials, scopes=["https://www.googleapis.com/auth/bigquery"])
+    return bigquery.Client(project=project, credentials=scoped)
+
+
+def arrow_schema(fields):
+    """Arrow schema of a BigQuery schema (REPEATED fields become lists)."""
+    columns = []
+    for field in fields:
+        arrow_type = ARROW_TYPES.get(field.field_type.upper(), pa.string())
+        if (field.mode or "").upper() == "REPEATED":
+            arrow_type = pa.list_(arrow_type)
+        columns.append(pa.field(field.name, arrow_type))
+    return pa.schema(columns)
+
+
+def _page_tables(rows):
+    """Yield one Arrow table per page of a list_rows() iterator."""
+    if hasattr(rows, "to_arrow_iterable"):
+        for batch in rows.to_arrow_iterable():
+            yield pa.Table.from_batches([batch])
+        return
+    for page in rows.pages:
+        records = [dict(row.items()) for row in page]
+        if records:
+            yield pa.Table.from_pylist(records)
+
+
+def _conform(table, schema):
+    """Cast a page to the table's schema (missing columns become nulls)."""
+    columns = []
+    for field in schema:
+        if field.name in table.column_names:
+            column = table[field.name]
+            if column.type != field.type:
+                try:
+                    column = column.cast(field.type)
+                except (pa.ArrowInvalid, pa.ArrowNotImplementedError):
+                    if not pa.types.is_string(field.type):
+                        raise
+                    column = pa.array([None if value is None else str(value) for value in column.to_pylist()],
+                                      pa.string())
+        else:
+            column = pa.nulls(len(table), field.type)
+        columns.append(column)
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def _write_json(path, payload):
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as handle:
+        json.dump(payload, handle, indent=1)
+    os.replace(temporary, path)
+
+
+def _read_manifest(directory):
+    path = os.path.join(directory, MANIFEST)
+    if not os.path.exists(path):
+        return None
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def export_table(client, table_id, output_dir, page_rows=PAGE_ROWS):
+    """
+    Export one table to Parquet parts, resuming a previous partial export.
+
+    Args:
+        client: BigQuery client (or a fake; see the module docstring).
+        table_id (str): "project.dataset.table".
+        output_dir (str): Root output directory.
+        page_rows (int): Rows per page (and per part file).
+
+    Returns:
+        dict: table, rows, parts, resumed_from (row), skipped (already
+        complete), seconds.
+    """
+    start = time.perf_counter()
+    _, dataset, name = table_id.split(".")
+    directory = os.path.join(output_dir, dataset, name)
+    table = client.get_table(table_id)
+    schema = arrow_schema(table.schema)
+
+    manifest = _read_manifest(directory)
+    if manifest is not None and manifest.get("num_rows") != table.num_rows:
+        # The table changed since the partial export: start over.
+        shutil.rmtree(directory)
+        manifest = None
+    if manifest is not None and manifest["complete"]:
+        return {"table": table_id, "rows": manifest["rows"], "parts": len(manifest["parts"]),
+                "resumed_from": manifest["rows"], "skipped": True, "seconds": time.perf_counter() - start}
+    os.makedirs(directory, exist_ok=True)
+    if manifest is None:
+        manifest = {"table": table_id, "num_rows": table.num_rows, "schema": schema.to_string(),
+                    "parts": [], "rows": 0, "complete": False}
+    # Files not in the manifest are leftovers of an interrupted write.
+    committed = {part["file"] for part in manifest["parts"]}
+    for path in glob.glob(os.path.join(directory, "part-*")):
+        if os.path.basename(path) not in committed:
+            os.remove(path)
+
+    resumed_from = manifest["rows"]
+    rows = client.list_rows(table, start_index=resumed_from, page_size=page_rows)
+    for page in _page_tables(rows):
+        page = _conform(page, schema)
+        filename = f"part-{manifest['rows']:012d}.parquet"
+        temporary = os.path.join(directory, filename + ".tmp")
+        pq.write_table(page, temporary)
+        os.replace(temporary, os.path.join(directory, filename))
+        manifest["parts"].append({"file": filename, "start": manifest["rows"], "rows": page.num_rows})
+        manifest["rows"] += page.num_rows
+        _write_json(os.path.join(directory, MANIFEST), manifest)
+    if not manifest["parts"]:
+        # An empty table still gets one (empty) part, so read_table() keeps its schema.
+        filename = f"part-{0:012d}.parquet"
+        pq.write_table(schema.empty_table(), os.path.join(directory, filename))
+        manifest["parts"].append({"file": filename, "start": 0, "rows": 0})
+    manifest["complete"] = True
+    _write_json(os.path.join(directory, MANIFEST), manifest)
+    return {"table": table_id, "rows": manifest["rows"], "parts": len(manifest["parts"]),
+            "resumed_from": resumed_from, "skipped": False, "seconds": time.perf_counter() - start}
+
+
+def list_table_ids(client, project, datasets=None, tables=None):
+    """Full ids of the tables to export (optionally restricted by dataset / table name)."""
+    table_ids = []
+    for dataset in client.list_datasets(project):
+        if datasets and dataset.dataset_id not in datasets:
+            continue
+        for table in client.list_tables(dataset.dataset_id):
+            if tables and table.table_id not in tables:
+                continue
+            table_ids.append(f"{project}.{dataset.dataset_id}.{table.table_id}")
+    return table_ids
+
+
+def export_tables(client, table_ids, output_dir, workers=WORKERS, page_rows=PAGE_ROWS):
+    """
+    Export tables concurrently.
+
+    Returns:
+        list: export_table() results, plus an "error" entry for each table
+        that failed (the others still complete; rerun to resume the failed ones).
+    """
+    results = []
+    lock = threading.Lock()
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        futures = {pool.submit(export_table, client, table_id, output_dir, page_rows): table_id
+                   for table_id in table_ids}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"table": futures[future], "error": f"{type(e).__name__}: {e}"}
+            with lock:
+                results.append(result)
+            print(_describe(result), flush=True)
+    return sorted(results, key=lambda result: result["table"])
+
+
+def _describe(result):
+    if "error" in result:
+        return f"{result['table']}: FAILED ({result['error']})"
+    if result["skipped"]:
+        return f"{result['table']}: already exported ({result['rows']:,} rows)"
+    resumed = f", resumed at row {result['resumed_from']:,}" if result["resumed_from"] else ""
+    return (f"{result['table']}: {result['rows']:,} rows in {result['parts']} parts, "
+            f"{result['seconds']:.1f}s{resumed}")
+
+
+def read_table(output_dir, dataset, table):
+    """An exported table as a DataFrame (its parts in row order)."""
+    return pd.read_parquet(os.path.join(output_dir, dataset, table))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export BigQuery tables to local Parquet files.")
+    parser.add_argument("output_dir")
+    parser.add_argument("--project", default=PROJECT)
+    parser.add_argument("--credentials", help="Service-account JSON key (default: application credentials)")
+    parser.add_argument("--dataset", action="append", help="Only these datasets (repeatable)")
+    parser.add_argument("--table", action="append", help="Only these table names (repeatable)")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--page-rows", type=int, default=PAGE_ROWS)
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    client = make_client(args.project, args.credentials)
+    table_ids = list_table_ids(client, args.project, args.dataset, args.table)
+    print(f"Exporting {len(table_ids)} tables to {args.output_dir} with {args.workers} workers")
+    results = export_tables(client, table_ids, args.output_dir, args.workers, args.page_rows)
+    failed = [result for result in results if "error" in result]
+    rows = sum(result.get("rows", 0) for result in results)
+    print(f"Done in {time.perf_counter() - start:.1f}s: {rows:,} rows, {len(failed)} failed tables")
+    if failed:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,30 @@
-from google.cloud import bigquery
-from google.oauth2 import service_account
+import datetime
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# Local query result cache (see QueryCache).
+DEFAULT_CACHE_DIR = os.environ.get(
+    "BQ_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data", "bq_cache"))
+DEFAULT_TTL_SECONDS = 3600
+DEFAULT_MAX_BYTES = 2 * 2**30
+
+# Quoted literals / identifiers, or a run of whitespace and --, # and /* */ comments.
+_SQL_TOKENS = re.compile(r"""('(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`[^`]*`)|((?:\s|--[^\n]*|#[^\n]*|/\*.*?\*/)+)""",
+                         re.DOTALL)
+# Functions whose result changes between runs; queries using them are never cached.
+# CURRENT_DATE and friends may be written without parentheses.
+_NONDETERMINISTIC = re.compile(
+    r"\bCURRENT_(?:DATE|DATETIME|TIME|TIMESTAMP)\b|\b(?:RAND|GENERATE_UUID|SESSION_USER)\s*\(", re.IGNORECASE)
+# QueryJobConfig properties that change what a query reads or returns.
+_KEY_JOB_CONFIG = ("default_dataset", "use_legacy_sql", "destination")
+
 
 def initialize_client():
     """
@@ -9,6 +34,8 @@ def initialize_client():
     Returns:
         bigquery.Client: The BigQuery client object.
     """
+    from google.cloud import bigquery
+    from google.oauth2 import service_account
 
     credentials = service_account.Credentials.from_service_account_file(
     "/content/imi-datathon-3bac336d0513 (1).json",
@@ -22,22 +49,267 @@ def initialize_client():
     )
     return client
 
-def run_query(client, query):
+
+def normalize_sql(query):
+    """
+    Canonical form of a query for cache keys: every run of whitespace and
+    comments collapsed to one space and a trailing semicolon dropped. Quoted
+    literals and identifiers are kept exactly.
+    """
+    def replace(match):
+        if match.group(1):
+            return match.group(1)
+        return " "
+    return _SQL_TOKENS.sub(replace, query).strip().rstrip(";").strip()
+
+
+def cacheable(query):
+    """False for queries whose result differs between runs (CURRENT_TIMESTAMP(), RAND(), ...)."""
+    literals_removed = _SQL_TOKENS.sub(lambda match: "''" if match.group(1) else " ", query)
+    return not _NONDETERMINISTIC.search(literals_removed)
+
+
+def job_context(client=None, job_config=None):
+    """
+    The parts of the client and job configuration a query's result depends
+    on: the project and location unqualified names resolve in, and the
+    _KEY_JOB_CONFIG properties that are set.
+    """
+    context = {"project": getattr(client, "project", None), "location": getattr(client, "location", None)}
+    for name in _KEY_JOB_CONFIG:
+        value = getattr(job_config, name, None)
+        if value is not None:
+            context[name] = str(value)
+    return context
+
+
+def cache_key(query, params=None, context=None):
+    """Content address of a (query, parameters, job_context()) triple."""
+    payload = json.dumps({"sql": normalize_sql(query), "params": params or {}, "context": context or {}},
+                         sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class QueryMetrics:
+    """
+    Counters for run_query(), safe to share between threads.
+
+    Attributes:
+        hits (int): Results served from the cache.
+        misses (int): Queries sent to BigQuery.
+        transfer_seconds (float): Time waiting for jobs and downloading
+            results (Arrow).
+        transfer_bytes (int): Arrow bytes downloaded.
+        cache_read_seconds (float): Time reading cached results.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.hits = 0
+            self.misses = 0
+            self.transfer_seconds = 0.0
+            self.transfer_bytes = 0
+            self.cache_read_seconds = 0.0
+
+    def record(self, **increments):
+        with self._lock:
+            for name, value in increments.items():
+                setattr(self, name, getattr(self, name) + value)
+
+    def as_dict(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {"hits": self.hits, "misses": self.misses,
+                    "hit_rate": self.hits / total if total else 0.0,
+                    "transfer_seconds": self.transfer_seconds, "transfer_bytes": self.transfer_bytes,
+                    "cache_read_seconds": self.cache_read_seconds}
+
+
+METRICS = QueryMetrics()
+
+
+class QueryCache:
+    """
+    On-disk, content-addressed cache of query results.
+
+    Each result is a Parquet file named by cache_key(query, params), next to
+    a small JSON sidecar (creation and last-use time, size, the SQL). An
+    entry older than ``ttl_seconds`` is a miss and is removed. When the
+    cache grows past ``max_bytes``, the least recently used entries are
+    evicted. Files are written under a temporary name and renamed, so
+    concurrent readers never see partial entries.
+    """
+
+    def __init__(self, directory=DEFAULT_CACHE_DIR, ttl_seconds=DEFAULT_TTL_SECONDS, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + ".parquet", base + ".json"
+
+    @staticmethod
+    def _write_json(path, payload):
+        temporary = f"{path}.{threading.get_ident()}.tmp"
+        with open(temporary, "w") as handle:
+            json.dump(payload, handle)
+        os.replace(temporary, path)
+
+    def _remove(self, key):
+        for path in self._paths(key):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def get(self, key):
+        """The cached Arrow table for ``key``, or None (missing or expired)."""
+        data_path, meta_path = self._paths(key)
+        try:
+            with open(meta_path) as handle:
+                meta = json.load(handle)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        if time.time() - meta["created"] > self.ttl_seconds:
+            self._remove(key)
+            return None
+        try:
+            table = pq.read_table(data_path)
+        except (OSError, pa.ArrowException):
+            # Evicted by another process between the two reads, or damaged.
+            self._remove(key)
+            return None
+        meta["last_used"] = time.time()
+        self._write_json(meta_path, meta)
+        return table
+
+    def put(self, key, table, query=""):
+        """Store an Arrow table under ``key`` and evict down to max_bytes."""
+        data_path, meta_path = self._paths(key)
+        temporary = f"{data_path}.{threading.get_ident()}.tmp"
+        pq.write_table(table, temporary)
+        os.replace(temporary, data_path)
+        now = time.time()
+        self._write_json(meta_path, {"created": now, "last_used": now, "bytes": os.path.getsize(data_path),
+                                     "rows": table.num_rows, "sql": normalize_sql(query)[:2000]})
+        self.evict()
+
+    def entries(self):
+        """(key, metadata) of every complete entry."""
+        result = []
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as handle:
+                    result.append((name[:-len(".json")], json.load(handle)))
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+        return result
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until under max_bytes."""
+        with self._lock:
+            now = time.time()
+            live = []
+            for key, meta in self.entries():
+                if now - meta["created"] > self.ttl_seconds:
+                    self._remove(key)
+                else:
+                    live.append((meta["last_used"], meta["bytes"], key))
+            total = sum(size for _, size, _ in live)
+            for _, size, key in sorted(live):
+                if total <= self.max_bytes:
+                    break
+                self._remove(key)
+                total -= size
+
+    def clear(self):
+        for key, _ in self.entries():
+            self._remove(key)
+
+
+_default_cache = None
+
+
+def default_cache():
+    """The process-wide QueryCache in DEFAULT_CACHE_DIR (created on first use)."""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = QueryCache()
+    return _default_cache
+
+
+def query_parameters(params):
+    """ScalarQueryParameters for a {name: value} mapping (types inferred from the values)."""
+    from google.cloud import bigquery
+
+    types = [(bool, "BOOL"), (int, "INT64"), (float, "FLOAT64"), (datetime.datetime, "TIMESTAMP"),
+             (datetime.date, "DATE"), (str, "STRING")]
+    result = []
+    for name, value in params.items():
+        kind = next((bq_type for python_type, bq_type in types if isinstance(value, python_type)), "STRING")
+        result.append(bigquery.ScalarQueryParameter(name, kind, value))
+    return result
+
+
+def run_query(client, query, params=None, cache=True, metrics=METRICS, job_config=None):
     """
     Run a query on BigQuery and return the results.
 
+    Results come back through Arrow (RowIterator.to_arrow(), which uses the
+    BigQuery Storage API when it is installed) rather than row by row.
+    Results of read-only SELECTs are kept in the local result cache, keyed on
+    the normalized SQL, the parameters and job_context(); DML, scripts and
+    queries calling non-deterministic functions always run and are never
+    stored.
+
     Args:
-        client (bigquery.Client): The BigQuery client object.
-        query (str): The SQL query to execute.
+        client (bigquery.Client): The BigQuery client object (anything with
+            query() returning a job whose result() has to_arrow()).
+        query (str): The SQL query to execute, with @name placeholders for params.
+        params (dict): Query parameter values by name.
+        cache (bool or QueryCache): True for default_cache(), False to always
+            query (the result is not stored either).
+        metrics (QueryMetrics): Where hits, misses and transfer time are counted.
+        job_config: QueryJobConfig to use; parameters are added to it.
 
     Returns:
-        list: The query results as a list of dictionaries.
+        pd.DataFrame: The query results.
     """
-    query_job = client.query(query)  # Make an API request
+    if cache is True:
+        cache = default_cache()
+    if cache and not cacheable(query):
+        cache = None
+    key = cache_key(query, params, job_context(client, job_config)) if cache else None
+    if cache:
+        start = time.perf_counter()
+        table = cache.get(key)
+        if table is not None:
+            metrics.record(hits=1, cache_read_seconds=time.perf_counter() - start)
+            return table.to_pandas()
+
+    if params:
+        if job_config is None:
+            from google.cloud import bigquery
+            job_config = bigquery.QueryJobConfig()
+        job_config.query_parameters = query_parameters(params)
+    start = time.perf_counter()
+    query_job = client.query(query, job_config=job_config) if job_config is not None else client.query(query)
     results = query_job.result()  # Wait for the job to complete
+    table = results.to_arrow()
+    metrics.record(misses=1, transfer_seconds=time.perf_counter() - start, transfer_bytes=table.nbytes)
+    if cache and getattr(query_job, "statement_type", None) == "SELECT":
+        cache.put(key, table, query)
     # Convert results to a DataFrame
-    df = results.to_dataframe()
-    return df
+    return table.to_pandas()
 
 # def insert_data(client, dataset_id, table_id, rows_to_insert):
 #     """
@@ -71,6 +343,7 @@ def main():
     """
     df = run_query(client, query)
     print(df)
+    print(METRICS.as_dict())
 
     # # Example: Inserting data into a table
     # dataset_id = "your_dataset_id"
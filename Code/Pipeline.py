@@ -0,0 +1,362 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pipeline.py
+
+Run the Transact pipeline as one command: only the stages whose inputs or
+code changed, independent stages in parallel.
+
+Each stage runs one of the existing scripts unchanged (as a subprocess, in the
+working directory its hard-coded paths expect). It is declared with the files
+it reads and writes:
+
+    load_csv          Script1   Data/<raw>.csv                 (type checks only)
+    create_db         Script2   Data/<raw>.csv              -> MySQL Scotiabank database
+    customer_reports  Script5   Data/Scotiabank.db          -> Data/customer_reports.csv
+    features          Script6   customer_reports.csv, raw   -> customer_features.csv,
+                                                               category_dictionary.json
+    score_if          Script7   customer_features.csv       -> ..._with_isolation_forest_scores.csv
+    score_vae         Script7   customer_features.csv       -> ..._with_vae_scores.csv, Models/...
+    dashboard         Script8   both score files, reports      (server; only with --serve)
+
+Dependencies follow from the files, so score_if and score_vae run at the same
+time once features is done. create_db writes to MySQL, while Script5 reads the
+SQLite file Data/Scotiabank.db, so that file is a pipeline source, like the
+raw CSVs.
+
+A stage is skipped (a cache hit) when its key is the one recorded after its
+last successful run and its outputs are still the files it wrote. The key is
+a hash of its input file contents, its code (the script plus the local modules
+it imports) and its version string. File hashes are remembered by (size,
+mtime), so an unchanged file is not read again. Editing a script, bumping a
+version or changing an input reruns that stage. Its downstream stages then
+rerun only if its outputs actually changed.
+
+State and per-stage logs live in Data/.pipeline/. After the run, a per-stage
+summary shows status, time and cache hits, with the time a hit saved (that
+stage's last run time).
+
+Usage:
+    python Pipeline.py [--workers 2] [--only features ...] [--force score_vae ...] [--force-all]
+                       [--dry-run] [--serve]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+STATE_DIR = os.path.join("Data", ".pipeline")
+WORKERS = 2
+HASH_BLOCK = 1 << 20
+
+RAW_FILES = tuple(f"Data/{name}.csv" for name in
+                  ("abm", "card", "cheque", "eft", "emt", "kyc", "kyc_industry_codes", "wire"))
+
+
+class Stage:
+    """
+    One pipeline step.
+
+    Attributes:
+        name (str): Stage name.
+        script (str): Script to run, relative to the repository root.
+        inputs (tuple): Files read (relative to the root).
+        outputs (tuple): Files written.
+        code (tuple): Other source files whose changes invalidate the stage.
+        cwd (str): Working directory the script's relative paths assume.
+        version (str): Bump to force a rerun without a code change.
+        after (tuple): Stages to run first even though no file links them.
+        service (bool): Long-running (a server): never cached, only run with --serve.
+    """
+
+    def __init__(self, name, script, inputs=(), outputs=(), code=(), cwd="Code", version="1", after=(),
+                 service=False):
+        self.name = name
+        self.script = script
+        self.inputs = tuple(inputs)
+        self.outputs = tuple(outputs)
+        self.code = (script,) + tuple(code)
+        self.cwd = cwd
+        self.version = version
+        self.after = tuple(after)
+        self.service = service
+
+    def command(self, root=ROOT):
+        return [sys.executable, os.path.join(root, self.script)]
+
+
+STAGES = [
+    Stage("load_csv", "Code/Script1_Load_CSV_Files.py", inputs=RAW_FILES, cwd="."),
+    Stage("create_db", "Code/Script2_Create_DB.py", inputs=RAW_FILES, code=["Code/Script1_Load_CSV_Files.py"],
+          cwd=".", after=["load_csv"]),
+    Stage("customer_reports", "Code/Script5_CreateCustomerReports.py", inputs=["Data/Scotiabank.db"],
+          outputs=["Data/customer_reports.csv"], code=["Code/Script4_Customer_Report.py"]),
+    Stage("features", "Code/Script6_ML_DataCuration.py", inputs=("Data/customer_reports.csv",) + RAW_FILES,
+          outputs=["Data/customer_features.csv", "Data/category_dictionary.json"],
+          code=["Scripts/CategoryDictionary.py"]),
+    Stage("score_if", "Code/Script7_ML_OutlierIdentification.py", inputs=["Data/customer_features.csv"],
+          outputs=["Data/customer_features_with_isolation_forest_scores.csv"]),
+    Stage("score_vae", "Code/Script7_VAE_OutlierIdentification.py", inputs=["Data/customer_features.csv"],
+          outputs=["Data/customer_features_with_vae_scores.csv", "Models/transformer_vae.pth"]),
+    Stage("dashboard", "Code/Script8_Dashboard.py",
+          inputs=["Data/customer_features_with_isolation_forest_scores.csv",
+                  "Data/customer_features_with_vae_scores.csv", "Data/customer_reports.csv"],
+          service=True),
+]
+
+
+def upstream(stages):
+    """stage name -> names of the stages it depends on (through files or ``after``)."""
+    producers = {output: stage.name for stage in stages for output in stage.outputs}
+    return {stage.name: sorted({producers[path] for path in stage.inputs if path in producers}
+                               | set(stage.after)) for stage in stages}
+
+
+class FileHashes:
+    """
+    Content hashes of files, remembered by (size, mtime) across runs.
+
+    Attributes:
+        entries (dict): path -> [size, mtime_ns, sha256].
+    """
+
+    def __init__(self, root, entries=None):
+        self.root = root
+        self.entries = dict(entries or {})
+
+    def digest(self, path):
+        """sha256 of a file's content, or None when it does not exist."""
+        try:
+            info = os.stat(os.path.join(self.root, path))
+        except FileNotFoundError:
+            return None
+        known = self.entries.get(path)
+        if known and known[0] == info.st_size and known[1] == info.st_mtime_ns:
+            return known[2]
+        sha = hashlib.sha256()
+        with open(os.path.join(self.root, path), "rb") as handle:
+            for block in iter(lambda: handle.read(HASH_BLOCK), b""):
+                sha.update(block)
+        self.entries[path] = [info.st_size, info.st_mtime_ns, sha.hexdigest()]
+        return sha.hexdigest()
+
+
+def stage_key(stage, hashes):
+    """
+    Cache key of a stage from its inputs, code and version.
+
+    Returns:
+        tuple: (key, missing input paths).
+    """
+    inputs = {path: hashes.digest(path) for path in stage.inputs}
+    missing = [path for path, digest in inputs.items() if digest is None]
+    payload = {"version": stage.version, "inputs": inputs,
+               "code": {path: hashes.digest(path) for path in stage.code}}
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest(), missing
+
+
+def _load_state(path):
+    if not os.path.exists(path):
+        return {"stages": {}, "files": {}}
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def _save_state(path, state):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as handle:
+        json.dump(state, handle, indent=1, sort_keys=True)
+    os.replace(temporary, path)
+
+
+def run_stage(stage, root, log_dir):
+    """
+    Run a stage's script, output to log_dir/<stage>.log.
+
+    Returns:
+        tuple: (return code, seconds).
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    environment = dict(os.environ, MPLBACKEND="Agg", PYTHONUNBUFFERED="1")
+    start = time.perf_counter()
+    with open(os.path.join(log_dir, f"{stage.name}.log"), "w") as log:
+        completed = subprocess.run(stage.command(root), cwd=os.path.join(root, stage.cwd), env=environment,
+                                   stdout=log, stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL)
+    return completed.returncode, time.perf_counter() - start
+
+
+def _tail(path, lines=15):
+    try:
+        with open(path, errors="replace") as handle:
+            return "".join(handle.readlines()[-lines:])
+    except FileNotFoundError:
+        return ""
+
+
+def run_pipeline(stages=STAGES, root=ROOT, workers=WORKERS, only=None, force=(), force_all=False,
+                 dry_run=False, serve=False, state_dir=STATE_DIR):
+    """
+    Run the stages that are out of date, in dependency order.
+
+    Args:
+        stages (list): Stage declarations.
+        root (str): Repository root (paths in the declarations are relative to it).
+        workers (int): Stages run at once.
+        only (list): Run just these stages (their upstream stages are still
+            brought up to date first).
+        force (list): Rerun these stages even on a cache hit.
+        force_all (bool): Rerun every stage.
+        dry_run (bool): Report what would run without running anything.
+        serve (bool): Also start the service stages (the dashboard) at the end.
+        state_dir (str): State and log directory, relative to root.
+
+    Returns:
+        pd.DataFrame: The per-stage summary.
+    """
+    state_path = os.path.join(root, state_dir, "state.json")
+    log_dir = os.path.join(root, state_dir, "logs")
+    state = _load_state(state_path)
+    hashes = FileHashes(root, state.get("files"))
+    depends = upstream(stages)
+    by_name = {stage.name: stage for stage in stages}
+    unknown = [name for name in list(only or []) + list(force) if name not in by_name]
+    if unknown:
+        raise ValueError(f"Unknown stages: {unknown}; expected some of {list(by_name)}")
+
+    selected = set(only or by_name)
+    pending = list(selected)
+    while pending:
+        for parent in depends[pending.pop()]:
+            if parent not in selected:
+                selected.add(parent)
+                pending.append(parent)
+    batch = [stage for stage in stages if stage.name in selected and not stage.service]
+    services = [stage for stage in stages if stage.name in selected and stage.service]
+
+    results = {}
+    running = {}
+    start = time.perf_counter()
+
+    def finished(name):
+        return name in results and results[name]["status"] in ("ran", "cached", "would run")
+
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+        while len(results) < len(batch):
+            progress = len(results)
+            for stage in batch:
+                if stage.name in results or stage.name in running:
+                    continue
+                parents = depends[stage.name]
+                if any(name in results and not finished(name) for name in parents):
+                    results[stage.name] = {"status": "blocked", "seconds": 0.0}
+                    continue
+                if not all(finished(name) for name in parents):
+                    continue
+                key, missing = stage_key(stage, hashes)
+                recorded = state["stages"].get(stage.name, {})
+                hit = (recorded.get("key") == key and not missing
+                       and all(hashes.digest(path) == digest for path, digest in recorded.get("outputs", {}).items())
+                       and set(recorded.get("outputs", {})) == set(stage.outputs))
+                upstream_runs = any(results[name]["status"] == "would run" for name in parents)
+                if hit and not force_all and stage.name not in force and not upstream_runs:
+                    results[stage.name] = {"status": "cached", "seconds": 0.0,
+                                           "saved": recorded.get("seconds", 0.0)}
+                elif missing and not upstream_runs:
+                    results[stage.name] = {"status": "failed", "seconds": 0.0,
+                                           "error": f"missing {len(missing)} inputs: {', '.join(missing[:2])}"
+                                                    + (", ..." if len(missing) > 2 else "")}
+                elif dry_run:
+                    results[stage.name] = {"status": "would run", "seconds": 0.0}
+                else:
+                    running[stage.name] = (pool.submit(run_stage, stage, root, log_dir), key)
+            if not running:
+                if len(results) == progress:
+                    raise ValueError("Stage dependencies form a cycle")
+                continue
+            done, _ = wait([future for future, _ in running.values()], return_when=FIRST_COMPLETED)
+            for name in [name for name, (future, _) in running.items() if future in done]:
+                future, key = running.pop(name)
+                stage = by_name[name]
+                try:
+                    returncode, seconds = future.result()
+                except OSError as e:
+                    results[name] = {"status": "failed", "seconds": 0.0, "error": str(e)}
+                    continue
+                outputs = {path: hashes.digest(path) for path in stage.outputs}
+                absent = [path for path, digest in outputs.items() if digest is None]
+                if returncode != 0 or absent:
+                    error = f"exit code {returncode}" if returncode != 0 else f"did not write {', '.join(absent)}"
+                    results[name] = {"status": "failed", "seconds": seconds, "error": error}
+                    print(f"[{name}] FAILED ({error}); last lines of its log:\n"
+                          f"{_tail(os.path.join(log_dir, f'{name}.log'))}", flush=True)
+                    continue
+                results[name] = {"status": "ran", "seconds": seconds}
+                state["stages"][name] = {"key": key, "outputs": outputs, "seconds": seconds,
+                                         "finished": time.strftime("%Y-%m-%d %H:%M:%S")}
+                state["files"] = hashes.entries
+                _save_state(state_path, state)
+                print(f"[{name}] done in {seconds:.1f}s", flush=True)
+    wall = time.perf_counter() - start
+    if not dry_run:
+        state["files"] = hashes.entries
+        _save_state(state_path, state)
+
+    summary = pd.DataFrame([
+        {"stage": stage.name, "status": results[stage.name]["status"],
+         "cache_hit": results[stage.name]["status"] == "cached",
+         "seconds": results[stage.name]["seconds"], "saved_s": results[stage.name].get("saved", 0.0),
+         "note": results[stage.name].get("error", "")}
+        for stage in batch])
+    print_summary(summary, wall)
+
+    if serve and not dry_run:
+        for stage in services:
+            if all(finished(name) for name in depends[stage.name]):
+                print(f"Starting {stage.name} ({stage.script}); Ctrl+C to stop", flush=True)
+                subprocess.run(stage.command(root), cwd=os.path.join(root, stage.cwd))
+            else:
+                print(f"Not starting {stage.name}: an upstream stage failed", flush=True)
+    return summary
+
+
+def print_summary(summary, wall):
+    """Print the per-stage status, timing and cache-hit table."""
+    print("\nPipeline summary:")
+    if summary.empty:
+        print("  (no stages selected)")
+        return
+    print(summary.to_string(index=False, float_format=lambda value: f"{value:.1f}"))
+    hits = int(summary["cache_hit"].sum())
+    print(f"{len(summary)} stages: {int((summary['status'] == 'ran').sum())} ran, {hits} cached "
+          f"(~{summary['saved_s'].sum():.1f}s saved), {int((summary['status'] == 'failed').sum())} failed, "
+          f"{int((summary['status'] == 'blocked').sum())} blocked; "
+          f"{summary['seconds'].sum():.1f}s of stage time in {wall:.1f}s wall")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Transact pipeline, skipping up-to-date stages.")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="Stages run at once")
+    parser.add_argument("--only", action="append", help="Run only this stage and what it needs (repeatable)")
+    parser.add_argument("--force", action="append", default=[], help="Rerun this stage (repeatable)")
+    parser.add_argument("--force-all", action="store_true")
+    parser.add_argument("--dry-run", action="store_true", help="Show what would run")
+    parser.add_argument("--serve", action="store_true", help="Start the dashboard afterwards")
+    args = parser.parse_args(argv)
+
+    summary = run_pipeline(workers=args.workers, only=args.only, force=args.force, force_all=args.force_all,
+                           dry_run=args.dry_run, serve=args.serve)
+    if len(summary) and summary["status"].isin(["failed", "blocked"]).any():
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,61 +1,340 @@
+#!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
 Created on Sun Jan 12 11:48:55 2025
 
 @author: ernest
+
+Script3_EDA.py
+
+Exploratory profile of every table in the SQLite database built by Script2.
+
+Two ways to compute the same report (--mode):
+
+* pushdown (default): SQLite computes what it can itself. One aggregate
+  query per table gives row, null and distinct counts (exact, though the
+  key is still "distinct_approx"), min / max and the value types of every
+  column. Top values are GROUP BY queries (skipped for columns whose values
+  are all distinct), and the sample is SELECT DISTINCT ... LIMIT. Only the
+  numeric columns are streamed out, into quantile sketches.
+* scan: each table is streamed in chunks of --chunk-rows rows (never
+  loaded whole) and every column is profiled in that single pass with
+  bounded memory (see Scripts/ColumnProfile.py). Distinct counts are
+  HyperLogLog estimates and top values a Misra-Gries summary.
+
+Tables are profiled in parallel, in --workers processes, each over its own
+read-only connection. --compare runs both modes and prints their per-table
+and total timings. The `report` dict is printed and written as JSON.
+
+report[table] = {
+    "num_rows", "num_columns",
+    "column_types": {column: pandas dtype},
+    "missing_values": {column: null count},
+    "unique_values": {column: first distinct values (at most 10)},
+    "columns": {column: ColumnProfile.to_dict()},
+    "mode": "pushdown" or "scan",
+    "seconds": profiling time,
+}
+
+Usage:
+    python Script3_EDA.py [--db ../Data/Scotiabank.db] [--output ../Data/eda_report.json]
+                          [--mode pushdown|scan] [--workers 8] [--chunk-rows 100000]
+                          [--table abm ...] [--compare]
 """
 
+import argparse
+import json
+import os
 import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import quote
+
+import numpy as np
 import pandas as pd
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Scripts"))
+from ColumnProfile import QUANTILE_K, QUANTILES, SAMPLE_VALUES, TOP_K, ColumnProfile, json_value  # noqa: E402
+from QuantileSketch import KLLSketch  # noqa: E402
+
+DB_PATH = "../Data/Scotiabank.db"
+REPORT_PATH = "../Data/eda_report.json"
+CHUNK_ROWS = 100_000
+WORKERS = min(8, os.cpu_count() or 1)
+MODES = ("pushdown", "scan")
 
-# Connect to the SQLite database
-db_path = "../Data/Scotiabank.db"
-conn = sqlite3.connect(db_path)
 
 # Helper function to fetch table names
 def get_table_names(connection):
     query = "SELECT name FROM sqlite_master WHERE type='table';"
     return [row[0] for row in connection.execute(query).fetchall()]
 
-# Fetch table names
-table_names = get_table_names(conn)
-print("Tables in the database:")
-print(table_names)
 
-# Initialize a report dictionary
-report = {}
+def connect_read_only(db_path):
+    """A read-only connection to an existing database file."""
+    return sqlite3.connect(f"file:{quote(os.path.abspath(db_path))}?mode=ro", uri=True)
+
+
+def _quote(identifier):
+    return '"' + identifier.replace('"', '""') + '"'
+
+
+def get_columns(connection, table):
+    """Column names of a table, in order."""
+    return [row[1] for row in connection.execute(f"PRAGMA table_info({_quote(table)})").fetchall()]
+
+
+def _pandas_dtype(non_null, nulls, text, real, blob):
+    # The dtype read_sql_query would give the whole column.
+    if text or blob or not non_null:
+        return "object"
+    if real or nulls:
+        return "float64"
+    return "int64"
+
+
+def pushdown_table(connection, table, chunk_rows=CHUNK_ROWS, top_k=TOP_K):
+    """
+    Profile one table with SQL aggregates (see the module docstring).
+
+    Args:
+        connection (sqlite3.Connection): Open database connection.
+        table (str): Table name.
+        chunk_rows (int): Rows fetched per chunk for the quantile sketches.
+        top_k (int): Most frequent values kept per column.
+
+    Returns:
+        dict: The table's report entry.
+    """
+    start = time.perf_counter()
+    columns = get_columns(connection, table)
+    name = _quote(table)
+    aggregates = ["COUNT(*)"]
+    for column in columns:
+        c = _quote(column)
+        aggregates += [f"COUNT({c})", f"COUNT(DISTINCT {c})", f"MIN({c})", f"MAX({c})",
+                       f"TOTAL(typeof({c}) = 'text')", f"TOTAL(typeof({c}) = 'real')",
+                       f"TOTAL(typeof({c}) = 'blob')"]
+    row = connection.execute(f"SELECT {', '.join(aggregates)} FROM {name}").fetchone()
+    num_rows = row[0]
+    stats = {}
+    for position, column in enumerate(columns):
+        non_null, distinct, low, high, text, real, blob = row[1 + 7 * position: 8 + 7 * position]
+        c = _quote(column)
+        if 0 < distinct < non_null:
+            top = connection.execute(f"SELECT {c}, COUNT(*) AS n FROM {name} WHERE {c} IS NOT NULL "
+                                     f"GROUP BY {c} ORDER BY n DESC LIMIT {int(top_k)}").fetchall()
+        else:
+            # No value repeats: there are no frequent values to report.
+            top = []
+        sample = connection.execute(f"SELECT DISTINCT {c} FROM {name} LIMIT {SAMPLE_VALUES}").fetchall()
+        stats[column] = {
+            "dtype": _pandas_dtype(non_null, num_rows - non_null, text, real, blob),
+            "rows": num_rows,
+            "nulls": num_rows - non_null,
+            "distinct_approx": distinct,
+            "top_values": [[json_value(value), count] for value, count in top],
+            "top_values_max_error": 0,
+            "min": json_value(low),
+            "max": json_value(high),
+            "sample_values": [json_value(value) for (value,) in sample],
+        }
+
+    numeric = [column for column in columns
+               if stats[column]["dtype"] != "object" and stats[column]["nulls"] < num_rows]
+    if numeric:
+        sketches = [KLLSketch(QUANTILE_K) for _ in numeric]
+        cursor = connection.execute(f"SELECT {', '.join(map(_quote, numeric))} FROM {name}")
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            values = np.array(rows, dtype=float).reshape(len(rows), len(numeric))
+            for position, sketch in enumerate(sketches):
+                sketch.update(values[:, position])
+        for column, sketch in zip(numeric, sketches):
+            stats[column]["quantiles"] = {f"p{round(q * 100):02d}": json_value(float(value)) for q, value
+                                          in zip(QUANTILES, np.atleast_1d(sketch.quantile(list(QUANTILES))))}
+            stats[column]["quantile_rank_error"] = sketch.rank_error()
+    return table_entry(num_rows, stats, "pushdown", time.perf_counter() - start)
+
+
+def profile_table(connection, table, chunk_rows=CHUNK_ROWS):
+    """
+    Profile one table in a single chunked scan through pandas.
+
+    Args:
+        connection (sqlite3.Connection): Open database connection.
+        table (str): Table name.
+        chunk_rows (int): Rows read per chunk.
 
-# Analyze each table
-for table in table_names:
+    Returns:
+        dict: The table's report entry (see the module docstring).
+    """
+    start = time.perf_counter()
+    columns = get_columns(connection, table)
+    profiles = {column: ColumnProfile(column) for column in columns}
+    num_rows = 0
+    for chunk in pd.read_sql_query(f"SELECT * FROM {_quote(table)}", connection, chunksize=chunk_rows):
+        num_rows += len(chunk)
+        for column in columns:
+            profiles[column].update(chunk[column])
+    stats = {column: profile.to_dict() for column, profile in profiles.items()}
+    return table_entry(num_rows, stats, "scan", time.perf_counter() - start)
+
+
+def table_entry(num_rows, stats, mode, seconds):
+    """A table's report entry from its per-column statistics."""
+    return {
+        "num_rows": num_rows,
+        "num_columns": len(stats),
+        "column_types": {column: entry["dtype"] for column, entry in stats.items()},
+        "missing_values": {column: entry["nulls"] for column, entry in stats.items()},
+        "unique_values": {column: entry["sample_values"] for column, entry in stats.items()},
+        "columns": stats,
+        "mode": mode,
+        "seconds": seconds,
+    }
+
+
+def print_table_report(table, entry):
+    """Print a table's entry the way the original interactive EDA did."""
     print(f"\nExploring table: {table}")
-    
-    # Load table into a DataFrame
-    df = pd.read_sql_query(f"SELECT * FROM {table}", conn)
-    report[table] = {}
-    
-    # General information
-    num_rows, num_columns = df.shape
-    print(f"Number of rows: {num_rows}, Number of columns: {num_columns}")
-    report[table]['num_rows'] = num_rows
-    report[table]['num_columns'] = num_columns
-    
-    # Column types
-    column_types = df.dtypes
+    print(f"Number of rows: {entry['num_rows']}, Number of columns: {entry['num_columns']}")
     print("Column types:")
-    print(column_types)
-    report[table]['column_types'] = column_types.to_dict()
-
-    # Missing values
-    missing_values = df.isnull().sum()
+    print(pd.Series(entry["column_types"], dtype=object).to_string())
     print("Missing values:")
-    print(missing_values)
-    report[table]['missing_values'] = missing_values.to_dict()
+    print(pd.Series(entry["missing_values"], dtype="int64").to_string())
+    summary = pd.DataFrame({
+        column: {"distinct~": stats["distinct_approx"], "min": stats["min"], "max": stats["max"],
+                 "top": stats["top_values"][0][0] if stats["top_values"] else None}
+        for column, stats in entry["columns"].items()}).T
+    print("Column summary:")
+    print(summary.to_string())
+    print(f"Profiled ({entry['mode']}) in {entry['seconds']:.2f}s")
+
+
+def _approx_rows(connection, table):
+    """MAX(rowid), an index lookup rather than a count (0 for WITHOUT ROWID tables)."""
+    try:
+        return connection.execute(f"SELECT MAX(rowid) FROM {_quote(table)}").fetchone()[0] or 0
+    except sqlite3.OperationalError:
+        return 0
+
+
+def _profile_task(db_path, table, mode, chunk_rows):
+    """Profile one table over a connection of its own (runs in a worker process)."""
+    conn = connect_read_only(db_path)
+    try:
+        if mode == "pushdown":
+            return pushdown_table(conn, table, chunk_rows)
+        return profile_table(conn, table, chunk_rows)
+    finally:
+        conn.close()
+
+
+def _run(function, tasks, workers):
+    """Apply ``function`` to every argument tuple, in worker processes when workers > 1."""
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(min(workers, len(tasks))) as pool:
+            return list(pool.map(function, *zip(*tasks)))
+    return [function(*task) for task in tasks]
+
+
+def build_report(db_path=DB_PATH, chunk_rows=CHUNK_ROWS, tables=None, verbose=True, mode="pushdown",
+                 workers=WORKERS):
+    """
+    Profile the tables of a database.
+
+    Args:
+        db_path (str): SQLite database file.
+        chunk_rows (int): Rows read per chunk.
+        tables (list): Only these tables (default: all).
+        verbose (bool): Print each table's entry.
+        mode (str): "pushdown" (SQL aggregates) or "scan" (chunked pandas pass).
+        workers (int): Tables profiled at once, each in its own process.
+
+    Returns:
+        dict: table -> report entry.
+    """
+    if mode not in MODES:
+        raise ValueError(f"mode must be one of {MODES}")
+    conn = connect_read_only(db_path)
+    try:
+        table_names = tables or get_table_names(conn)
+        sizes = {table: _approx_rows(conn, table) for table in table_names}
+    finally:
+        conn.close()
+    if verbose:
+        print("Tables in the database:")
+        print(table_names)
+    # Largest tables first, so they do not start last.
+    order = sorted(table_names, key=lambda table: -sizes.get(table, 0))
+    entries = _run(_profile_task, [(db_path, table, mode, chunk_rows) for table in order], workers)
+    report = dict(sorted(zip(order, entries), key=lambda item: table_names.index(item[0])))
+    if verbose:
+        for table, entry in report.items():
+            print_table_report(table, entry)
+    return report
+
+
+def compare_modes(db_path=DB_PATH, chunk_rows=CHUNK_ROWS, tables=None, workers=WORKERS):
+    """
+    Time both modes over the same tables and print a per-table comparison.
+
+    Returns:
+        dict: mode -> (report, wall-clock seconds).
+    """
+    results = {}
+    for mode in MODES:
+        start = time.perf_counter()
+        report = build_report(db_path, chunk_rows, tables, verbose=False, mode=mode, workers=workers)
+        results[mode] = (report, time.perf_counter() - start)
+    pushdown, scan = results["pushdown"][0], results["scan"][0]
+    timings = pd.DataFrame({
+        "rows": {table: entry["num_rows"] for table, entry in pushdown.items()},
+        "pushdown_s": {table: entry["seconds"] for table, entry in pushdown.items()},
+        "scan_s": {table: entry["seconds"] for table, entry in scan.items()},
+    })
+    timings.loc["total (wall)"] = [timings["rows"].sum(), results["pushdown"][1], results["scan"][1]]
+    timings["rows"] = timings["rows"].astype("int64")
+    timings["speedup"] = timings["scan_s"] / timings["pushdown_s"]
+    print(f"\nEDA timings with {workers} workers (per-table seconds are inside each worker):")
+    print(timings.to_string(float_format=lambda value: f"{value:.3f}"))
+    return results
+
+
+def save_report(report, path=REPORT_PATH):
+    """Write the report as JSON (atomically)."""
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as handle:
+        json.dump(report, handle, indent=1, default=str)
+    os.replace(temporary, path)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Single-pass EDA profile of the SQLite database.")
+    parser.add_argument("--db", default=DB_PATH)
+    parser.add_argument("--output", default=REPORT_PATH)
+    parser.add_argument("--mode", choices=MODES, default="pushdown")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--table", action="append", help="Only these tables (repeatable)")
+    parser.add_argument("--compare", action="store_true", help="Time both modes; write the --mode report")
+    args = parser.parse_args(argv)
 
-    # Unique values
-    unique_values = {col: df[col].unique().tolist()[:10] for col in df.columns}  # Limiting to 10 unique values
-    print("Sample of unique values per column:")
-    print(unique_values)
-    report[table]['unique_values'] = unique_values
+    start = time.perf_counter()
+    if args.compare:
+        report = compare_modes(args.db, args.chunk_rows, args.table, args.workers)[args.mode][0]
+    else:
+        report = build_report(args.db, args.chunk_rows, args.table, mode=args.mode, workers=args.workers)
+    save_report(report, args.output)
+    print(f"\nReport for {len(report)} tables written to {args.output} in {time.perf_counter() - start:.1f}s")
+    return report
 
 
+if __name__ == "__main__":
+    main()
@@ -7,9 +7,15 @@ Created on Sun Jan 12 18:01:18 2025
 """
 
 
+import argparse
+import os
+import sys
+
 import pandas as pd
 import numpy as np
-from sklearn.preprocessing import LabelEncoder
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Scripts"))
+from CategoryDictionary import DEFAULT_FILENAME, LIST_COLUMN_FIELDS, CategoryDictionary, parse_list  # noqa: E402
 
 
 # Load the CSV file
@@ -71,76 +77,65 @@ def process_dates(df, date_columns):
     return df
 
 
-def label_encode_columns(df, columns):
+def encode_category_columns(df, columns, dictionary):
     """
-    Apply Label Encoding to specified columns in the DataFrame.
+    Replace categorical columns by their shared dictionary codes.
+
+    The codes are the same in every stage (see Scripts/CategoryDictionary.py),
+    unlike a LabelEncoder fitted on this file alone. Missing values become -1.
 
     Args:
         df (pd.DataFrame): The input DataFrame.
         columns (list): List of column names to encode.
+        dictionary (CategoryDictionary): The shared category dictionary.
 
     Returns:
         pd.DataFrame: DataFrame with encoded columns.
-        dict: Dictionary containing LabelEncoders for each column.
     """
-    encoders = {}
-    for col in columns:
-        le = LabelEncoder()
-        df[col] = le.fit_transform(df[col].astype(str))  # Convert to string for compatibility
-        encoders[col] = le  # Save the encoder for future use if needed
-    return df, encoders
-
-
+    return dictionary.encode_frame(df, columns)
 
-import numpy as np
 
-def process_transaction_columns_dynamic(df, columns):
+def process_transaction_columns_dynamic(df, columns, dictionary):
     """
     Dynamically process transaction-related columns to create binary features for unique values.
 
+    Each list column is multi-hot encoded through the shared dictionary: one
+    {col}_contains_{value} column per value that occurs, in dictionary code
+    order, so the feature columns come out in the same order on every run.
+
     Args:
         df (pd.DataFrame): The input DataFrame.
         columns (list): List of columns to process.
+        dictionary (CategoryDictionary): The shared category dictionary.
 
     Returns:
         pd.DataFrame: DataFrame with new binary features added.
     """
+    features = []
     for col in columns:
-        # Replace empty lists with NaN
-        df[col] = df[col].apply(lambda x: np.nan if x == '[]' else x)
-        
-        # Convert string representation of lists to actual lists
-        df[col] = df[col].apply(lambda x: eval(x) if isinstance(x, str) else x)
-        
-        # Flatten lists to extract all unique values
-        unique_values = set(
-            value for row in df[col].dropna() if isinstance(row, list) for value in row
-        )
-        
-        # Create binary features for each unique value
-        for unique in unique_values:
-            df[f'{col}_contains_{unique}'] = df[col].apply(
-                lambda x: 1 if isinstance(x, list) and unique in x else 0
-            )
-        
+        indicators = dictionary.multi_hot(LIST_COLUMN_FIELDS[col], df[col], prefix=f'{col}_contains_')
         # Create a feature for the number of items in the list
-        df[f'{col}_count'] = df[col].apply(lambda x: len(x) if isinstance(x, list) else 0)
+        counts = df[col].apply(lambda x: len(parse_list(x))).rename(f'{col}_count')
+        features.extend([indicators, counts])
     # Drop the original columns after processing
-    df.drop(columns=columns, inplace=True)
-    return df
+    return pd.concat([df.drop(columns=columns)] + features, axis=1)
 
 
-# Main function
-if __name__ == "__main__":
-    # File paths
-    input_file = "../Data/customer_reports.csv"
-    output_file = "../Data/customer_reports_preprocessed.csv"
-    
-    # Load the data
-    print("Loading data...")
-    df = load_data(input_file)
-    print("Data loaded successfully!")
-    
+def curate_features(df, dictionary):
+    """
+    Turn customer_reports rows into the all-numeric ML feature table.
+
+    Date columns become calendar / cyclic features, categorical columns
+    their dictionary codes and the list columns multi-hot indicators; NaN
+    is filled with -999.
+
+    Args:
+        df (pd.DataFrame): customer_reports.csv as loaded by load_data().
+        dictionary (CategoryDictionary): The shared category dictionary.
+
+    Returns:
+        pd.DataFrame: The features (customer_id plus numeric columns).
+    """
     # Define date columns to process
     date_columns = ['established_date', 'onboard_date']
     
@@ -149,13 +144,13 @@ if __name__ == "__main__":
     df = process_dates(df, date_columns)
     print("Date columns processed successfully!")
 
-    # Columns to label encode
-    columns_to_encode = ['country', 'province', 'city']
+    # Columns to encode with the shared dictionary codes
+    columns_to_encode = ['country', 'province', 'city', 'industry_id']
 
-    # Apply Label Encoding
-    print("Applying Label Encoding...")
-    df, encoders = label_encode_columns(df, columns_to_encode)
-    print("Label Encoding applied successfully!")
+    # Apply dictionary encoding
+    print("Applying dictionary encoding...")
+    df = encode_category_columns(df, columns_to_encode, dictionary)
+    print("Dictionary encoding applied successfully!")
     
     #drop industry
     df.drop(columns=['industry'], inplace=True)
@@ -172,7 +167,7 @@ if __name__ == "__main__":
     
     # Process transaction columns
     print("Processing transaction columns...")
-    df = process_transaction_columns_dynamic(df, transaction_columns)
+    df = process_transaction_columns_dynamic(df, transaction_columns, dictionary)
     print("Transaction columns processed successfully!")
     
     #fill nans
@@ -185,6 +180,41 @@ if __name__ == "__main__":
     if non_numerical_columns:
         raise ValueError(f"The following columns are not numerical: {non_numerical_columns}")
 
+    return df
+
+
+# Main function
+if __name__ == "__main__":
+    # File paths
+    input_file = "../Data/customer_reports.csv"
+    output_file = "../Data/customer_reports_preprocessed.csv"
+    dictionary_file = os.path.join("../Data", DEFAULT_FILENAME)
+    
+    parser = argparse.ArgumentParser(description="Curate customer_reports.csv into ML features.")
+    parser.add_argument("--rebuild-dictionary", action="store_true",
+                        help="Rescan the raw files and append new values to the category dictionary")
+    args = parser.parse_args()
+
+    # Load the shared category dictionary; it is only built from the raw
+    # files when missing or on --rebuild-dictionary, which keeps the saved
+    # codes and appends new values (like Scripts/CategoryDictionary.py).
+    # Values it does not know encode as -1.
+    if os.path.exists(dictionary_file) and not args.rebuild_dictionary:
+        print("Loading category dictionary...")
+        dictionary = CategoryDictionary.load(dictionary_file)
+    else:
+        print("Building category dictionary from the raw files...")
+        dictionary = CategoryDictionary.build("../Data", path=dictionary_file)
+        dictionary.save(dictionary_file)
+    print(f"Category dictionary ready ({len(dictionary):,} codes)")
+
+    # Load the data
+    print("Loading data...")
+    df = load_data(input_file)
+    print("Data loaded successfully!")
+    
+    df = curate_features(df, dictionary)
+
     # Save the processed DataFrame
     output_file = "../Data/customer_features.csv"
     df.to_csv(output_file, index=False)
@@ -0,0 +1,310 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+CategoryDictionary.py
+
+One dictionary encoding for the categorical fields shared by every table:
+country, province, city, industry_code and merchant_category.
+
+The same strings are repeated in each channel CSV, in kyc.csv, in
+customer_reports.csv and in imi_features.csv. Each stage used to encode
+them its own way (LabelEncoder in Script6, string group keys in the
+dashboard), so a code in one output meant nothing in another. Here the
+values are collected once from kyc.csv, kyc_industry_codes.csv and the
+channel files and saved as category_dictionary.json. Every stage then maps
+them to the same small integer codes.
+
+Codes are stable. A value's code is its position in the field's value list,
+and a rebuild only appends values it has not seen before. Codes already
+written to a feature file or a model never change meaning. Missing values
+encode to -1.
+
+The JSON also maps table columns to fields (trans_country -> country,
+industry_id -> industry_code, ...). A consumer that only needs categorical
+dtypes (the dashboard) can read it with json + pandas alone.
+
+Usage:
+    python CategoryDictionary.py DATA_DIR [--output DATA_DIR/category_dictionary.json]
+                                 [--chunk-rows 1000000]
+"""
+
+import argparse
+import ast
+import json
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+FIELDS = ("country", "province", "city", "industry_code", "merchant_category")
+
+# Column name (in any pipeline table) -> dictionary field.
+COLUMN_FIELDS = {
+    "country": "country", "trans_country": "country", "cust_country": "country",
+    "province": "province", "trans_province": "province", "cust_province": "province",
+    "city": "city", "trans_city": "city", "cust_city": "city",
+    "industry_code": "industry_code", "industry_id": "industry_code",
+    "most_freq_industry_code": "industry_code",
+    "merchant_category": "merchant_category", "most_freq_merchant_category": "merchant_category",
+}
+
+# customer_reports.csv list columns (Script4) -> dictionary field.
+LIST_COLUMN_FIELDS = {
+    f"{plural}_of_{channel}_transactions": field
+    for channel in ("abm", "card")
+    for plural, field in (("countries", "country"), ("provinces", "province"), ("cities", "city"))
+}
+
+# Files the dictionary is built from.
+SOURCE_FILES = ("kyc.csv", "kyc_industry_codes.csv", "abm.csv", "card.csv", "cheque.csv",
+                "eft.csv", "emt.csv", "wire.csv")
+
+DEFAULT_FILENAME = "category_dictionary.json"
+CODE_DTYPE = np.int32
+MISSING = -1
+FORMAT_VERSION = 1
+
+_INTEGRAL_TEXT = re.compile(r"^-?\d+\.0+$")
+
+
+def normalize_labels(values):
+    """
+    Canonical text label of each value: None for missing or empty values, and
+    integral numbers without a trailing ".0" (merchant_category is read as
+    float from card.csv but as text elsewhere).
+    """
+    labels = []
+    for value in values:
+        if value is None or (isinstance(value, (float, np.floating)) and np.isnan(value)):
+            labels.append(None)
+            continue
+        if isinstance(value, (float, np.floating)) and float(value).is_integer():
+            value = int(value)
+        text = str(value).strip()
+        if _INTEGRAL_TEXT.match(text):
+            text = text.split(".")[0]
+        labels.append(text if text and text.lower() != "nan" else None)
+    return labels
+
+
+def parse_list(text):
+    """A list cell of customer_reports.csv ("['CA', 'US']") as a list; [] when empty or unparsable."""
+    if isinstance(text, (list, tuple, set)):
+        return list(text)
+    if not isinstance(text, str):
+        return []
+    try:
+        value = ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return []
+    return list(value) if isinstance(value, (list, tuple, set)) else []
+
+
+class CategoryDictionary:
+    """
+    Append-only value <-> code mapping per categorical field.
+
+    Attributes:
+        categories (dict): field -> list of labels; a label's code is its position.
+    """
+
+    def __init__(self, categories=None):
+        self.categories = {field: [] for field in FIELDS}
+        for field, labels in (categories or {}).items():
+            self.categories[field] = list(labels)
+        self._indexes = {}
+
+    def __len__(self):
+        return sum(len(labels) for labels in self.categories.values())
+
+    def size(self, field):
+        """Number of codes of ``field``."""
+        return len(self.categories[field])
+
+    def _index(self, field):
+        index = self._indexes.get(field)
+        if index is None:
+            index = self._indexes[field] = pd.Index(self.categories[field], dtype=object)
+        return index
+
+    def update(self, field, values):
+        """
+        Append the values of ``field`` not yet in the dictionary, in sorted order.
+
+        Returns:
+            int: Number of new codes.
+        """
+        labels = {label for label in normalize_labels(pd.unique(pd.Series(values, dtype=object)))
+                  if label is not None}
+        new = sorted(labels.difference(self.categories[field]))
+        if new:
+            self.categories[field].extend(new)
+            self._indexes.pop(field, None)
+        return len(new)
+
+    def encode(self, field, values, extend=False):
+        """
+        Codes of ``values`` in ``field``.
+
+        Distinct values are normalized and looked up once, so this is a
+        factorize plus a table lookup whatever the number of rows.
+
+        Args:
+            field (str): One of FIELDS.
+            values (array-like): Raw values (strings, numbers, NaN).
+            extend (bool): Add unseen values to the dictionary first;
+                otherwise they encode to MISSING like NaN.
+
+        Returns:
+            np.ndarray: CODE_DTYPE codes, MISSING for missing / unknown values.
+        """
+        codes, uniques = pd.factorize(pd.Series(values, dtype=object), use_na_sentinel=True)
+        labels = normalize_labels(uniques)
+        if extend:
+            self.update(field, [label for label in labels if label is not None])
+        lookup = self._index(field).get_indexer(pd.Index(labels, dtype=object)) if labels else []
+        # factorize's -1 (NaN) lands on the trailing MISSING entry.
+        table = np.append(np.asarray(lookup, dtype=CODE_DTYPE), CODE_DTYPE(MISSING))
+        return table[codes]
+
+    def decode(self, field, codes):
+        """Labels of ``codes`` (object array, None for MISSING)."""
+        table = np.array(self.categories[field] + [None], dtype=object)
+        return table[np.asarray(codes, dtype=np.int64)]
+
+    def dtype(self, field):
+        """pd.CategoricalDtype whose category codes are the dictionary codes."""
+        return pd.CategoricalDtype(self.categories[field])
+
+    def categorical(self, field, values, extend=False):
+        """``values`` as a pd.Categorical on the dictionary's categories (codes = dictionary codes)."""
+        return pd.Categorical.from_codes(self.encode(field, values, extend), dtype=self.dtype(field))
+
+    def encode_frame(self, df, columns=None, categorical=False, extend=False):
+        """
+        Replace the dictionary columns of ``df`` by their codes.
+
+        Args:
+            df (pd.DataFrame): Any pipeline table.
+            columns (list): Columns to encode (default: every COLUMN_FIELDS column present).
+            categorical (bool): Return categoricals (same codes, labels kept)
+                instead of plain integer columns.
+            extend (bool): Add unseen values to the dictionary.
+
+        Returns:
+            pd.DataFrame: A new frame.
+        """
+        if columns is None:
+            columns = [column for column in df.columns if column in COLUMN_FIELDS]
+        encoded = {}
+        for column in columns:
+            field = COLUMN_FIELDS[column]
+            if categorical:
+                encoded[column] = self.categorical(field, df[column], extend)
+            else:
+                encoded[column] = self.encode(field, df[column], extend)
+        return df.assign(**encoded)
+
+    def multi_hot(self, field, lists, prefix):
+        """
+        One indicator column per dictionary value occurring in ``lists``.
+
+        Args:
+            field (str): Field of the list items.
+            lists (pd.Series): Lists of values, or their text form as written
+                to customer_reports.csv.
+            prefix (str): Column name prefix; a column is named prefix + label.
+
+        Returns:
+            pd.DataFrame: int8 indicators with columns in code order, on
+            ``lists``' index.
+        """
+        lists = pd.Series(lists)
+        parsed = [parse_list(items) for items in lists]
+        lengths = np.fromiter((len(items) for items in parsed), dtype=np.int64, count=len(parsed))
+        rows = np.repeat(np.arange(len(parsed)), lengths)
+        codes = self.encode(field, [item for items in parsed for item in items])
+        known = codes != MISSING
+        present = np.unique(codes[known])
+        matrix = np.zeros((len(parsed), len(present)), dtype=np.int8)
+        matrix[rows[known], np.searchsorted(present, codes[known])] = 1
+        columns = [f"{prefix}{label}" for label in self.decode(field, present)]
+        return pd.DataFrame(matrix, index=lists.index, columns=columns)
+
+    def to_dict(self):
+        """JSON-serializable form (see from_dict)."""
+        return {"version": FORMAT_VERSION, "fields": self.categories, "columns": COLUMN_FIELDS}
+
+    @classmethod
+    def from_dict(cls, state):
+        """Rebuild a dictionary saved with to_dict()."""
+        if state.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported category dictionary version: {state.get('version')}")
+        return cls(state["fields"])
+
+    def save(self, path):
+        """Write the dictionary as JSON (atomically, so readers never see a partial file)."""
+        temporary = f"{path}.tmp"
+        with open(temporary, "w", encoding="utf-8") as handle:
+            json.dump(self.to_dict(), handle, ensure_ascii=False, indent=1)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a dictionary written by save()."""
+        with open(path, encoding="utf-8") as handle:
+            return cls.from_dict(json.load(handle))
+
+    @classmethod
+    def build(cls, data_dir, path=None, chunk_rows=1_000_000):
+        """
+        Collect every dictionary value from the raw files in ``data_dir``.
+
+        Args:
+            data_dir (str): Directory holding SOURCE_FILES (missing files are skipped).
+            path (str): Existing dictionary to extend; its codes are kept and
+                only new values are appended.
+            chunk_rows (int): Rows read per chunk.
+
+        Returns:
+            CategoryDictionary: The (extended) dictionary.
+        """
+        dictionary = cls.load(path) if path and os.path.exists(path) else cls()
+        for filename in SOURCE_FILES:
+            source = os.path.join(data_dir, filename)
+            if not os.path.exists(source):
+                continue
+            header = pd.read_csv(source, nrows=0).columns
+            columns = [column for column in header if column in COLUMN_FIELDS]
+            if not columns:
+                continue
+            seen = {column: set() for column in columns}
+            for chunk in pd.read_csv(source, usecols=columns, dtype=object, chunksize=chunk_rows):
+                for column in columns:
+                    seen[column].update(chunk[column].dropna().unique())
+            for column, values in seen.items():
+                dictionary.update(COLUMN_FIELDS[column], list(values))
+        return dictionary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build or extend the shared category dictionary.")
+    parser.add_argument("data_dir", help="Directory holding kyc.csv and the channel CSVs")
+    parser.add_argument("--output", help=f"Dictionary file (default: DATA_DIR/{DEFAULT_FILENAME})")
+    parser.add_argument("--chunk-rows", type=int, default=1_000_000)
+    args = parser.parse_args(argv)
+
+    output = args.output or os.path.join(args.data_dir, DEFAULT_FILENAME)
+    start = time.perf_counter()
+    before = CategoryDictionary.load(output) if os.path.exists(output) else CategoryDictionary()
+    dictionary = CategoryDictionary.build(args.data_dir, output, args.chunk_rows)
+    dictionary.save(output)
+    for field in FIELDS:
+        print(f"{field}: {dictionary.size(field):,} codes ({dictionary.size(field) - before.size(field):,} new)")
+    print(f"Wrote {output} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+ColumnProfile.py
+
+One-pass, bounded-memory column statistics for the EDA (Script3_EDA.py).
+
+A ColumnProfile is fed a column chunk by chunk and keeps:
+
+* row and null counts (exact);
+* an approximate distinct count: HyperLogLog, 2**p one-byte registers.
+  The standard error is 1.04 / sqrt(2**p), about 0.8% with the default p=14
+  (16 KiB per column), and small cardinalities are essentially exact;
+* the most frequent values: a mergeable Misra-Gries summary of `capacity`
+  counters. Every value whose true count exceeds n / (capacity + 1) is kept,
+  and each kept count is low by at most the reported `error`;
+* min / max (exact; numeric, or the string order for text columns);
+* quantiles of numeric columns with a KLLSketch (QuantileSketch.py);
+* the first distinct values seen (the old report's "unique_values" sample).
+
+Every summary merges (merge()), so profiles of separate chunks, tables or
+processes can be combined in any order.
+
+Usage:
+    from ColumnProfile import ColumnProfile
+    profile = ColumnProfile("amount_cad")
+    for chunk in pd.read_sql_query(sql, conn, chunksize=100_000):
+        profile.update(chunk["amount_cad"])
+    profile.to_dict()
+"""
+
+import numpy as np
+import pandas as pd
+
+from QuantileSketch import KLLSketch
+
+HLL_PRECISION = 14
+TOP_K = 10
+TOPK_CAPACITY = 1000
+SAMPLE_VALUES = 10
+QUANTILES = (0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99)
+QUANTILE_K = 400
+
+
+def hash_values(values):
+    """
+    64-bit hashes of a column's non-null values.
+
+    Numbers are hashed as float64 and everything else as its string form, so
+    a value hashes the same whichever dtype its chunk happened to load as.
+    """
+    values = pd.Series(values).dropna()
+    if pd.api.types.is_bool_dtype(values.dtype):
+        values = values.astype(float)
+    if pd.api.types.is_numeric_dtype(values.dtype):
+        return pd.util.hash_array(values.to_numpy(dtype=float))
+    return pd.util.hash_array(values.astype(str).to_numpy(dtype=object))
+
+
+def _bit_length(words):
+    # frexp is exact for integers below 2**53, so split the words in halves.
+    high = (words >> np.uint64(32)).astype(float)
+    low = (words & np.uint64(0xFFFFFFFF)).astype(float)
+    return np.where(high > 0, 32 + np.frexp(high)[1], np.frexp(low)[1])
+
+
+def _sigma(x):
+    if x == 1:
+        return np.inf
+    y, z = 1.0, x
+    while True:
+        x *= x
+        previous, z = z, z + x * y
+        y += y
+        if z == previous:
+            return z
+
+
+def _tau(x):
+    if x in (0, 1):
+        return 0.0
+    y, z = 1.0, 1 - x
+    while True:
+        x = np.sqrt(x)
+        y *= 0.5
+        previous, z = z, z - (1 - x) ** 2 * y
+        if z == previous:
+            return z / 3
+
+
+class HyperLogLog:
+    """
+    Approximate distinct count.
+
+    Attributes:
+        p (int): Precision; 2**p registers.
+        registers (np.ndarray): uint8 register per bucket.
+    """
+
+    def __init__(self, p=HLL_PRECISION):
+        if not 4 <= p <= 18:
+            raise ValueError("p must be between 4 and 18")
+        self.p = p
+        self.registers = np.zeros(2 ** p, dtype=np.uint8)
+
+    def update_hashes(self, hashes):
+        """Add 64-bit hashes (np.uint64 array)."""
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        if not len(hashes):
+            return self
+        buckets = (hashes >> np.uint64(64 - self.p)).astype(np.intp)
+        rest = hashes << np.uint64(self.p)
+        # Position of the first 1 bit in the remaining 64 - p bits.
+        ranks = np.minimum(65 - _bit_length(rest), 64 - self.p + 1).astype(np.uint8)
+        np.maximum.at(self.registers, buckets, ranks)
+        return self
+
+    def update(self, values):
+        """Add a chunk of values (nulls ignored)."""
+        return self.update_hashes(hash_values(values))
+
+    def merge(self, other):
+        if other.p != self.p:
+            raise ValueError("cannot merge HyperLogLogs of different precision")
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self):
+        """
+        Estimated number of distinct values: Ertl's improved estimator
+        ("New cardinality estimation algorithms for HyperLogLog sketches",
+        2017), which is unbiased from empty to full without the empirical
+        bias tables of HLL++.
+        """
+        m = len(self.registers)
+        q = 64 - self.p
+        histogram = np.bincount(self.registers, minlength=q + 2).astype(float)
+        z = m * _tau(1 - histogram[q + 1] / m)
+        for k in range(q, 0, -1):
+            z = 0.5 * (z + histogram[k])
+        z += m * _sigma(histogram[0] / m)
+        return int(round(m * m / (2 * np.log(2)) / z))
+
+    def to_dict(self):
+        return {"p": self.p, "registers": self.registers.tolist()}
+
+    @classmethod
+    def from_dict(cls, state):
+        sketch = cls(state["p"])
+        sketch.registers = np.asarray(state["registers"], dtype=np.uint8)
+        return sketch
+
+
+class FrequentValues:
+    """
+    Misra-Gries heavy hitters over chunks.
+
+    Attributes:
+        capacity (int): Counters kept.
+        counts (pd.Series): value -> lower bound of its count.
+        error (int): Upper bound on how much any count is too low.
+    """
+
+    def __init__(self, capacity=TOPK_CAPACITY):
+        self.capacity = capacity
+        self.counts = pd.Series(dtype="int64")
+        self.error = 0
+
+    def _prune(self):
+        if len(self.counts) <= self.capacity:
+            return
+        ordered = self.counts.sort_values(ascending=False, kind="stable")
+        cut = int(ordered.iloc[self.capacity])
+        ordered = ordered.iloc[:self.capacity] - cut
+        self.counts = ordered[ordered > 0]
+        self.error += cut
+
+    def update(self, values):
+        """Add a chunk of values (nulls ignored)."""
+        return self.update_counts(pd.Series(values).value_counts(dropna=True))
+
+    def update_counts(self, counts):
+        """Add precomputed value -> count pairs (a value_counts() Series)."""
+        counts = counts[counts > 0]
+        if not len(counts):
+            return self
+        counts = counts.astype("int64")
+        counts.index = counts.index.astype(object)
+        self.counts = self.counts.add(counts, fill_value=0).astype("int64")
+        self._prune()
+        return self
+
+    def merge(self, other):
+        self.error += other.error
+        return self.update_counts(other.counts)
+
+    def top(self, k=TOP_K):
+        """[(value, count lower bound)] of the k most frequent values."""
+        ordered = self.counts.sort_values(ascending=False, kind="stable").head(k)
+        return list(ordered.items())
+
+
+def json_value(value):
+    """A plain-Python, JSON-serializable version of a numpy / pandas scalar."""
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (int, float, str, bool)):
+        return value
+    return str(value)
+
+
+def _common_dtype(current, new):
+    if current is None or current == new:
+        return new
+    if pd.api.types.is_numeric_dtype(current) and pd.api.types.is_numeric_dtype(new):
+        return np.dtype("float64")
+    return np.dtype("object")
+
+
+class ColumnProfile:
+    """
+    Streaming statistics of one column (see the module docstring).
+
+    Attributes:
+        name (str): Column name.
+        rows (int): Values seen, nulls included.
+        nulls (int): Null values seen.
+        dtype: pandas dtype of the column (widened across chunks).
+    """
+
+    def __init__(self, name, hll_precision=HLL_PRECISION, topk_capacity=TOPK_CAPACITY,
+                 quantile_k=QUANTILE_K, sample_values=SAMPLE_VALUES):
+        self.name = name
+        self.rows = 0
+        self.nulls = 0
+        self.dtype = None
+        self.distinct = HyperLogLog(hll_precision)
+        self.frequent = FrequentValues(topk_capacity)
+        self.quantiles = KLLSketch(quantile_k)
+        self.min = None
+        self.max = None
+        self.sample_size = sample_values
+        self.sample = []
+
+    @property
+    def numeric(self):
+        return (self.dtype is not None and pd.api.types.is_numeric_dtype(self.dtype)
+                and not pd.api.types.is_bool_dtype(self.dtype))
+
+    def update(self, series):
+        """Add a chunk of the column."""
+        self.rows += len(series)
+        self.dtype = _common_dtype(self.dtype, series.dtype)
+        values = series.dropna()
+        self.nulls += len(series) - len(values)
+        if len(self.sample) < self.sample_size:
+            for value in series.drop_duplicates().head(self.sample_size).tolist():
+                value = json_value(value)
+                if value not in self.sample and len(self.sample) < self.sample_size:
+                    self.sample.append(value)
+        if not len(values):
+            return self
+        self.distinct.update(values)
+        self.frequent.update(values)
+        if pd.api.types.is_numeric_dtype(values.dtype) and not pd.api.types.is_bool_dtype(values.dtype):
+            self.quantiles.update(values.to_numpy(dtype=float))
+            low, high = float(values.min()), float(values.max())
+        else:
+            text = values.astype(str)
+            low, high = text.min(), text.max()
+        self._extend_range(low, high)
+        return self
+
+    def _extend_range(self, low, high):
+        if self.min is None:
+            self.min, self.max = low, high
+            return
+        try:
+            self.min, self.max = min(self.min, low), max(self.max, high)
+        except TypeError:
+            # Numbers in some chunks, text in others: compare as text.
+            self.min = min(str(self.min), str(low))
+            self.max = max(str(self.max), str(high))
+
+    def merge(self, other):
+        """Fold in a profile of the same column built on other rows."""
+        self.rows += other.rows
+        self.nulls += other.nulls
+        if other.dtype is not None:
+            self.dtype = _common_dtype(self.dtype, other.dtype)
+        self.distinct.merge(other.distinct)
+        self.frequent.merge(other.frequent)
+        self.quantiles.merge(other.quantiles)
+        if other.min is not None:
+            self._extend_range(other.min, other.max)
+        for value in other.sample:
+            if value not in self.sample and len(self.sample) < self.sample_size:
+                self.sample.append(value)
+        return self
+
+    def to_dict(self, top_k=TOP_K, quantiles=QUANTILES):
+        """The column's statistics as plain JSON-serializable values."""
+        result = {
+            "dtype": str(self.dtype),
+            "rows": self.rows,
+            "nulls": self.nulls,
+            "distinct_approx": min(self.distinct.count(), self.rows - self.nulls),
+            "top_values": [[json_value(value), int(count)] for value, count in self.frequent.top(top_k)],
+            "top_values_max_error": self.frequent.error,
+            "min": json_value(self.min),
+            "max": json_value(self.max),
+            "sample_values": self.sample,
+        }
+        if self.numeric and self.quantiles.n:
+            result["quantiles"] = {f"p{round(q * 100):02d}": json_value(float(value)) for q, value
+                                   in zip(quantiles, np.atleast_1d(self.quantiles.quantile(list(quantiles))))}
+            result["quantile_rank_error"] = self.quantiles.rank_error()
+        return result
@@ -0,0 +1,602 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FeatureEng.py
+
+Importable, command-line version of Scripts/FeatureEng.ipynb, which produces
+the imi_features.csv the Streamlit dashboard runs on.
+
+The notebook broadcasts every customer aggregate onto the transaction frame
+with its own `df = df.merge(<per-customer series>, on='customer_id')`, so the
+full transaction-level frame is copied once per feature group. Here the
+pipeline is split into:
+
+1. build_final_transactions(): union the six channel CSVs and join KYC and
+   industry codes -> final_transactions.csv (identical to the notebook).
+2. add_transaction_columns(): the row-level columns (time parts, flags,
+   gaps, outlier markers, amount category).
+3. build_customer_table(): every customer-level aggregate in one narrow
+   table (one row per customer).
+4. build_features(): joins the customer table onto the transactions once and
+   returns the notebook's column layout.
+
+The output keeps the notebook's columns, order and values, including the
+%night_txns_x/_y, %day_txns_x/_y and std_night_txns_x/_y pairs created by
+its repeated merges, so existing consumers are unaffected.
+
+Usage:
+    python FeatureEng.py DATA_DIR [--output imi_features.csv] [--rebuild-transactions]
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from TimeSegments import CustomerSegments
+
+# Channel file -> its transaction id column.
+CHANNELS = {
+    "abm": "abm_id",
+    "card": "card_trxn_id",
+    "cheque": "cheque_id",
+    "eft": "eft_id",
+    "emt": "emt_id",
+    "wire": "wire_id",
+}
+
+# Customer-level columns in the order the notebook's merges produce them.
+CUSTOMER_COLUMNS = [
+    "txn_count", "avg_txn_per_month", "avg_txn_per_week", "avg_txn_per_year",
+    "avg_gap_between_txns_month", "std_gap_between_txns", "max_time_between_txns",
+    "min_time_between_txns", "same_day_multiple_txn", "std_same_day_txn", "modality_txn_count",
+    "total_spent", "avg_spent", "std_txn_amount_per_month", "avg_spent_per_month",
+    "std_spent_per_month", "deposit_withdrawal_ratio", "%_round_txns",
+    "small_txn_count", "medium_txn_count", "large_txn_count",
+    "avg_days_between_small_txn", "avg_days_between_medium_txn", "avg_days_between_large_txn",
+    "sudden_spike_ratio", "in_out_balance", "%txn_first_5_days_month",
+    "%txn_last_5_days_month", "%months_irregular_std",
+    "most_freq_merchant_category", "most_freq_industry_code", "modality_txn_amount",
+    "modality_txn_industry", "avg_txn_amount_per_merchant_type",
+    "%txn_outside_user_country", "%txn_high_risk_countries", "%txn_high_risk_provinces",
+    "%txn_high_risk_cities", "%txn_high_risk_industries", "num_unique_countries",
+    "%night_txns_x", "%day_txns_x", "std_night_txns_x",
+    "txn_per_employee", "avg_txn_amount_per_employee",
+    "%night_txns_y", "%day_txns_y", "std_night_txns_y", "std_day_txns", "%_round_txns_extra",
+]
+
+# Defaults the notebook's fillna() calls apply to customer columns. Columns not
+# listed (e.g. gap statistics, std_night_txns_y) keep their NaNs.
+CUSTOMER_DEFAULTS = {
+    "modality_txn_count": 0, "same_day_multiple_txn": 0, "std_same_day_txn": 0,
+    "std_txn_amount_per_month": 0, "std_spent_per_month": 0,
+    "deposit_withdrawal_ratio": 0, "%_round_txns": 0,
+    "small_txn_count": 0, "medium_txn_count": 0, "large_txn_count": 0,
+    "avg_days_between_small_txn": 0, "avg_days_between_medium_txn": 0,
+    "avg_days_between_large_txn": 0,
+    "sudden_spike_ratio": 0, "in_out_balance": 0, "%txn_first_5_days_month": 0,
+    "%txn_last_5_days_month": 0, "%months_irregular_std": 0,
+    "most_freq_merchant_category": "Unknown", "most_freq_industry_code": "Unknown",
+    "modality_txn_amount": 0, "modality_txn_industry": 0, "avg_txn_amount_per_merchant_type": 0,
+    "%txn_outside_user_country": 0, "%txn_high_risk_countries": 0,
+    "%txn_high_risk_provinces": 0, "%txn_high_risk_cities": 0,
+    "%txn_high_risk_industries": 0, "num_unique_countries": 0,
+    "%night_txns_x": 0, "%day_txns_x": 0, "std_night_txns_x": 0,
+    "txn_per_employee": 0, "avg_txn_amount_per_employee": 0,
+    "std_day_txns": 0, "%_round_txns_extra": 0,
+}
+
+# Output columns appended to final_transactions.csv, in notebook order.
+FEATURE_COLUMNS = [
+    "txn_hour", "txn_weekday", "weekend_txn", "odd_hour_txn",
+    *CUSTOMER_COLUMNS[:4], "txn_gap", *CUSTOMER_COLUMNS[4:11],
+    "high_txn_outlier", "low_txn_outlier", "large_cash_txn", "is_round_txn",
+    *CUSTOMER_COLUMNS[11:18], "txn_category", *CUSTOMER_COLUMNS[18:24],
+    "day_of_month", "first_5_days", "last_5_days", *CUSTOMER_COLUMNS[24:34],
+    "txn_high_risk_country", "txn_high_risk_province", "txn_high_risk_city",
+    "outside_home_country", "high_risk_industry", "country_risk", "province_risk", "city_risk",
+    *CUSTOMER_COLUMNS[34:40], "night_txn", "day_txn", *CUSTOMER_COLUMNS[40:45],
+    "round_txn_extra", *CUSTOMER_COLUMNS[45:],
+]
+
+
+def build_final_transactions(data_dir, write=True):
+    """
+    Union the channel files and attach KYC and industry information.
+
+    Args:
+        data_dir (str): Directory holding abm/card/cheque/eft/emt/wire.csv,
+            kyc.csv and kyc_industry_codes.csv.
+        write (bool): Also write transactions.csv and final_transactions.csv
+            to data_dir, as the notebook does.
+
+    Returns:
+        pd.DataFrame: Transaction-level frame with KYC columns.
+    """
+    frames = [channel_frame(pd.read_csv(os.path.join(data_dir, f"{source}.csv")), source)
+              for source in CHANNELS]
+    transactions = pd.concat(frames, ignore_index=True)
+    if write:
+        transactions.to_csv(os.path.join(data_dir, "transactions.csv"), index=False)
+
+    kyc = pd.read_csv(os.path.join(data_dir, "kyc.csv"))
+    industry_codes = pd.read_csv(os.path.join(data_dir, "kyc_industry_codes.csv"))
+    final = attach_kyc(transactions, kyc, industry_codes)
+    if write:
+        final.to_csv(os.path.join(data_dir, "final_transactions.csv"), index=False)
+    return final
+
+
+def channel_frame(frame, source):
+    """Tag one channel's rows with their source and the shared column names."""
+    frame["source"] = source
+    frame = frame.rename(columns={CHANNELS[source]: "transaction_id"})
+    for column in ("country", "province", "city", "transaction_time"):
+        frame[column] = frame.get(column, pd.NA)
+    return frame
+
+
+def attach_kyc(transactions, kyc, industry_codes):
+    """
+    Join KYC and industry code columns onto channel transactions.
+
+    Args:
+        transactions (pd.DataFrame): Output of channel_frame() (or a concat of them).
+        kyc (pd.DataFrame): kyc.csv.
+        industry_codes (pd.DataFrame): kyc_industry_codes.csv.
+
+    Returns:
+        pd.DataFrame: Transactions with trans_* and cust_* location columns.
+    """
+    merged = transactions.merge(kyc, on="customer_id", how="left")
+    merged["industry_code"] = merged["industry_code"].astype(str)
+    industry_codes = industry_codes.assign(industry_code=industry_codes["industry_code"].astype(str))
+    final = merged.merge(industry_codes, on="industry_code", how="left")
+    final = final.rename(columns={
+        "country_x": "trans_country",
+        "province_x": "trans_province",
+        "city_x": "trans_city",
+        "country_y": "cust_country",
+        "province_y": "cust_province",
+        "city_y": "cust_city",
+    })
+    return final
+
+
+def high_risk_values(risk_score, percentile):
+    """Values whose outlier count is at or above the given percentile of all counts."""
+    threshold = np.percentile(risk_score, percentile)
+    return risk_score[risk_score >= threshold].index.tolist()
+
+
+# ---------------------------------------------------------------------------
+# Vectorized per-customer reductions. Each one replaces a notebook
+# groupby(...).apply(lambda ...) that ran Python once per customer; they are
+# checked against those lambdas in FeatureEng_apply_benchmark.py.
+
+def repeated_value_count(sizes):
+    """
+    Number of values seen more than once per customer.
+
+    Args:
+        sizes (pd.Series): Occurrence counts indexed by (customer_id, value),
+            e.g. df.groupby(["customer_id", "amount_cad"]).size().
+
+    Returns:
+        pd.Series: Per customer_id, how many distinct values have count > 1.
+    """
+    return (sizes > 1).groupby(level=0).sum()
+
+
+def deposit_withdrawal_ratio(customer_id, debit_credit):
+    """
+    Deposits (debit_credit == 1) over withdrawals (debit_credit == -1) per
+    customer; NaN when a customer has no withdrawals.
+    """
+    deposits = (debit_credit == 1).groupby(customer_id).sum()
+    withdrawals = (debit_credit == -1).groupby(customer_id).sum()
+    return deposits / withdrawals.where(withdrawals > 0)
+
+
+def in_out_balance(customer_id, amount):
+    """Sum of positive amounts minus the absolute sum of negative amounts, per customer."""
+    incoming = amount.where(amount > 0, 0).groupby(customer_id).sum()
+    outgoing = amount.where(amount < 0, 0).groupby(customer_id).sum()
+    return incoming - outgoing.abs()
+
+
+def irregular_std_months(monthly_std, threshold=0.5):
+    """
+    Percentage of a customer's months whose amount std moved by more than
+    ``threshold`` (relative) from the previous month.
+
+    Matches pct_change() with forward-filled gaps, computed per customer with
+    grouped ffill/shift instead of one pct_change call per customer.
+
+    Args:
+        monthly_std (pd.Series): Std of amount_cad indexed by (customer_id,
+            month), sorted by customer then month.
+        threshold (float): Relative change counted as irregular.
+    """
+    by_customer = monthly_std.groupby(level=0)
+    filled = by_customer.ffill()
+    previous = filled.groupby(level=0).shift(1)
+    irregular = ((filled / previous - 1).abs() > threshold)
+    return irregular.groupby(level=0).mean() * 100
+
+
+def most_frequent(customer_id, values):
+    """
+    Most frequent non-null value per customer, ties broken by the smallest
+    value (what Series.mode().iloc[0] returns). Customers with only nulls
+    are absent from the result.
+    """
+    counts = values.groupby([customer_id, values]).size()
+    ranked = pd.DataFrame({
+        "customer_id": counts.index.get_level_values(0),
+        "value": counts.index.get_level_values(1),
+        "count": counts.to_numpy(),
+    })
+    # counts is sorted by (customer, value); a stable sort on count keeps the
+    # smallest value first among ties.
+    ranked = ranked.sort_values(["customer_id", "count"], ascending=[True, False], kind="stable")
+    first = ranked.drop_duplicates("customer_id")
+    return pd.Series(first["value"].to_numpy(), index=pd.Index(first["customer_id"].to_numpy(), name="customer_id"))
+
+
+# Flag column -> the column whose values are tested against a high-risk list.
+HIGH_RISK_FLAGS = {
+    "txn_high_risk_country": "trans_country",
+    "txn_high_risk_province": "trans_province",
+    "txn_high_risk_city": "trans_city",
+    "high_risk_industry": "industry_code",
+}
+
+# Percentile of per-value outlier counts at or above which a value is high-risk.
+HIGH_RISK_PERCENTILES = {
+    "txn_high_risk_country": 90,
+    "txn_high_risk_province": 90,
+    "txn_high_risk_city": 95,
+    "high_risk_industry": 90,
+}
+
+
+# Location column -> its per-value outlier count column.
+LOCATION_RISK = {
+    "trans_country": "country_risk",
+    "trans_province": "province_risk",
+    "trans_city": "city_risk",
+}
+
+
+def isin_categorical(values, members):
+    """
+    Set membership evaluated once per distinct value instead of once per row.
+
+    Args:
+        values (pd.Series): Column to test; converted to a categorical if it is
+            not one already.
+        members (list): Values that count as members.
+
+    Returns:
+        np.ndarray: Boolean mask, False for missing values.
+    """
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype("category")
+    # Code -1 (missing) picks the trailing False.
+    lookup = np.append(values.cat.categories.isin(members), False)
+    return lookup[values.cat.codes.to_numpy()]
+
+
+# Flag column -> (source column, vectorized predicate over its values as floats).
+# Missing values are NaN, which every predicate maps to False.
+VALUE_FLAGS = {
+    "weekend_txn": ("txn_weekday", lambda v: (v == 5) | (v == 6)),
+    "odd_hour_txn": ("txn_hour", lambda v: (v >= 0) & (v < 5)),
+    "night_txn": ("txn_hour", lambda v: (v >= 0) & (v < 6)),
+    "day_txn": ("txn_hour", lambda v: (v >= 6) & (v < 18)),
+    "is_round_txn": ("amount_cad", lambda v: np.mod(v, 10) == 0),
+    "round_txn_extra": ("amount_cad", lambda v: np.mod(v, 100) == 0),
+    "first_5_days": ("day_of_month", lambda v: v <= 5),
+    "last_5_days": ("day_of_month", lambda v: v >= 25),
+}
+
+
+def build_flags(df, high_risk):
+    """
+    Compute every 0/1 transaction flag in one vectorized pass.
+
+    Args:
+        df (pd.DataFrame): Transactions with the VALUE_FLAGS and
+            HIGH_RISK_FLAGS source columns.
+        high_risk (dict): HIGH_RISK_FLAGS name -> list of high-risk values.
+
+    Returns:
+        dict: Flag name -> int8 numpy array.
+    """
+    arrays = {}
+    flags = {}
+    with np.errstate(invalid="ignore"):
+        for name, (column, predicate) in VALUE_FLAGS.items():
+            if column not in arrays:
+                arrays[column] = df[column].to_numpy(dtype=float)
+            flags[name] = predicate(arrays[column]).astype(np.int8)
+    for name, column in HIGH_RISK_FLAGS.items():
+        flags[name] = isin_categorical(df[column], high_risk[name]).astype(np.int8)
+    return flags
+
+
+def dataset_statistics(df):
+    """
+    Dataset-wide values every customer's features depend on, computed exactly
+    from the full transaction frame.
+
+    Args:
+        df (pd.DataFrame): Transactions with parsed transaction_date (as
+            inside add_transaction_columns()).
+
+    Returns:
+        dict: "thresholds" (first_pass / high / low / small / medium amount
+        cut-offs), "high_risk" (HIGH_RISK_FLAGS name -> value list),
+        "location_risk" (column -> first-pass outlier count per value),
+        n_months / n_weeks / n_years (distinct periods) and last_60_days.
+        FeaturePartitions.py builds the same dict in streaming passes.
+    """
+    amount = df["amount_cad"]
+    # The notebook's first pass flags outliers with Series.quantile (NaN-skipping);
+    # the location/industry risk lists are built from that pass.
+    thresholds = {
+        "first_pass": amount.quantile(0.99),
+        "high": np.percentile(amount, 99),
+        "low": np.percentile(amount, 3),
+        "small": np.percentile(amount, 33),
+        "medium": np.percentile(amount, 66),
+    }
+    first_pass_outlier = (amount > thresholds["first_pass"]).astype(int)
+    high_risk = {
+        name: high_risk_values(first_pass_outlier.groupby(df[column]).sum(), HIGH_RISK_PERCENTILES[name])
+        for name, column in HIGH_RISK_FLAGS.items()
+    }
+    outlier_rows = df.loc[first_pass_outlier.to_numpy() == 1]
+    location_risk = {column: outlier_rows.groupby(column)["transaction_id"].count()
+                     for column in LOCATION_RISK}
+
+    dates = df["transaction_date"]
+    return {
+        "thresholds": thresholds,
+        "high_risk": high_risk,
+        "location_risk": location_risk,
+        "n_months": dates.dt.to_period("M").nunique(),
+        "n_weeks": dates.dt.to_period("W").nunique(),
+        "n_years": dates.dt.to_period("Y").nunique(),
+        "last_60_days": dates.max() - pd.DateOffset(days=60),
+    }
+
+
+def add_transaction_columns(df, statistics=None):
+    """
+    Sort the transactions and derive the row-level feature columns.
+
+    Args:
+        df (pd.DataFrame): final_transactions.csv as read by pd.read_csv.
+        statistics (dict): Dataset-wide values (see dataset_statistics()).
+            Computed from ``df`` when omitted; pass them in when ``df`` is
+            only one partition of the data.
+
+    Returns:
+        tuple: (frame, context). frame is a new DataFrame sorted by customer
+        and date with the row-level columns added; context holds the
+        dataset-wide values (month keys, thresholds, high-risk value lists,
+        the CustomerSegments of the sorted frame) the customer table needs.
+    """
+    # Sorted once; every per-customer time series below reads these segments.
+    segments = CustomerSegments(df["customer_id"], pd.to_datetime(df["transaction_date"]))
+    df = df.take(segments.order).reset_index(drop=True)
+
+    df["transaction_date"] = segments.dates()
+    df["transaction_time"] = pd.to_datetime(df["transaction_time"], format="%H:%M:%S", errors="coerce")
+    df["txn_hour"] = df["transaction_time"].dt.hour
+    df["txn_weekday"] = df["transaction_date"].dt.weekday
+    df["day_of_month"] = df["transaction_date"].dt.day
+    df["txn_gap"] = segments.gaps()
+
+    if statistics is None:
+        statistics = dataset_statistics(df)
+    thresholds = statistics["thresholds"]
+    df["high_txn_outlier"] = (df["amount_cad"] > thresholds["high"]).astype(int)
+    df["low_txn_outlier"] = (df["amount_cad"] < thresholds["low"]).astype(int)
+    df["large_cash_txn"] = ((df["cash_indicator"] == 1) & (df["amount_cad"] > thresholds["high"])).astype(int)
+
+    df["txn_category"] = pd.cut(
+        df["amount_cad"],
+        bins=[-np.inf, thresholds["small"], thresholds["medium"], np.inf],
+        labels=["small", "medium", "large"]
+    )
+
+    for name, values in build_flags(df, statistics["high_risk"]).items():
+        df[name] = values
+    df["outside_home_country"] = (df["trans_country"] != df["cust_country"]).astype(int)
+
+    # Outlier counts per location are location-level, not customer-level.
+    for column, name in LOCATION_RISK.items():
+        df[name] = df[column].map(statistics["location_risk"][column]).fillna(0)
+
+    df["employee_count"] = df["employee_count"].replace(0, np.nan)
+
+    context = {
+        "month": df["transaction_date"].dt.to_period("M"),
+        "time_month": df["transaction_time"].dt.to_period("M"),
+        "n_months": statistics["n_months"],
+        "n_weeks": statistics["n_weeks"],
+        "n_years": statistics["n_years"],
+        "last_60_days": statistics["last_60_days"],
+        "high_risk": statistics["high_risk"],
+        "segments": segments,
+    }
+    return df, context
+
+
+def build_customer_table(df, context):
+    """
+    Compute every customer-level aggregate into one narrow table.
+
+    Args:
+        df (pd.DataFrame): Output frame of add_transaction_columns().
+        context (dict): Its dataset-wide values.
+
+    Returns:
+        pd.DataFrame: One row per customer_id (the index), CUSTOMER_COLUMNS
+        as columns, with the notebook's NaN defaults applied.
+    """
+    by_customer = df.groupby("customer_id")
+    month = context["month"]
+    segments = context["segments"]
+    per_customer = segments.to_series
+    features = {}
+
+    # Frequency
+    txn_count = per_customer(segments.count_rows(df["transaction_id"].notna().to_numpy()))
+    features["txn_count"] = txn_count
+    features["avg_txn_per_month"] = txn_count / context["n_months"]
+    features["avg_txn_per_week"] = txn_count / context["n_weeks"]
+    features["avg_txn_per_year"] = txn_count / context["n_years"]
+
+    # Gaps and same-day activity, from the sorted customer segments
+    gaps = df["txn_gap"].to_numpy()
+    features["avg_gap_between_txns_month"] = per_customer(segments.mean(gaps))
+    features["std_gap_between_txns"] = per_customer(segments.std(gaps))
+    features["max_time_between_txns"] = per_customer(segments.max(gaps))
+    features["min_time_between_txns"] = per_customer(segments.min(gaps))
+    day_segment, _, day_count = segments.runs(segments.ns)
+    features["same_day_multiple_txn"] = per_customer(segments.mean(day_count, segment=day_segment))
+    features["std_same_day_txn"] = per_customer(segments.std(day_count, segment=day_segment))
+    month_segment, _, month_count = segments.runs(segments.month_keys())
+    features["modality_txn_count"] = per_customer(segments.repeated_lengths(month_segment, month_count))
+
+    # Amounts
+    amounts = by_customer["amount_cad"]
+    features["total_spent"] = amounts.sum()
+    features["avg_spent"] = amounts.mean()
+    features["std_txn_amount_per_month"] = amounts.std()
+    monthly_amounts = df.groupby(["customer_id", month])["amount_cad"].agg(["mean", "std"]).groupby("customer_id")
+    features["avg_spent_per_month"] = monthly_amounts["mean"].mean()
+    features["std_spent_per_month"] = monthly_amounts["std"].mean()
+    features["deposit_withdrawal_ratio"] = deposit_withdrawal_ratio(df["customer_id"], df["debit_credit"])
+    features["%_round_txns"] = by_customer["is_round_txn"].mean() * 100
+
+    # Amount categories
+    categories = df["txn_category"].cat.categories
+    codes = df["txn_category"].cat.codes.to_numpy()
+    category_counts = segments.count_by(codes, len(categories))
+    gap_sums = segments.count_by(codes, len(categories), values=gaps)
+    gap_counts = segments.count_by(codes, len(categories), values=np.where(np.isnan(gaps), np.nan, 1.0))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        gap_means = gap_sums / gap_counts
+    for i, category in enumerate(categories):
+        features[f"{category}_txn_count"] = per_customer(category_counts[:, i])
+    for i, category in enumerate(categories):
+        features[f"avg_days_between_{category}_txn"] = per_customer(gap_means[:, i])
+
+    # Timing within the dataset and the month
+    recent = (df["transaction_date"] >= context["last_60_days"]) & df["transaction_id"].notna()
+    features["sudden_spike_ratio"] = per_customer(segments.count_rows(recent.to_numpy())) / txn_count
+    features["in_out_balance"] = in_out_balance(df["customer_id"], df["amount_cad"])
+    features["%txn_first_5_days_month"] = by_customer["first_5_days"].mean() * 100
+    features["%txn_last_5_days_month"] = by_customer["last_5_days"].mean() * 100
+    monthly_std = df.groupby(["customer_id", month])["amount_cad"].std()
+    features["%months_irregular_std"] = irregular_std_months(monthly_std)
+
+    # Merchants and industries
+    # Customers without any merchant / industry value get "Unknown" via CUSTOMER_DEFAULTS.
+    features["most_freq_merchant_category"] = most_frequent(df["customer_id"], df["merchant_category"])
+    features["most_freq_industry_code"] = most_frequent(df["customer_id"], df["industry_code"])
+    features["modality_txn_amount"] = repeated_value_count(df.groupby(["customer_id", "amount_cad"]).size())
+    features["modality_txn_industry"] = repeated_value_count(df.groupby(["customer_id", "industry_code"]).size())
+    features["avg_txn_amount_per_merchant_type"] = df.groupby(["customer_id", "merchant_category"])["amount_cad"] \
+        .mean().groupby("customer_id").mean()
+
+    # Geography and industry risk
+    features["%txn_outside_user_country"] = by_customer["outside_home_country"].mean() * 100
+    features["%txn_high_risk_countries"] = by_customer["txn_high_risk_country"].mean() * 100
+    features["%txn_high_risk_provinces"] = by_customer["txn_high_risk_province"].mean() * 100
+    features["%txn_high_risk_cities"] = by_customer["txn_high_risk_city"].mean() * 100
+    features["%txn_high_risk_industries"] = by_customer["high_risk_industry"].mean() * 100
+    features["num_unique_countries"] = by_customer["trans_country"].nunique()
+
+    # Time of day. The notebook merges these twice; the first copy (_x) is
+    # NaN-filled, the second (_y) is not.
+    night_ratio = by_customer["night_txn"].mean() * 100
+    day_ratio = by_customer["day_txn"].mean() * 100
+    time_month = context["time_month"]
+    std_night = df.groupby(["customer_id", time_month])["night_txn"].mean().groupby("customer_id").std()
+    std_day = df.groupby(["customer_id", time_month])["day_txn"].mean().groupby("customer_id").std()
+    features["%night_txns_x"] = night_ratio
+    features["%day_txns_x"] = day_ratio
+    features["std_night_txns_x"] = std_night
+
+    # Business size
+    employee_count = by_customer["employee_count"].first()
+    features["txn_per_employee"] = txn_count / employee_count
+    features["avg_txn_amount_per_employee"] = features["total_spent"] / employee_count
+
+    features["%night_txns_y"] = night_ratio
+    features["%day_txns_y"] = day_ratio
+    features["std_night_txns_y"] = std_night
+    features["std_day_txns"] = std_day
+    features["%_round_txns_extra"] = by_customer["round_txn_extra"].mean() * 100
+
+    customers = pd.concat([features[name].rename(name) for name in CUSTOMER_COLUMNS], axis=1)
+    customers.index.name = "customer_id"
+    return customers.fillna(CUSTOMER_DEFAULTS)
+
+
+def build_features(df, statistics=None):
+    """
+    Produce the imi_features table from final_transactions.
+
+    Args:
+        df (pd.DataFrame): final_transactions.csv as read by pd.read_csv.
+            It is not modified.
+        statistics (dict): Dataset-wide values for add_transaction_columns()
+            (default: computed from ``df``).
+
+    Returns:
+        pd.DataFrame: Transactions sorted by customer and date with the
+        notebook's feature columns, customer aggregates joined once.
+    """
+    input_columns = list(df.columns)
+    df, context = add_transaction_columns(df, statistics)
+    customers = build_customer_table(df, context)
+    features = df.join(customers, on="customer_id")
+    return features[input_columns + FEATURE_COLUMNS]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build imi_features.csv from the raw transaction files.")
+    parser.add_argument("data_dir", help="Directory with the channel, kyc and industry code CSVs")
+    parser.add_argument("--output", help="Output CSV (default: DATA_DIR/imi_features.csv)")
+    parser.add_argument("--rebuild-transactions", action="store_true",
+                        help="Rebuild final_transactions.csv even if it already exists")
+    args = parser.parse_args(argv)
+
+    final_path = os.path.join(args.data_dir, "final_transactions.csv")
+    output = args.output or os.path.join(args.data_dir, "imi_features.csv")
+
+    start = time.perf_counter()
+    if args.rebuild_transactions or not os.path.exists(final_path):
+        build_final_transactions(args.data_dir)
+        print(f"Built {final_path} in {time.perf_counter() - start:.1f}s")
+
+    # Read back from disk so dtypes match what the notebook works with.
+    step = time.perf_counter()
+    features = build_features(pd.read_csv(final_path))
+    print(f"Built {len(features):,} x {features.shape[1]} features in {time.perf_counter() - step:.1f}s")
+
+    features.to_csv(output, index=False)
+    print(f"Wrote {output} (total {time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FeatureEng_apply_benchmark.py
+
+Check the vectorized per-customer reductions in FeatureEng.py against the
+notebook's groupby(...).apply(lambda ...) versions and time both.
+
+For every feature the lambda (reference) and vectorized results are compared
+per customer (NaN == NaN, floats with rtol=1e-9) before any timing is
+reported. Data is synthetic: integer customer ids, a year of dates, lognormal
+amounts with repeated round values and some negatives, +1/-1 debit_credit,
+sparse merchant categories and string industry codes.
+
+Usage:
+    python FeatureEng_apply_benchmark.py [--rows 1000000 50000000] [--customers-ratio 100]
+                                         [--skip-reference-above N]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import FeatureEng
+from TimeSegments import CustomerSegments
+
+# Notebook versions (Scripts/FeatureEng.ipynb), one Python call per customer.
+REFERENCE = {
+    "modality_txn_count": lambda df, ctx: ctx["monthly_counts"].groupby("customer_id").apply(
+        lambda x: (x.value_counts() > 1).sum()),
+    "modality_txn_amount": lambda df, ctx: df.groupby(["customer_id", "amount_cad"]).size()
+        .groupby("customer_id").apply(lambda x: (x > 1).sum()),
+    "modality_txn_industry": lambda df, ctx: df.groupby(["customer_id", "industry_code"]).size()
+        .groupby("customer_id").apply(lambda x: (x > 1).sum()),
+    "deposit_withdrawal_ratio": lambda df, ctx: df.groupby("customer_id")["debit_credit"].apply(
+        lambda x: (x == 1).sum() / (x == -1).sum() if (x == -1).sum() > 0 else np.nan),
+    "in_out_balance": lambda df, ctx: df.groupby("customer_id")["amount_cad"].apply(
+        lambda x: x[x > 0].sum() - abs(x[x < 0].sum())),
+    "%months_irregular_std": lambda df, ctx: ctx["monthly_std"].groupby("customer_id").apply(
+        lambda x: ((x.ffill().pct_change(fill_method=None).abs() > 0.5).sum() / len(x)) * 100),
+    "most_freq_merchant_category": lambda df, ctx: df.groupby("customer_id")["merchant_category"].agg(
+        lambda x: x.mode().iloc[0] if not x.mode().empty else "Unknown"),
+    "most_freq_industry_code": lambda df, ctx: df.groupby("customer_id")["industry_code"].agg(
+        lambda x: x.mode().iloc[0] if not x.mode().empty else "Unknown"),
+}
+
+def month_modality(df):
+    """modality_txn_count as FeatureEng computes it, from the sorted customer segments."""
+    segments = CustomerSegments(df["customer_id"], df["transaction_date"])
+    month_segment, _, month_count = segments.runs(segments.month_keys())
+    return segments.to_series(segments.repeated_lengths(month_segment, month_count))
+
+
+VECTORIZED = {
+    "modality_txn_count": lambda df, ctx: month_modality(df),
+    "modality_txn_amount": lambda df, ctx: FeatureEng.repeated_value_count(
+        df.groupby(["customer_id", "amount_cad"]).size()),
+    "modality_txn_industry": lambda df, ctx: FeatureEng.repeated_value_count(
+        df.groupby(["customer_id", "industry_code"]).size()),
+    "deposit_withdrawal_ratio": lambda df, ctx: FeatureEng.deposit_withdrawal_ratio(
+        df["customer_id"], df["debit_credit"]),
+    "in_out_balance": lambda df, ctx: FeatureEng.in_out_balance(df["customer_id"], df["amount_cad"]),
+    "%months_irregular_std": lambda df, ctx: FeatureEng.irregular_std_months(ctx["monthly_std"]),
+    "most_freq_merchant_category": lambda df, ctx: FeatureEng.most_frequent(
+        df["customer_id"], df["merchant_category"]),
+    "most_freq_industry_code": lambda df, ctx: FeatureEng.most_frequent(
+        df["customer_id"], df["industry_code"]),
+}
+
+# Value FeatureEng.build_customer_table() fills in for customers missing
+# from a vectorized result.
+FILL = {name: FeatureEng.CUSTOMER_DEFAULTS.get(name) for name in VECTORIZED}
+
+
+def make_transactions(n_rows, n_customers, seed=0):
+    """Synthetic transactions with the columns the reductions read."""
+    rng = np.random.default_rng(seed)
+    # Skewed activity: a few customers hold most transactions.
+    weights = rng.pareto(1.2, n_customers) + 0.05
+    customer_id = rng.choice(n_customers, size=n_rows, p=weights / weights.sum())
+    amount = np.round(rng.lognormal(5, 1.5, n_rows), 2)
+    repeated = rng.random(n_rows) < 0.1
+    amount[repeated] = rng.choice([100.0, 500.0, 1000.0, 9500.0], repeated.sum())
+    amount[rng.random(n_rows) < 0.05] *= -1
+    merchant = rng.choice(np.array([5411, 5812, 5999, 7011], dtype=float), n_rows)
+    merchant[rng.random(n_rows) < 0.6] = np.nan
+    industry = pd.Categorical.from_codes(rng.integers(-1, 6, n_rows),
+                                         categories=["4561", "4013", "7771", "6031", "9726", "other"])
+    df = pd.DataFrame({
+        "customer_id": customer_id,
+        "transaction_date": pd.Timestamp("2023-01-01") + pd.to_timedelta(rng.integers(0, 365, n_rows), unit="D"),
+        "amount_cad": amount,
+        "debit_credit": rng.choice(np.array([1, -1], dtype=np.int8), n_rows, p=[0.6, 0.4]),
+        "merchant_category": merchant,
+        "industry_code": np.asarray(industry, dtype=object),
+    })
+    return df.sort_values(["customer_id", "transaction_date"], kind="stable").reset_index(drop=True)
+
+
+def prepare(df):
+    """Monthly series shared by the modality / irregular-std features."""
+    month = df["transaction_date"].dt.to_period("M")
+    return {
+        "monthly_counts": df.groupby(["customer_id", month])["amount_cad"].count(),
+        "monthly_std": df.groupby(["customer_id", month])["amount_cad"].std(),
+    }
+
+
+def compare(reference, vectorized, fill):
+    """Number of customers whose values differ (after the pipeline's fill)."""
+    extra = len(vectorized.index.difference(reference.index))
+    if fill is not None:
+        reference = reference.fillna(fill)
+        vectorized = vectorized.reindex(reference.index).fillna(fill)
+    else:
+        vectorized = vectorized.reindex(reference.index)
+    left, right = reference.to_numpy(), vectorized.to_numpy()
+    if pd.api.types.is_numeric_dtype(reference) and pd.api.types.is_numeric_dtype(vectorized):
+        same = np.isclose(left.astype(float), right.astype(float), rtol=1e-9, atol=1e-9, equal_nan=True)
+    else:
+        same = np.array([a == b or (pd.isna(a) and pd.isna(b)) for a, b in zip(left, right)])
+    return int((~same).sum()) + extra
+
+
+def timed(fn, *args, repeat=1):
+    best, result = np.inf, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Lambda vs vectorized per-customer features.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000, 50_000_000])
+    parser.add_argument("--customers-ratio", type=int, default=100,
+                        help="Transactions per customer on average (default 100)")
+    parser.add_argument("--skip-reference-above", type=int, default=None,
+                        help="Only time the vectorized versions above this many rows")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing repeats for the vectorized versions")
+    args = parser.parse_args(argv)
+
+    for n_rows in args.rows:
+        n_customers = max(n_rows // args.customers_ratio, 1)
+        df = make_transactions(n_rows, n_customers)
+        ctx = prepare(df)
+        with_reference = args.skip_reference_above is None or n_rows <= args.skip_reference_above
+        print(f"\n{n_rows:,} transactions, {df['customer_id'].nunique():,} customers")
+        print(f"{'feature':30}{'lambda (s)':>12}{'vector (s)':>12}{'speed-up':>10}{'mismatches':>12}")
+        for name, vectorized_fn in VECTORIZED.items():
+            vec_time, vectorized = timed(vectorized_fn, df, ctx, repeat=args.repeat)
+            if with_reference:
+                ref_time, reference = timed(REFERENCE[name], df, ctx)
+                mismatches = compare(reference, vectorized, FILL[name])
+                print(f"{name:30}{ref_time:12.3f}{vec_time:12.3f}{ref_time / vec_time:9.1f}x{mismatches:12d}")
+            else:
+                print(f"{name:30}{'-':>12}{vec_time:12.3f}{'-':>10}{'-':>12}")
+
+
+if __name__ == "__main__":
+    main()
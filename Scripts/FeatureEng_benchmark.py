@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FeatureEng_benchmark.py
+
+Benchmark FeatureEng.py against FeatureEng.ipynb on the same input files.
+
+Each implementation runs in its own Python process inside a scratch copy of
+the data directory (the notebook reads and writes relative paths), so peak
+resident memory (ru_maxrss) and wall time are measured per run. The two
+imi_features.csv outputs are then compared column by column.
+
+Usage:
+    python FeatureEng_benchmark.py DATA_DIR [--repeat 3] [--work-dir DIR]
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+NOTEBOOK = os.path.join(HERE, "FeatureEng.ipynb")
+INPUT_FILES = ["abm.csv", "card.csv", "cheque.csv", "eft.csv", "emt.csv", "wire.csv",
+               "kyc.csv", "kyc_industry_codes.csv"]
+
+
+def notebook_source(path=NOTEBOOK):
+    """Concatenate the notebook's code cells, dropping IPython magics and shell escapes."""
+    with open(path) as f:
+        cells = json.load(f)["cells"]
+    lines = []
+    for cell in cells:
+        if cell["cell_type"] != "code":
+            continue
+        for line in "".join(cell["source"]).splitlines():
+            if not line.lstrip().startswith(("%", "!")):
+                lines.append(line)
+        lines.append("")
+    return "\n".join(lines)
+
+
+def _run_in_process(kind, work_dir):
+    """Body of one measured run (executed in a child process)."""
+    os.chdir(work_dir)
+    start = time.perf_counter()
+    if kind == "notebook":
+        exec(compile(notebook_source(), NOTEBOOK, "exec"), {"__name__": "__notebook__"})
+    else:
+        sys.path.insert(0, HERE)
+        import FeatureEng
+        FeatureEng.main([work_dir, "--rebuild-transactions"])
+    wall = time.perf_counter() - start
+    # ru_maxrss is KiB on Linux, bytes on macOS.
+    scale = 1 if sys.platform == "darwin" else 1024
+    return {"wall_s": wall, "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 2**20}
+
+
+def run(kind, data_dir, work_root):
+    """Copy the inputs to a fresh directory and time ``kind`` there in a child process."""
+    work_dir = tempfile.mkdtemp(prefix=f"{kind}_", dir=work_root)
+    for name in INPUT_FILES:
+        shutil.copy(os.path.join(data_dir, name), work_dir)
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", kind, work_dir],
+        check=True, capture_output=True, text=True,
+    )
+    stats = json.loads(result.stdout.strip().splitlines()[-1])
+    stats["output"] = os.path.join(work_dir, "imi_features.csv")
+    return stats
+
+
+def compare_outputs(expected_path, actual_path):
+    """
+    Compare two imi_features.csv files.
+
+    Returns:
+        list: Human-readable differences (empty when the outputs match).
+    """
+    expected = pd.read_csv(expected_path, low_memory=False)
+    actual = pd.read_csv(actual_path, low_memory=False)
+    if list(expected.columns) != list(actual.columns):
+        return [f"column mismatch: {sorted(set(expected.columns) ^ set(actual.columns))}"]
+    if len(expected) != len(actual):
+        return [f"row count {len(expected)} != {len(actual)}"]
+    problems = []
+    for column in expected.columns:
+        left, right = expected[column], actual[column]
+        if pd.api.types.is_numeric_dtype(left) and pd.api.types.is_numeric_dtype(right):
+            same = np.isclose(left.to_numpy(float), right.to_numpy(float), rtol=1e-9, atol=1e-9, equal_nan=True)
+        else:
+            same = (left.astype(str) == right.astype(str)).to_numpy()
+        if not same.all():
+            problems.append(f"{column}: {(~same).sum()} differing rows")
+    return problems
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark FeatureEng.py against the notebook.")
+    parser.add_argument("data_dir", nargs="?", help="Directory with the raw input CSVs")
+    parser.add_argument("--repeat", type=int, default=1, help="Runs per implementation")
+    parser.add_argument("--work-dir", help="Where scratch copies go (default: a temp dir)")
+    parser.add_argument("--child", nargs=2, metavar=("KIND", "WORK_DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.child:
+        print(json.dumps(_run_in_process(*args.child)))
+        return
+    if not args.data_dir:
+        parser.error("data_dir is required")
+
+    work_root = args.work_dir or tempfile.mkdtemp(prefix="featureeng_bench_")
+    os.makedirs(work_root, exist_ok=True)
+    results = {"notebook": [], "module": []}
+    for _ in range(args.repeat):
+        for kind in results:
+            results[kind].append(run(kind, args.data_dir, work_root))
+
+    print(f"{'':10}{'wall (s)':>12}{'peak RSS (MB)':>16}")
+    for kind, runs in results.items():
+        wall = min(r["wall_s"] for r in runs)
+        rss = max(r["peak_rss_mb"] for r in runs)
+        print(f"{kind:10}{wall:12.2f}{rss:16.1f}")
+    nb_best = min(r["wall_s"] for r in results["notebook"])
+    mod_best = min(r["wall_s"] for r in results["module"])
+    print(f"speed-up: {nb_best / mod_best:.2f}x")
+
+    problems = compare_outputs(results["notebook"][0]["output"], results["module"][0]["output"])
+    print("outputs match" if not problems else "outputs differ:\n  " + "\n  ".join(problems))
+
+
+if __name__ == "__main__":
+    main()
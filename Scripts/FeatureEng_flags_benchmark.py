@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FeatureEng_flags_benchmark.py
+
+Micro-benchmark of each transaction flag: the notebook's
+Series.apply(lambda x: ...) against the vectorized rule in FeatureEng.py
+(VALUE_FLAGS predicates, isin_categorical for the high-risk lists).
+
+Every flag is checked for row-by-row equality before it is timed. The
+location and industry columns are benchmarked both as object strings (as
+read from CSV, so the categorical conversion is part of the cost) and as
+pre-encoded categoricals.
+
+Usage:
+    python FeatureEng_flags_benchmark.py [--rows 1000000] [--repeat 3]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+import FeatureEng
+
+# Notebook versions (Scripts/FeatureEng.ipynb).
+REFERENCE = {
+    "weekend_txn": lambda x: 1 if x in [5, 6] else 0,
+    "odd_hour_txn": lambda x: 1 if 0 <= x < 5 else 0,
+    "night_txn": lambda x: 1 if 0 <= x < 6 else 0,
+    "day_txn": lambda x: 1 if 6 <= x < 18 else 0,
+    "is_round_txn": lambda x: 1 if x % 10 == 0 else 0,
+    "round_txn_extra": lambda x: 1 if x % 100 == 0 else 0,
+    "first_5_days": lambda x: 1 if x <= 5 else 0,
+    "last_5_days": lambda x: 1 if x >= 25 else 0,
+}
+
+
+def make_columns(n_rows, seed=0):
+    """Synthetic flag inputs, with missing values in every column."""
+    rng = np.random.default_rng(seed)
+
+    def with_missing(values, rate=0.05):
+        values = values.astype(float) if values.dtype.kind in "iu" else values
+        values[rng.random(n_rows) < rate] = np.nan if values.dtype.kind == "f" else None
+        return values
+
+    amount = np.round(rng.lognormal(5, 1.5, n_rows), 2)
+    amount[rng.random(n_rows) < 0.1] = rng.choice([100.0, 250.0, 1000.0], 1)[0]
+
+    def places(prefix, n):
+        return with_missing(np.array([f"{prefix}{i}" for i in range(n)], dtype=object)[rng.integers(0, n, n_rows)])
+
+    return pd.DataFrame({
+        "txn_hour": with_missing(rng.integers(0, 24, n_rows)),
+        "txn_weekday": rng.integers(0, 7, n_rows),
+        "day_of_month": rng.integers(1, 32, n_rows),
+        "amount_cad": with_missing(amount),
+        "trans_country": places("C", 60),
+        "trans_province": places("P", 13),
+        "trans_city": places("CITY", 2000),
+        "industry_code": places("IND", 300),
+    })
+
+
+def timed(fn, repeat):
+    best, result = np.inf, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-flag lambda vs vectorized benchmark.")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    df = make_columns(args.rows)
+    rng = np.random.default_rng(1)
+    high_risk = {}
+    for name, column in FeatureEng.HIGH_RISK_FLAGS.items():
+        distinct = df[column].dropna().unique()
+        high_risk[name] = list(rng.choice(distinct, max(len(distinct) // 10, 1), replace=False))
+    encoded = {column: df[column].astype("category") for column in FeatureEng.HIGH_RISK_FLAGS.values()}
+
+    print(f"{args.rows:,} rows")
+    print(f"{'flag':38}{'lambda (ms)':>13}{'vector (ms)':>13}{'speed-up':>10}{'equal':>7}")
+
+    def report(name, reference_fn, vectorized_fn):
+        ref_time, reference = timed(reference_fn, 1)
+        vec_time, vectorized = timed(vectorized_fn, args.repeat)
+        equal = np.array_equal(reference.to_numpy(), vectorized)
+        print(f"{name:38}{ref_time * 1e3:13.1f}{vec_time * 1e3:13.2f}{ref_time / vec_time:9.0f}x{str(equal):>7}")
+
+    for name, (column, predicate) in FeatureEng.VALUE_FLAGS.items():
+        values = df[column]
+        report(name, lambda: values.apply(REFERENCE[name]),
+               lambda: predicate(values.to_numpy(dtype=float)).astype(np.int8))
+
+    for name, column in FeatureEng.HIGH_RISK_FLAGS.items():
+        values, members = df[column], high_risk[name]
+        reference_fn = lambda: values.apply(lambda x: 1 if x in members else 0)
+        report(name, reference_fn,
+               lambda: FeatureEng.isin_categorical(values, members).astype(np.int8))
+        report(f"  {name} (categorical)", reference_fn,
+               lambda: FeatureEng.isin_categorical(encoded[column], members).astype(np.int8))
+
+    total, _ = timed(lambda: FeatureEng.build_flags(df, high_risk), args.repeat)
+    print(f"\nbuild_flags (all {len(FeatureEng.VALUE_FLAGS) + len(high_risk)} flags, one pass): {total * 1e3:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FeaturePartitions.py
+
+Out-of-core version of FeatureEng.py for transaction histories that do not
+fit in memory.
+
+FeatureEng.build_features() needs the whole final_transactions frame at
+once. Here the data is streamed instead:
+
+1. Partition pass: each channel CSV is read in chunks, joined with KYC and
+   industry codes (FeatureEng.attach_kyc) and appended to
+   transactions/part-NNNNN.<channel>.csv, picked by a hash of customer_id.
+   The same pass feeds the dataset-wide accumulators: a KLL quantile sketch
+   of amount_cad (QuantileSketch.py), the distinct months/weeks/years and
+   the latest date. Channels are independent, so they can run in separate
+   processes; their accumulators are merged afterwards.
+2. Risk pass: the partition files are re-read (only the amount, id and
+   location columns) to count first-pass outliers per country / province /
+   city / industry against the sketched 99th percentile. This gives the
+   high-risk value lists and the location risk counts.
+3. Feature pass: each partition (its channel files, in channel order) is
+   read on its own, featurized with FeatureEng.build_features() using those
+   global statistics, and written to features/part-NNNNN.csv.
+
+Every customer's rows sit in a single partition, so per-customer features
+are the same as in the in-memory run. Only the amount thresholds
+(high/low outliers, large cash, txn_category bins and the first-pass outlier
+cut-off behind the risk lists) are approximate: they come from the sketch
+instead of an exact sort, within the rank error the sketch reports (about
+0.1% of rank at the default k). Peak memory per process is one chunk or one
+partition plus kyc.csv.
+
+Usage:
+    python FeaturePartitions.py DATA_DIR [--work-dir DIR] [--partitions 16]
+                                [--chunk-rows 250000] [--workers 1] [--output imi_features.csv]
+"""
+
+import argparse
+import glob
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import FeatureEng
+from QuantileSketch import DEFAULT_K, KLLSketch
+
+DEFAULT_PARTITIONS = 16
+DEFAULT_CHUNK_ROWS = 250_000
+
+# Read as strings in every pass so the high-risk value lists built in the risk
+# pass compare equal to the values the feature pass sees.
+KEY_DTYPES = {"customer_id": str, "trans_country": str, "trans_province": str,
+              "trans_city": str, "industry_code": str}
+
+# Sketch quantile behind each FeatureEng threshold.
+THRESHOLD_QUANTILES = {"first_pass": 0.99, "high": 0.99, "low": 0.03, "small": 0.33, "medium": 0.66}
+
+
+def partition_of(customer_id, n_partitions):
+    """Stable partition number of every customer_id (same across runs and machines)."""
+    hashes = pd.util.hash_pandas_object(pd.Series(customer_id, dtype=str), index=False).to_numpy()
+    return (hashes % np.uint64(n_partitions)).astype(np.int64)
+
+
+def _part_path(directory, partition, source=None):
+    suffix = f".{source}" if source else ""
+    return os.path.join(directory, f"part-{partition:05d}{suffix}.csv")
+
+
+def _transaction_columns(data_dir):
+    """Column layout of transactions.csv (the channel union), from the CSV headers."""
+    headers = [FeatureEng.channel_frame(pd.read_csv(os.path.join(data_dir, f"{source}.csv"), nrows=0), source)
+               for source in FeatureEng.CHANNELS]
+    return list(pd.concat(headers, ignore_index=True).columns)
+
+
+def iter_channel_transactions(data_dir, source, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Yield one channel's rows of final_transactions in chunks.
+
+    kyc.csv and kyc_industry_codes.csv (one row per customer / code) are
+    held in memory; the channel file is streamed.
+
+    Yields:
+        pd.DataFrame: At most ``chunk_rows`` rows, with the columns (and
+        column order) of FeatureEng.build_final_transactions().
+    """
+    kyc = pd.read_csv(os.path.join(data_dir, "kyc.csv"))
+    industry_codes = pd.read_csv(os.path.join(data_dir, "kyc_industry_codes.csv"))
+    columns = _transaction_columns(data_dir)
+    for chunk in pd.read_csv(os.path.join(data_dir, f"{source}.csv"), chunksize=chunk_rows):
+        frame = FeatureEng.channel_frame(chunk, source).reindex(columns=columns)
+        yield FeatureEng.attach_kyc(frame, kyc, industry_codes)
+
+
+def iter_final_transactions(data_dir, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """All channels' chunks, in final_transactions.csv row order."""
+    for source in FeatureEng.CHANNELS:
+        yield from iter_channel_transactions(data_dir, source, chunk_rows)
+
+
+class StreamingStatistics:
+    """
+    Dataset-wide accumulators fed chunk by chunk during the partition pass.
+
+    Accumulators built on different channels (or processes) merge into the
+    same result as one accumulator fed everything.
+
+    Attributes:
+        sketch (KLLSketch): amount_cad quantile sketch.
+        periods (dict): "M" / "W" / "Y" -> set of periods seen.
+        max_date (pd.Timestamp): Latest transaction_date seen.
+    """
+
+    def __init__(self, sketch_k=DEFAULT_K, seed=None):
+        self.sketch = KLLSketch(sketch_k, seed=seed)
+        self.periods = {"M": set(), "W": set(), "Y": set()}
+        self.max_date = pd.NaT
+
+    def update(self, chunk):
+        self.sketch.update(chunk["amount_cad"].to_numpy(dtype=float))
+        dates = pd.to_datetime(chunk["transaction_date"]).dropna()
+        for freq, seen in self.periods.items():
+            seen.update(dates.dt.to_period(freq).unique())
+        if len(dates):
+            self._see_date(dates.max())
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+        for freq, seen in self.periods.items():
+            seen.update(other.periods[freq])
+        if not pd.isna(other.max_date):
+            self._see_date(other.max_date)
+        return self
+
+    def _see_date(self, date):
+        self.max_date = date if pd.isna(self.max_date) else max(self.max_date, date)
+
+    def thresholds(self):
+        """FeatureEng amount thresholds from the sketch."""
+        values = self.sketch.quantile(list(THRESHOLD_QUANTILES.values()))
+        return dict(zip(THRESHOLD_QUANTILES, values.tolist()))
+
+
+def _run(function, tasks, workers):
+    """Apply ``function`` to every argument tuple, in worker processes when workers > 1."""
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(min(workers, len(tasks))) as pool:
+            return list(pool.map(function, *zip(*tasks)))
+    return [function(*task) for task in tasks]
+
+
+def _partition_channel(data_dir, source, directory, n_partitions, chunk_rows, sketch_k, seed):
+    """Partition one channel file; returns ({partition: path}, StreamingStatistics)."""
+    statistics = StreamingStatistics(sketch_k, seed=seed)
+    written = {}
+    for chunk in iter_channel_transactions(data_dir, source, chunk_rows):
+        statistics.update(chunk)
+        partition = partition_of(chunk["customer_id"], n_partitions)
+        for number, rows in chunk.groupby(partition):
+            path = _part_path(directory, number, source)
+            rows.to_csv(path, mode="a", header=number not in written, index=False)
+            written[number] = path
+    return written, statistics
+
+
+def partition_transactions(data_dir, work_dir, n_partitions=DEFAULT_PARTITIONS,
+                           chunk_rows=DEFAULT_CHUNK_ROWS, sketch_k=DEFAULT_K, workers=1):
+    """
+    Partition pass: stream final_transactions into per-hash CSV files.
+
+    Each channel is streamed independently (in parallel with ``workers`` > 1)
+    into part-NNNNN.<channel>.csv files with its own StreamingStatistics;
+    the statistics are merged afterwards.
+
+    Args:
+        data_dir (str): Directory with the raw channel, kyc and industry code CSVs.
+        work_dir (str): Partitions go to work_dir/transactions (old ones are removed).
+        n_partitions (int): Number of customer_id hash partitions.
+        chunk_rows (int): Rows per channel CSV read.
+        sketch_k (int): KLL sketch size (accuracy) for the amount thresholds.
+        workers (int): Processes to use.
+
+    Returns:
+        tuple: ({partition: [paths in channel order]}, merged StreamingStatistics).
+    """
+    directory = os.path.join(work_dir, "transactions")
+    os.makedirs(directory, exist_ok=True)
+    for path in glob.glob(os.path.join(directory, "part-*.csv")):
+        os.remove(path)
+
+    tasks = [(data_dir, source, directory, n_partitions, chunk_rows, sketch_k, seed)
+             for seed, source in enumerate(FeatureEng.CHANNELS)]
+    partitions = {}
+    statistics = StreamingStatistics(sketch_k, seed=len(tasks))
+    # Channel order is kept so each partition reads back in final_transactions order.
+    for written, channel_statistics in _run(_partition_channel, tasks, workers):
+        for number, path in written.items():
+            partitions.setdefault(number, []).append(path)
+        statistics.merge(channel_statistics)
+    return dict(sorted(partitions.items())), statistics
+
+
+def _risk_counts(path, first_pass_threshold, chunk_rows):
+    """Per-value first-pass outlier sums (high-risk scores) and counts (location risk) of one file."""
+    columns = ["transaction_id", "amount_cad", *FeatureEng.HIGH_RISK_FLAGS.values()]
+    risk_scores = {name: pd.Series(dtype=float) for name in FeatureEng.HIGH_RISK_FLAGS}
+    location_risk = {column: pd.Series(dtype=float) for column in FeatureEng.LOCATION_RISK}
+    for chunk in pd.read_csv(path, usecols=columns, dtype=KEY_DTYPES, chunksize=chunk_rows):
+        outlier = (chunk["amount_cad"] > first_pass_threshold).astype(int)
+        for name, column in FeatureEng.HIGH_RISK_FLAGS.items():
+            risk_scores[name] = risk_scores[name].add(outlier.groupby(chunk[column]).sum(), fill_value=0)
+        outlier_rows = chunk.loc[outlier.to_numpy() == 1]
+        for column in location_risk:
+            counts = outlier_rows.groupby(column)["transaction_id"].count()
+            location_risk[column] = location_risk[column].add(counts, fill_value=0)
+    return risk_scores, location_risk
+
+
+def risk_statistics(paths, first_pass_threshold, chunk_rows=DEFAULT_CHUNK_ROWS, workers=1):
+    """
+    Risk pass: high-risk value lists and location risk counts.
+
+    Counts rows above ``first_pass_threshold`` per country / province / city /
+    industry in every partition file, sums the counts, then applies
+    FeatureEng.HIGH_RISK_PERCENTILES as dataset_statistics() does.
+
+    Returns:
+        tuple: (high_risk dict, location_risk dict), as in
+        FeatureEng.dataset_statistics().
+    """
+    risk_scores = {name: pd.Series(dtype=float) for name in FeatureEng.HIGH_RISK_FLAGS}
+    location_risk = {column: pd.Series(dtype=float) for column in FeatureEng.LOCATION_RISK}
+    tasks = [(path, first_pass_threshold, chunk_rows) for path in paths]
+    for file_scores, file_locations in _run(_risk_counts, tasks, workers):
+        for name, score in file_scores.items():
+            risk_scores[name] = risk_scores[name].add(score, fill_value=0)
+        for column, counts in file_locations.items():
+            location_risk[column] = location_risk[column].add(counts, fill_value=0)
+
+    high_risk = {
+        name: FeatureEng.high_risk_values(score, FeatureEng.HIGH_RISK_PERCENTILES[name])
+        for name, score in risk_scores.items()
+    }
+    return high_risk, location_risk
+
+
+def global_statistics(streaming, partitions, chunk_rows=DEFAULT_CHUNK_ROWS, workers=1):
+    """Assemble the FeatureEng.dataset_statistics() dict from the streaming passes."""
+    thresholds = streaming.thresholds()
+    paths = [path for files in partitions.values() for path in files]
+    high_risk, location_risk = risk_statistics(paths, thresholds["first_pass"], chunk_rows, workers)
+    return {
+        "thresholds": thresholds,
+        "high_risk": high_risk,
+        "location_risk": location_risk,
+        "n_months": len(streaming.periods["M"]),
+        "n_weeks": len(streaming.periods["W"]),
+        "n_years": len(streaming.periods["Y"]),
+        "last_60_days": streaming.max_date - pd.DateOffset(days=60),
+    }
+
+
+def read_partition(files):
+    """One partition's transactions (its channel files, in channel order)."""
+    frames = [pd.read_csv(path, dtype=KEY_DTYPES, low_memory=False) for path in files]
+    # A bool column (e.g. abm cash_indicator) would become 1.0/0.0 when
+    # concatenated with another channel's all-NaN float column; keep the
+    # True/False/NaN object column a single final_transactions read gives.
+    frames = [frame.astype({column: object for column in frame.columns[frame.dtypes == bool]})
+              for frame in frames]
+    return pd.concat(frames, ignore_index=True)
+
+
+def _featurize_partition(files, statistics, output):
+    FeatureEng.build_features(read_partition(files), statistics).to_csv(output, index=False)
+    return output
+
+
+def featurize_partitions(partitions, statistics, work_dir, workers=1):
+    """
+    Feature pass: build_features() on each partition with the global statistics.
+
+    Returns:
+        list: Paths of the written work_dir/features/part-NNNNN.csv files.
+    """
+    directory = os.path.join(work_dir, "features")
+    os.makedirs(directory, exist_ok=True)
+    tasks = [(files, statistics, _part_path(directory, number)) for number, files in partitions.items()]
+    return _run(_featurize_partition, tasks, workers)
+
+
+def combine(paths, output):
+    """Concatenate partition CSVs (same header) into one file without parsing them."""
+    with open(output, "w") as out:
+        for number, path in enumerate(paths):
+            with open(path) as part:
+                header = part.readline()
+                if number == 0:
+                    out.write(header)
+                for line in part:
+                    out.write(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build customer features partition by partition.")
+    parser.add_argument("data_dir", help="Directory with the channel, kyc and industry code CSVs")
+    parser.add_argument("--work-dir", help="Partition and per-partition feature files (default: DATA_DIR/partitions)")
+    parser.add_argument("--partitions", type=int, default=DEFAULT_PARTITIONS, help="customer_id hash partitions")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per streamed read")
+    parser.add_argument("--sketch-k", type=int, default=DEFAULT_K, help="Quantile sketch size (accuracy)")
+    parser.add_argument("--workers", type=int, default=1, help="Processes per pass (channels / partitions)")
+    parser.add_argument("--output", help="Also combine the partition features into this CSV")
+    args = parser.parse_args(argv)
+
+    work_dir = args.work_dir or os.path.join(args.data_dir, "partitions")
+
+    start = time.perf_counter()
+    partitions, streaming = partition_transactions(args.data_dir, work_dir, args.partitions,
+                                                   args.chunk_rows, args.sketch_k, args.workers)
+    print(f"Partitioned {streaming.sketch.n:,} amounts into {len(partitions)} partitions "
+          f"in {time.perf_counter() - start:.1f}s")
+
+    step = time.perf_counter()
+    statistics = global_statistics(streaming, partitions, args.chunk_rows, args.workers)
+    thresholds = ", ".join(f"{name}={value:,.2f}" for name, value in statistics["thresholds"].items())
+    print(f"Global statistics in {time.perf_counter() - step:.1f}s ({thresholds}; "
+          f"rank error <= {streaming.sketch.rank_error():.3%} at 3 sigma)")
+
+    step = time.perf_counter()
+    outputs = featurize_partitions(partitions, statistics, work_dir, args.workers)
+    print(f"Featurized {len(outputs)} partitions in {time.perf_counter() - step:.1f}s")
+
+    if args.output:
+        combine(outputs, args.output)
+        print(f"Wrote {args.output}")
+    print(f"Total {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+FlowGraph.py
+
+Customer network features from the transaction tables.
+
+EMT, EFT and wire transfers are otherwise only seen as per-customer totals
+(total_wire_credit etc. in Script4). Here they become a graph. Customers
+are linked through shared "link" nodes in a bipartite customer x link
+CSR matrix:
+
+* counterparty:<id>  - when a table has a counterparty column
+  (COUNTERPARTY_COLUMNS), each counterparty is a link node.
+* flow:<channel>|<date>|<amount> - the tables here have no counterparty,
+  so a debit and a credit of the same amount on the same day and channel
+  from different customers are taken as the two legs of one transfer.
+  Only keys with at most ``max_group`` rows are kept: a common amount on a
+  busy day links nothing.
+* place:<city>|<date> - abm / card activity in the same city on the same
+  day, kept only when at most ``max_group`` customers share it.
+
+From the bipartite matrix B (customers x links) everything is sparse
+linear algebra: degrees are row sums, the customer projection is
+B @ B.T, connected components come from scipy.sparse.csgraph, and
+PageRank is power iteration on the row-normalized projection. The matched
+flow legs also give a directed debtor -> creditor edge list, with in/out
+degrees and amounts.
+
+The result is one row per customer (GRAPH_COLUMNS). It can be joined onto
+the customer feature matrix (Script6's customer_features.csv) as extra
+columns.
+
+Usage:
+    python FlowGraph.py DATA_DIR [--max-group 10] [--output graph_features.csv]
+                        [--features customer_features.csv --features-output customer_features_graph.csv]
+                        [--graph-out flow_graph.npz]
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+from Structuring import is_credit
+
+TRANSFER_CHANNELS = ("emt", "eft", "wire")
+LOCATION_CHANNELS = ("abm", "card")
+COUNTERPARTY_COLUMNS = ("counterparty_id", "counterparty", "beneficiary_id", "sender_id")
+MAX_GROUP = 10
+DAMPING = 0.85
+
+GRAPH_COLUMNS = ["graph_degree", "graph_weighted_degree", "graph_neighbors", "graph_pagerank",
+                 "graph_component_size", "flow_out_degree", "flow_in_degree", "flow_out_amount",
+                 "flow_in_amount"]
+
+
+def _read_channel(data_dir, source, columns):
+    path = os.path.join(data_dir, f"{source}.csv")
+    header = pd.read_csv(path, nrows=0).columns
+    return pd.read_csv(path, usecols=[column for column in columns if column in header],
+                       dtype={"customer_id": str}, low_memory=False)
+
+
+def counterparty_links(frame, source):
+    """customer -> counterparty:<id> links, if the table has a counterparty column."""
+    column = next((column for column in COUNTERPARTY_COLUMNS if column in frame.columns), None)
+    if column is None:
+        return None
+    rows = frame[frame[column].notna()]
+    return pd.DataFrame({"customer_id": rows["customer_id"].to_numpy(),
+                         "link": "counterparty:" + rows[column].astype(str).to_numpy(),
+                         "weight": rows["amount_cad"].abs().to_numpy()})
+
+
+def matched_flows(frame, source, max_group=MAX_GROUP):
+    """
+    Pair debits and credits with the same (date, amount) in one channel.
+
+    Returns:
+        tuple: (links, edges). links are customer -> flow:<key> rows for
+        the bipartite graph; edges are directed debtor -> creditor pairs
+        with the amount.
+    """
+    frame = frame.dropna(subset=["customer_id", "amount_cad", "transaction_date"])
+    credit = is_credit(frame["debit_credit"])
+    key = frame.groupby(["transaction_date", "amount_cad"], sort=False).ngroup().to_numpy()
+    sizes = np.bincount(key)
+    has_credit = np.bincount(key, weights=credit) > 0
+    has_debit = np.bincount(key, weights=~credit) > 0
+    keep = (sizes[key] <= max_group) & has_credit[key] & has_debit[key]
+    rows = frame.loc[keep, ["customer_id", "amount_cad", "transaction_date"]].assign(key=key[keep],
+                                                                                    credit=credit[keep])
+    debits, credits = rows[~rows["credit"]], rows[rows["credit"]]
+    pairs = debits.merge(credits[["key", "customer_id"]], on="key", suffixes=("", "_to"))
+    pairs = pairs[pairs["customer_id"] != pairs["customer_id_to"]]
+    edges = pd.DataFrame({"from": pairs["customer_id"].to_numpy(), "to": pairs["customer_id_to"].to_numpy(),
+                          "amount": pairs["amount_cad"].abs().to_numpy()})
+
+    # Only keys that produced a cross-customer pair become link nodes.
+    linked = rows[rows["key"].isin(pairs["key"].unique())]
+    links = pd.DataFrame({
+        "customer_id": linked["customer_id"].to_numpy(),
+        "link": (f"flow:{source}|" + linked["transaction_date"].astype(str) + "|"
+                 + linked["amount_cad"].astype(str)).to_numpy(),
+        "weight": linked["amount_cad"].abs().to_numpy(),
+    })
+    return links, edges
+
+
+def colocation_links(frame, max_group=MAX_GROUP):
+    """customer -> place:<city>|<date> links for city-days shared by 2..max_group customers."""
+    frame = frame.dropna(subset=["customer_id", "city", "transaction_date"])
+    visits = frame.groupby(["city", "transaction_date", "customer_id"]).size().rename("visits").reset_index()
+    customers = visits.groupby(["city", "transaction_date"])["customer_id"].transform("size")
+    visits = visits[(customers >= 2) & (customers <= max_group)]
+    return pd.DataFrame({
+        "customer_id": visits["customer_id"].to_numpy(),
+        "link": ("place:" + visits["city"].astype(str) + "|" + visits["transaction_date"].astype(str)).to_numpy(),
+        "weight": visits["visits"].to_numpy(dtype=float),
+    })
+
+
+class FlowGraph:
+    """
+    Bipartite customer x link adjacency in CSR form, plus directed flow edges.
+
+    Attributes:
+        customers (pd.Index): Row labels (customer_id).
+        links (pd.Index): Column labels (link node keys).
+        adjacency (sparse.csr_matrix): customers x links, summed weights.
+        flows (pd.DataFrame): Directed from / to / amount transfer pairs.
+    """
+
+    def __init__(self, links, flows, customers=None):
+        """
+        Args:
+            links (pd.DataFrame): customer_id, link, weight rows (duplicates are summed).
+            flows (pd.DataFrame): from, to, amount rows.
+            customers (array-like): Customers to include even without links.
+        """
+        known = pd.Index(links["customer_id"]).append(pd.Index(flows["from"])).append(pd.Index(flows["to"]))
+        if customers is not None:
+            known = known.append(pd.Index(customers))
+        self.customers = pd.Index(np.sort(known.dropna().unique()), name="customer_id")
+        link_codes, self.links = pd.factorize(links["link"])
+        self.links = pd.Index(self.links, name="link")
+        rows = self.customers.get_indexer(links["customer_id"])
+        self.adjacency = sparse.csr_matrix(
+            (links["weight"].to_numpy(dtype=float), (rows, link_codes)),
+            shape=(len(self.customers), len(self.links)),
+        )
+        self.adjacency.sum_duplicates()
+        self.flows = flows
+
+    def projection(self):
+        """customers x customers: number of shared link nodes (zero diagonal)."""
+        binary = self.adjacency.copy()
+        binary.data[:] = 1.0
+        shared = (binary @ binary.T).tocsr()
+        shared.setdiag(0)
+        shared.eliminate_zeros()
+        return shared
+
+    def features(self, damping=DAMPING, tol=1e-10, max_iter=100):
+        """
+        Per-customer graph features (GRAPH_COLUMNS).
+
+        graph_pagerank is scaled so the average customer scores 1.
+        """
+        n = len(self.customers)
+        shared = self.projection()
+        _, labels = connected_components(shared, directed=False)
+        flow_from = self.customers.get_indexer(self.flows["from"])
+        flow_to = self.customers.get_indexer(self.flows["to"])
+        amount = self.flows["amount"].to_numpy(dtype=float)
+        return pd.DataFrame({
+            "graph_degree": np.diff(self.adjacency.indptr),
+            "graph_weighted_degree": np.asarray(self.adjacency.sum(axis=1)).ravel(),
+            "graph_neighbors": np.diff(shared.indptr),
+            "graph_pagerank": pagerank(shared, damping, tol, max_iter) * n,
+            "graph_component_size": np.bincount(labels)[labels],
+            "flow_out_degree": np.bincount(flow_from, minlength=n),
+            "flow_in_degree": np.bincount(flow_to, minlength=n),
+            "flow_out_amount": np.bincount(flow_from, weights=amount, minlength=n),
+            "flow_in_amount": np.bincount(flow_to, weights=amount, minlength=n),
+        }, index=self.customers)
+
+    def save(self, path):
+        """Store the CSR arrays and labels in one .npz file."""
+        np.savez_compressed(path, indptr=self.adjacency.indptr, indices=self.adjacency.indices,
+                            data=self.adjacency.data, customers=self.customers.to_numpy(dtype=str),
+                            links=self.links.to_numpy(dtype=str))
+
+
+def pagerank(adjacency, damping=DAMPING, tol=1e-10, max_iter=100):
+    """
+    PageRank by power iteration over a weighted sparse adjacency.
+
+    Dangling nodes (no out-weight) spread their rank uniformly.
+
+    Returns:
+        np.ndarray: Scores summing to 1.
+    """
+    n = adjacency.shape[0]
+    if n == 0:
+        return np.empty(0)
+    out_weight = np.asarray(adjacency.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+    inverse = np.divide(1.0, out_weight, out=np.zeros(n), where=~dangling)
+    transition = sparse.diags(inverse) @ adjacency
+    transposed = transition.T.tocsr()
+    rank = np.full(n, 1.0 / n)
+    for _ in range(max_iter):
+        updated = damping * (transposed @ rank + rank[dangling].sum() / n) + (1 - damping) / n
+        converged = np.abs(updated - rank).sum() < tol
+        rank = updated
+        if converged:
+            break
+    return rank
+
+
+def build_graph(data_dir, max_group=MAX_GROUP, locations=True):
+    """
+    Build the FlowGraph from the raw channel CSVs and kyc.csv.
+
+    Args:
+        data_dir (str): Directory with the channel CSVs and kyc.csv.
+        max_group (int): Largest flow key / city-day kept as a link.
+        locations (bool): Include abm / card co-location links.
+    """
+    links, flows = [], []
+    transfer_columns = ["customer_id", "amount_cad", "debit_credit", "transaction_date", *COUNTERPARTY_COLUMNS]
+    for source in TRANSFER_CHANNELS:
+        frame = _read_channel(data_dir, source, transfer_columns)
+        direct = counterparty_links(frame, source)
+        if direct is not None:
+            links.append(direct)
+        else:
+            flow_links, edges = matched_flows(frame, source, max_group)
+            links.append(flow_links)
+            flows.append(edges)
+    if locations:
+        for source in LOCATION_CHANNELS:
+            links.append(colocation_links(_read_channel(data_dir, source, ["customer_id", "city", "transaction_date"]),
+                                          max_group))
+    customers = pd.read_csv(os.path.join(data_dir, "kyc.csv"), usecols=["customer_id"], dtype=str)["customer_id"]
+    flows = pd.concat(flows, ignore_index=True) if flows else pd.DataFrame(columns=["from", "to", "amount"])
+    return FlowGraph(pd.concat(links, ignore_index=True), flows, customers)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the customer flow graph and its features.")
+    parser.add_argument("data_dir", help="Directory with the channel CSVs and kyc.csv")
+    parser.add_argument("--max-group", type=int, default=MAX_GROUP,
+                        help="Largest transfer key / city-day turned into a link (default 10)")
+    parser.add_argument("--no-locations", action="store_true", help="Skip abm/card co-location links")
+    parser.add_argument("--output", default="graph_features.csv")
+    parser.add_argument("--features", help="Customer feature matrix (e.g. customer_features.csv) to extend")
+    parser.add_argument("--features-output", help="Where the extended matrix goes (default: overwrite --features)")
+    parser.add_argument("--graph-out", help="Also save the CSR adjacency (.npz)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    graph = build_graph(args.data_dir, args.max_group, locations=not args.no_locations)
+    print(f"Graph: {len(graph.customers):,} customers, {len(graph.links):,} link nodes, "
+          f"{graph.adjacency.nnz:,} edges, {len(graph.flows):,} matched transfers "
+          f"({time.perf_counter() - start:.1f}s)")
+
+    step = time.perf_counter()
+    features = graph.features()
+    print(f"Features in {time.perf_counter() - step:.1f}s; "
+          f"largest component {features['graph_component_size'].max():,} customers")
+    features.to_csv(args.output)
+    if args.graph_out:
+        graph.save(args.graph_out)
+
+    if args.features:
+        matrix = pd.read_csv(args.features, dtype={"customer_id": str})
+        matrix = matrix.drop(columns=[column for column in GRAPH_COLUMNS if column in matrix.columns])
+        extended = matrix.join(features, on="customer_id")
+        # Customers unknown to the graph are isolated nodes.
+        isolated = features.loc[features["graph_neighbors"] == 0, "graph_pagerank"]
+        fill = dict.fromkeys(GRAPH_COLUMNS, 0)
+        fill.update(graph_component_size=1, graph_pagerank=isolated.iloc[0] if len(isolated) else 0)
+        extended = extended.fillna(fill)
+        output = args.features_output or args.features
+        extended.to_csv(output, index=False)
+        print(f"Added {len(GRAPH_COLUMNS)} graph columns to {output}")
+    print(f"Wrote {args.output} (total {time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
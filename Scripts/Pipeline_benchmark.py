@@ -0,0 +1,360 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pipeline_benchmark.py
+
+Time the pipeline's stages on synthetic data of a chosen size and keep a JSON
+history, so a change can be compared with earlier runs at the same scale.
+
+Stages (all run in this process, in order; each one's stdout is silenced):
+
+    generate        SyntheticData.generate() (skipped with --data-dir)
+    data_load       Script1 data_load() of the eight raw files
+    build_sqlite    load those frames into SQLite, customer_id indexed (setup
+                    for the report builder; Script2 does the same for MySQL)
+    report_builder  Script5 create_customer_reports() -> customer_reports.csv
+    curation        Script6: category dictionary, load_data(), curate_features()
+    score_if        Script7 Isolation Forest (load_and_preprocess + scores)
+    score_vae       Script7 Transformer VAE (--vae-epochs, then scores)
+    feature_eng     FeatureEng.main() -> imi_features.csv (the dashboard's input)
+    dashboard       load + add_derived_features + FilterIndex, then the pages'
+                    aggregations through PandasBackend
+
+A stage whose dependencies are not installed (sklearn, torch) is recorded as
+skipped; a stage that fails is recorded with its error and the later stages
+that need its output are skipped too. Each run appends an entry to the
+history file: timestamp, git commit, machine, the data parameters and per
+stage seconds, status and peak RSS so far. The summary compares every stage
+with the most recent earlier run of the same configuration and flags any
+stage more than --threshold slower.
+
+Usage:
+    python Pipeline_benchmark.py [--rows 100000] [--customers N] [--seed 0] [--data-dir DIR]
+                                 [--work-dir DIR] [--stages data_load curation ...] [--vae-epochs 20]
+                                 [--history ../Results/benchmark_history.json] [--threshold 0.2]
+                                 [--fail-on-regression]
+"""
+
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+ROOT = os.path.normpath(os.path.join(HERE, ".."))
+sys.path.insert(0, os.path.join(ROOT, "python-dashboard"))
+sys.path.insert(0, os.path.join(ROOT, "Code"))
+sys.path.insert(0, HERE)
+
+import SyntheticData  # noqa: E402
+
+RAW_FILES = ["abm.csv", "card.csv", "cheque.csv", "eft.csv", "emt.csv", "kyc.csv", "kyc_industry_codes.csv",
+             "wire.csv"]
+STAGES = ("generate", "data_load", "build_sqlite", "report_builder", "curation", "score_if", "score_vae",
+          "feature_eng", "dashboard")
+# Stage -> stages whose outputs it reads.
+NEEDS = {
+    "build_sqlite": ("data_load",),
+    "report_builder": ("build_sqlite",),
+    "curation": ("report_builder",),
+    "score_if": ("curation",),
+    "score_vae": ("curation",),
+}
+HISTORY = os.path.join(ROOT, "Results", "benchmark_history.json")
+THRESHOLD = 0.2
+VAE_EPOCHS = 20
+
+# Aggregations the dashboard pages request (customer.py, enterprise.py).
+DASHBOARD_QUERIES = {
+    "customer_risk": (["customer_id"], {"total_transactions": ("transaction_id", "count"),
+                                        "outlier_count": ("high_txn_outlier", "sum"),
+                                        "cash_tnx": ("large_cash_txn", "sum"),
+                                        "avg_spending": ("amount_cad", "mean"),
+                                        "midnight_txns": ("midnight_txn_count", "sum")}, None),
+    "hour_by_province": (["txn_hour", "trans_province"], {"count": ("transaction_id", "size")}, None),
+    "industry_stats": (["industry"], {"Outliers": ("high_txn_outlier", "sum"),
+                                      "LargeCash": ("large_cash_txn", "sum"),
+                                      "UniqueCust": ("customer_id", "nunique")}, None),
+    "weekday_counts": (["weekday"], {"count": ("transaction_id", "size")}, None),
+    "merchant_outliers": (["merchant_category"], {"Outliers": ("high_txn_outlier", "sum")}, None),
+    "filtered_top_spenders": (["customer_id"], {"total": ("amount_cad", "sum")},
+                              {"trans_province": "ON", "source": ["card", "abm"]}),
+}
+
+
+def _max_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def stage_generate(ctx):
+    manifest = SyntheticData.generate(ctx["data_dir"], ctx["rows"], ctx["customers"], ctx["seed"])
+    ctx["customers"] = manifest["customers"]
+    return {"rows": ctx["rows"]}
+
+
+def stage_data_load(ctx):
+    from Script1_Load_CSV_Files import data_load
+
+    ctx["dataframes"] = data_load(ctx["data_dir"], RAW_FILES)
+    return {"rows": int(sum(len(df) for df in ctx["dataframes"].values()))}
+
+
+def stage_build_sqlite(ctx):
+    path = os.path.join(ctx["work_dir"], "Scotiabank.db")
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    try:
+        for table, df in ctx["dataframes"].items():
+            df.to_sql(table, conn, index=False)
+            if "customer_id" in df.columns:
+                conn.execute(f"CREATE INDEX idx_{table}_customer ON {table} (customer_id)")
+        conn.commit()
+    finally:
+        conn.close()
+    ctx["db_path"] = path
+    return {"bytes": os.path.getsize(path)}
+
+
+def stage_report_builder(ctx):
+    from Script5_CreateCustomerReports import create_customer_reports
+
+    reports = create_customer_reports(ctx["db_path"])
+    ctx["reports_path"] = os.path.join(ctx["work_dir"], "customer_reports.csv")
+    reports.to_csv(ctx["reports_path"], index=False)
+    return {"rows": len(reports)}
+
+
+def stage_curation(ctx):
+    from CategoryDictionary import CategoryDictionary
+    from Script6_ML_DataCuration import curate_features, load_data
+
+    dictionary = CategoryDictionary.build(ctx["data_dir"])
+    features = curate_features(load_data(ctx["reports_path"]), dictionary)
+    ctx["features_path"] = os.path.join(ctx["work_dir"], "customer_features.csv")
+    features.to_csv(ctx["features_path"], index=False)
+    return {"rows": len(features), "columns": features.shape[1]}
+
+
+def stage_score_if(ctx):
+    from Script7_ML_OutlierIdentification import calculate_outlier_scores_with_isolation_forest, load_and_preprocess
+
+    df, X = load_and_preprocess(ctx["features_path"])
+    scores = calculate_outlier_scores_with_isolation_forest(X, contamination=0.05)
+    return {"rows": len(scores)}
+
+
+def stage_score_vae(ctx):
+    from torch import optim
+    from torch.utils.data import DataLoader, TensorDataset
+
+    from Script7_VAE_OutlierIdentification import (TransformerVAE, calculate_anomaly_scores, load_and_preprocess,
+                                                   train_vae)
+
+    df, X, _ = load_and_preprocess(ctx["features_path"])
+    dataloader = DataLoader(TensorDataset(X.unsqueeze(1)), batch_size=32, shuffle=True)
+    model = TransformerVAE(input_dim=X.size(-1), latent_dim=16, num_heads=4, num_layers=2)
+    train_vae(model, dataloader, optim.Adam(model.parameters(), lr=0.0005), epochs=ctx["vae_epochs"])
+    scores = calculate_anomaly_scores(model, dataloader)
+    return {"rows": len(scores), "epochs": ctx["vae_epochs"]}
+
+
+def stage_feature_eng(ctx):
+    import FeatureEng
+
+    ctx["imi_features_path"] = os.path.join(ctx["work_dir"], "imi_features.csv")
+    FeatureEng.main([ctx["data_dir"], "--output", ctx["imi_features_path"], "--rebuild-transactions"])
+    return {}
+
+
+def stage_dashboard(ctx):
+    from data_layer import add_derived_features, apply_category_dictionary
+    from filter_index import FilterIndex
+    from query_backend import PandasBackend
+
+    path = ctx.get("imi_features_path") or os.path.join(ctx["data_dir"], "imi_features.csv")
+    timings = {}
+    start = time.perf_counter()
+    df = pd.read_csv(path)
+    dictionary = os.path.join(os.path.dirname(path), "category_dictionary.json")
+    if os.path.exists(dictionary):
+        df = apply_category_dictionary(df, dictionary)
+    df = add_derived_features(df)
+    timings["load"] = time.perf_counter() - start
+    start = time.perf_counter()
+    backend = PandasBackend(df, FilterIndex(df))
+    timings["filter_index"] = time.perf_counter() - start
+    for name, (by, metrics, where) in DASHBOARD_QUERIES.items():
+        start = time.perf_counter()
+        backend.aggregate(by, metrics, where=where)
+        timings[name] = time.perf_counter() - start
+    return {"rows": len(df), "queries": timings}
+
+
+STAGE_FUNCTIONS = {name: globals()[f"stage_{name}"] for name in STAGES}
+
+
+def run_stage(name, ctx):
+    """Run one stage with its output silenced; returns its result entry."""
+    start = time.perf_counter()
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            extra = STAGE_FUNCTIONS[name](ctx)
+        entry = {"status": "ok", **extra}
+    except ImportError as e:
+        entry = {"status": "skipped", "note": f"missing dependency: {e.name or e}"}
+    except Exception as e:
+        entry = {"status": "failed", "note": f"{type(e).__name__}: {e}"}
+    entry["seconds"] = time.perf_counter() - start
+    entry["max_rss_mb"] = _max_rss_mb()
+    return entry
+
+
+def run_benchmark(rows, customers=None, seed=0, data_dir=None, work_dir=None, stages=None,
+                  vae_epochs=VAE_EPOCHS):
+    """
+    Run the selected stages.
+
+    Returns:
+        dict: The history entry for this run.
+    """
+    generate = data_dir is None
+    work_dir = work_dir or tempfile.mkdtemp(prefix="transact_bench_")
+    os.makedirs(work_dir, exist_ok=True)
+    ctx = {"rows": rows, "customers": customers, "seed": seed, "vae_epochs": vae_epochs, "work_dir": work_dir,
+           "data_dir": data_dir or os.path.join(work_dir, "raw")}
+    if not generate:
+        manifest_path = os.path.join(data_dir, SyntheticData.MANIFEST)
+        if os.path.exists(manifest_path):
+            with open(manifest_path) as handle:
+                manifest = json.load(handle)
+            ctx.update(rows=manifest["rows"], customers=manifest["customers"], seed=manifest["seed"])
+    # Without --data-dir there is nothing to run on until the data is generated.
+    selected = [name for name in STAGES
+                if (name == "generate" and generate) or (name != "generate" and (stages is None or name in stages))]
+
+    results = {}
+    for name in selected:
+        missing = [need for need in NEEDS.get(name, ())
+                   if need not in selected or results.get(need, {}).get("status") != "ok"]
+        if missing:
+            results[name] = {"status": "skipped", "note": f"needs {', '.join(missing)}", "seconds": 0.0}
+        else:
+            results[name] = run_stage(name, ctx)
+        print(f"{name:>15}: {results[name]['status']:>7} {results[name]['seconds']:9.2f}s "
+              f"{results[name].get('note', '')}", flush=True)
+    return {
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "machine": {"python": platform.python_version(), "platform": platform.platform(),
+                    "cpus": os.cpu_count(), "pandas": pd.__version__},
+        "config": {"rows": ctx["rows"], "customers": ctx["customers"], "seed": ctx["seed"],
+                   "vae_epochs": vae_epochs, "synthetic": generate or None},
+        "work_dir": work_dir,
+        "stages": results,
+    }
+
+
+def load_history(path):
+    if not os.path.exists(path):
+        return []
+    with open(path) as handle:
+        return json.load(handle)["runs"]
+
+
+def save_history(path, runs):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, "w") as handle:
+        json.dump({"runs": runs}, handle, indent=1)
+    os.replace(temporary, path)
+
+
+def _same_config(a, b):
+    keys = ("rows", "customers", "seed", "vae_epochs")
+    return all(a.get(key) == b.get(key) for key in keys)
+
+
+def compare(run, history, threshold=THRESHOLD):
+    """
+    Per-stage comparison with the latest earlier run of the same configuration.
+
+    Returns:
+        pd.DataFrame: stage, status, seconds, baseline_s, change (fraction), regression.
+    """
+    baseline = next((old for old in reversed(history) if _same_config(old["config"], run["config"])), None)
+    rows = []
+    for name, entry in run["stages"].items():
+        before = (baseline or {}).get("stages", {}).get(name, {})
+        base = before.get("seconds") if before.get("status") == "ok" else None
+        change = (entry["seconds"] - base) / base if base and entry["status"] == "ok" else None
+        rows.append({"stage": name, "status": entry["status"], "seconds": entry["seconds"],
+                     "baseline_s": base, "change": change,
+                     "regression": change is not None and change > threshold,
+                     "max_rss_mb": entry.get("max_rss_mb")})
+    table = pd.DataFrame(rows)
+    for column in ("baseline_s", "change", "max_rss_mb"):
+        table[column] = pd.to_numeric(table[column])
+    return table, baseline
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages on synthetic data.")
+    parser.add_argument("--rows", type=int, default=100_000, help="Synthetic channel rows in total")
+    parser.add_argument("--customers", type=int, help="Default: rows / 50")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", help="Use these raw files instead of generating them")
+    parser.add_argument("--work-dir", help="Scratch directory (default: a new temporary one, removed after)")
+    parser.add_argument("--stages", nargs="+", choices=STAGES)
+    parser.add_argument("--vae-epochs", type=int, default=VAE_EPOCHS)
+    parser.add_argument("--history", default=HISTORY)
+    parser.add_argument("--threshold", type=float, default=THRESHOLD, help="Slowdown flagged as a regression")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args(argv)
+
+    run = run_benchmark(args.rows, args.customers, args.seed, args.data_dir, args.work_dir, args.stages,
+                        args.vae_epochs)
+    if args.work_dir is None:
+        shutil.rmtree(run["work_dir"], ignore_errors=True)
+        run["work_dir"] = None
+
+    history = load_history(args.history)
+    table, baseline = compare(run, history, args.threshold)
+    history.append(run)
+    save_history(args.history, history)
+
+    against = f"run of {baseline['timestamp']} ({baseline['commit']})" if baseline else "no earlier run"
+    print(f"\n{run['config']['rows']:,} rows, {run['config']['customers']:,} customers; compared with {against}")
+    print(table.to_string(index=False, na_rep="-", formatters={
+        "seconds": "{:.2f}".format, "baseline_s": lambda v: "-" if pd.isna(v) else f"{v:.2f}",
+        "change": lambda v: "-" if pd.isna(v) else f"{v:+.0%}", "max_rss_mb": lambda v: "-" if pd.isna(v) else f"{v:.0f}"}))
+    dashboard = run["stages"].get("dashboard", {}).get("queries")
+    if dashboard:
+        print("dashboard: " + ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in dashboard.items()))
+    print(f"History: {args.history} ({len(history)} runs)")
+    if args.fail_on_regression and table["regression"].any():
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
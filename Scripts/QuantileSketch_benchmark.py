@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+QuantileSketch_benchmark.py
+
+Accuracy and speed of the KLL sketch (QuantileSketch.py) against exact
+np.percentile for the quantiles FeatureEng's amount thresholds use.
+
+The amounts are synthetic lognormal values with repeated round amounts,
+like the channel files. They are fed in chunks to one sketch (streaming)
+and, separately, to one sketch per part that are then merged through
+to_dict()/from_dict() (what parallel partition or channel runs do). For
+each threshold the true rank of the returned value is compared with the
+requested one and with the rank error the sketch reports.
+
+Usage:
+    python QuantileSketch_benchmark.py [--rows 10000000] [--k 2000] [--parts 16] [--chunk-rows 250000]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from QuantileSketch import KLLSketch
+
+# FeatureEng threshold -> percentile.
+PERCENTILES = {"low (3%)": 3, "small (33%)": 33, "medium (66%)": 66, "high (99%)": 99}
+
+
+def make_amounts(n_rows, seed=0):
+    rng = np.random.default_rng(seed)
+    amount = np.round(rng.lognormal(5, 1.5, n_rows), 2)
+    repeated = rng.random(n_rows) < 0.1
+    amount[repeated] = rng.choice([100.0, 500.0, 1000.0, 9500.0], repeated.sum())
+    return amount
+
+
+def streamed(amount, k, chunk_rows):
+    sketch = KLLSketch(k, seed=0)
+    for start in range(0, len(amount), chunk_rows):
+        sketch.update(amount[start:start + chunk_rows])
+    return sketch
+
+
+def merged(amount, k, parts, chunk_rows):
+    states = [streamed(part, k, chunk_rows).to_dict() for part in np.array_split(amount, parts)]
+    sketch = KLLSketch.from_dict(states[0], seed=0)
+    for state in states[1:]:
+        sketch.merge(KLLSketch.from_dict(state))
+    return sketch
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="KLL sketch vs exact percentiles.")
+    parser.add_argument("--rows", type=int, default=10_000_000)
+    parser.add_argument("--k", type=int, default=2000)
+    parser.add_argument("--parts", type=int, default=16, help="Sketches merged in the parallel variant")
+    parser.add_argument("--chunk-rows", type=int, default=250_000)
+    args = parser.parse_args(argv)
+
+    amount = make_amounts(args.rows)
+    start = time.perf_counter()
+    exact = np.percentile(amount, list(PERCENTILES.values()))
+    exact_time = time.perf_counter() - start
+    ordered = np.sort(amount)
+    print(f"{args.rows:,} amounts, k={args.k}; exact np.percentile {exact_time:.2f}s")
+
+    for label, build in (("streamed", lambda: streamed(amount, args.k, args.chunk_rows)),
+                         (f"merged x{args.parts}", lambda: merged(amount, args.k, args.parts, args.chunk_rows))):
+        start = time.perf_counter()
+        sketch = build()
+        elapsed = time.perf_counter() - start
+        items = sum(len(level) for level in sketch.levels)
+        print(f"\n{label}: {elapsed:.2f}s, {items:,} stored items; reported rank error "
+              f"{sketch.rank_error():.3%} (3 sigma), {sketch.max_rank_error():.3%} (worst case)")
+        print(f"{'threshold':14}{'exact':>12}{'sketch':>12}{'true rank':>11}{'rank error':>12}")
+        estimates = sketch.percentile(list(PERCENTILES.values()))
+        for (name, p), value, estimate in zip(PERCENTILES.items(), exact, estimates):
+            # Ties (repeated amounts) make a range of ranks correct; report the distance to it.
+            low = np.searchsorted(ordered, estimate, side="left") / args.rows * 100
+            high = np.searchsorted(ordered, estimate, side="right") / args.rows * 100
+            error = 0.0 if low <= p <= high else min(abs(low - p), abs(high - p))
+            print(f"{name:14}{value:12.2f}{estimate:12.2f}{(low + high) / 2:10.3f}%{error:11.3f}%")
+
+
+if __name__ == "__main__":
+    main()
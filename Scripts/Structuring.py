@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Structuring.py
+
+Structuring / smurfing detector: deposits split into several transactions
+that each stay under the reporting limit but together cross it within a
+short window.
+
+The existing rules (large_cash_txn, high_txn_outlier, is_round_txn) look at
+one transaction at a time, so a $9,500 + $9,000 pair of abm deposits in two
+days never trips them. Here each customer's abm / cheque / emt credits are
+put on one time-sorted stream, keeping only transactions in the
+"below-threshold" band [min_fraction * limit, limit). Every transaction's
+trailing window is then summed. A window whose sum reaches the limit with
+at least min_txns transactions is an alert, and overlapping alert windows
+of the same customer merge into one cluster.
+
+Everything runs on CustomerSegments (TimeSegments.py): one sort, one
+searchsorted for all window bounds and cumulative sums for window totals.
+There is no per-customer loop, so it scales to the full history.
+
+Outputs:
+    - per-customer features: structuring_alerts (clusters),
+      structuring_txns, structuring_amount, structuring_max_window_sum and
+      near_limit_txns (band transactions), 0 for customers without any;
+    - an alert list: one row per cluster with its time range, transaction
+      count and total, per-channel counts and first/last transaction ids.
+
+Usage:
+    python Structuring.py FINAL_TRANSACTIONS_CSV [--limit 10000] [--window-days 7]
+                          [--min-fraction 0.3] [--min-txns 2] [--all-directions]
+                          [--features structuring_features.csv] [--alerts structuring_alerts.csv]
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from TimeSegments import DAY_NS, CustomerSegments
+from Velocity import transaction_timestamps
+
+# Cash transaction reporting threshold (CAD).
+REPORTING_LIMIT = 10_000.0
+STRUCTURING_CHANNELS = ("abm", "cheque", "emt")
+WINDOW_DAYS = 7
+MIN_FRACTION = 0.3
+MIN_TXNS = 2
+
+FEATURE_COLUMNS = ["structuring_alerts", "structuring_txns", "structuring_amount",
+                   "structuring_max_window_sum", "near_limit_txns"]
+
+# Columns read from final_transactions.csv.
+INPUT_COLUMNS = ["transaction_id", "customer_id", "amount_cad", "debit_credit",
+                 "transaction_date", "transaction_time", "source"]
+
+
+def is_credit(debit_credit):
+    """Credit (deposit / incoming) mask for raw ("credit", "C") or encoded (1) debit_credit values."""
+    values = pd.Series(debit_credit)
+    text = values.astype(str).str.strip().str.upper()
+    return (text.isin(["CREDIT", "C", "1", "1.0", "TRUE"])).to_numpy()
+
+
+def _range_sums(values, start, stop):
+    """Sum of ``values`` over each row range [start, stop)."""
+    cumulative = np.concatenate(([0], np.cumsum(values)))
+    return cumulative[stop] - cumulative[start]
+
+
+def detect_structuring(df, limit=REPORTING_LIMIT, window_days=WINDOW_DAYS, min_fraction=MIN_FRACTION,
+                       min_txns=MIN_TXNS, channels=STRUCTURING_CHANNELS, credits_only=True):
+    """
+    Find below-limit transaction clusters whose trailing-window sum reaches ``limit``.
+
+    Args:
+        df (pd.DataFrame): Transactions with INPUT_COLUMNS.
+        limit (float): Reporting limit; band transactions are below it and
+            the window sum must reach it.
+        window_days (int): Trailing window length.
+        min_fraction (float): Band floor as a fraction of ``limit``.
+        min_txns (int): Minimum transactions in an alerting window.
+        channels (tuple): ``source`` values scanned.
+        credits_only (bool): Only deposits / incoming transfers.
+
+    Returns:
+        tuple: (features, alerts). features is indexed by every customer_id
+        in ``df`` with FEATURE_COLUMNS; alerts has one row per cluster.
+    """
+    customers = pd.Index(np.sort(df["customer_id"].dropna().unique()), name="customer_id")
+    timestamps = transaction_timestamps(df)
+    amount = df["amount_cad"].to_numpy(dtype=float)
+    band = (df["source"].isin(channels).to_numpy() & (amount >= min_fraction * limit) & (amount < limit)
+            & (timestamps != np.iinfo(np.int64).min) & df["customer_id"].notna().to_numpy())
+    if credits_only:
+        band &= is_credit(df["debit_credit"])
+    rows = np.flatnonzero(band)
+
+    segments = CustomerSegments(df["customer_id"].to_numpy()[rows], timestamps[rows].view("datetime64[ns]"))
+    source_rows = rows[segments.order]
+    amounts = amount[source_rows]
+    begin, end = segments.window_bounds(window_days * DAY_NS)
+    window_sums = _range_sums(amounts, begin, end)
+    alerting = (window_sums >= limit) & (end - begin >= min_txns)
+    alert_rows = np.flatnonzero(alerting)
+
+    # Overlapping alert windows of one customer are one cluster. Window
+    # bounds only grow along a segment, so a cluster spans
+    # [begin of its first alert, end of its last alert).
+    new_cluster = np.ones(len(alert_rows), dtype=bool)
+    if len(alert_rows) > 1:
+        previous = alert_rows[:-1]
+        new_cluster[1:] = (segments.segment[alert_rows[1:]] != segments.segment[previous]) \
+            | (begin[alert_rows[1:]] >= end[previous])
+    firsts = np.flatnonzero(new_cluster)
+    lasts = np.append(firsts[1:], len(alert_rows))[:len(firsts)] - 1
+    start_row, stop_row = begin[alert_rows[firsts]], end[alert_rows[lasts]]
+    cluster_segment = segments.segment[alert_rows[firsts]]
+
+    sources = df["source"].to_numpy()[source_rows]
+    transaction_ids = df["transaction_id"].to_numpy()[source_rows]
+    alerts = pd.DataFrame({
+        "customer_id": segments.customers.to_numpy()[cluster_segment],
+        "start": segments.ns[start_row].view("datetime64[ns]"),
+        "end": segments.ns[stop_row - 1].view("datetime64[ns]"),
+        "n_txns": stop_row - start_row,
+        "total_amount": _range_sums(amounts, start_row, stop_row),
+        "max_window_sum": np.maximum.reduceat(window_sums[alert_rows], firsts) if len(firsts) else [],
+        **{f"{channel}_txns": _range_sums(sources == channel, start_row, stop_row) for channel in channels},
+        "first_transaction_id": transaction_ids[start_row],
+        "last_transaction_id": transaction_ids[stop_row - 1],
+    })
+
+    n = segments.n_segments
+    per_segment = pd.DataFrame({
+        "structuring_alerts": np.bincount(cluster_segment, minlength=n),
+        "structuring_txns": np.bincount(cluster_segment, weights=alerts["n_txns"], minlength=n),
+        "structuring_amount": np.bincount(cluster_segment, weights=alerts["total_amount"], minlength=n),
+        "structuring_max_window_sum": segments.max(np.where(alerting, window_sums, np.nan)),
+        "near_limit_txns": segments.lengths,
+    }, index=segments.customers)
+    features = per_segment.reindex(customers).fillna(0)
+    features = features.astype({"structuring_alerts": np.int64, "structuring_txns": np.int64,
+                                "near_limit_txns": np.int64})
+    return features, alerts
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Detect below-limit deposit clusters (structuring).")
+    parser.add_argument("transactions", help="final_transactions.csv")
+    parser.add_argument("--limit", type=float, default=REPORTING_LIMIT)
+    parser.add_argument("--window-days", type=int, default=WINDOW_DAYS)
+    parser.add_argument("--min-fraction", type=float, default=MIN_FRACTION,
+                        help="Band floor as a fraction of the limit (default 0.3)")
+    parser.add_argument("--min-txns", type=int, default=MIN_TXNS)
+    parser.add_argument("--all-directions", action="store_true", help="Scan debits as well as credits")
+    parser.add_argument("--features", default="structuring_features.csv")
+    parser.add_argument("--alerts", default="structuring_alerts.csv")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    df = pd.read_csv(args.transactions, usecols=INPUT_COLUMNS, dtype={"customer_id": str}, low_memory=False)
+    step = time.perf_counter()
+    features, alerts = detect_structuring(df, args.limit, args.window_days, args.min_fraction,
+                                          args.min_txns, credits_only=not args.all_directions)
+    print(f"Scanned {len(df):,} transactions in {time.perf_counter() - step:.1f}s: "
+          f"{len(alerts):,} clusters across {(features['structuring_alerts'] > 0).sum():,} customers")
+
+    features.to_csv(args.features)
+    alerts.to_csv(args.alerts, index=False)
+    print(f"Wrote {args.features} and {args.alerts} (total {time.perf_counter() - start:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
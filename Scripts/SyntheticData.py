@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SyntheticData.py
+
+Generate synthetic raw data in the Script1 schema at any scale, for
+benchmarks and scale tests (the real abm / card / ... files are private).
+
+Writes kyc.csv, kyc_industry_codes.csv and the six channel files (abm, card,
+cheque, eft, emt, wire) with the columns and value formats Script1's
+data_load() and FeatureEng read: "debit" / "credit", "true" / "false" flags,
+YYYY-MM-DD dates, HH:MM:SS times and empty fields for missing values.
+
+The data is skewed the way transaction data is:
+
+* customer activity is Pareto distributed (about 20% of customers make 80%
+  of the transactions), and each customer leans towards some channels;
+* customers have a home province and city; locations follow population
+  weights (Zipf within a province) and most ABM / card transactions happen
+  at home, a few abroad;
+* amounts are lognormal per channel, scaled per customer, with ABM
+  withdrawals in multiples of $20, repeated round amounts and a small share
+  just under the $10,000 reporting threshold;
+* merchant categories and industries are Zipf distributed, and business
+  channels (cheque, EFT, wire) are quieter on weekends and at night.
+
+--rows is the total across the six channel files (from 10k to 100M; the
+customer count defaults to rows / 50). Files are written chunk by chunk, so
+memory stays bounded whatever the scale, and the channels are generated in
+parallel with --workers. The same seed always gives the same files.
+
+Usage:
+    python SyntheticData.py OUTPUT_DIR [--rows 1000000] [--customers N] [--seed 0]
+                            [--days 365] [--chunk-rows 1000000] [--workers 1]
+"""
+
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_ROWS = 1_000_000
+ROWS_PER_CUSTOMER = 50
+CHUNK_ROWS = 1_000_000
+START_DATE = "2022-11-01"
+DAYS = 365
+MANIFEST = "_synthetic.json"
+
+# Channel -> (id column, id prefix, share of all rows).
+CHANNELS = {
+    "abm": ("abm_id", "ABM", 0.12),
+    "card": ("card_trxn_id", "CARD", 0.42),
+    "cheque": ("cheque_id", "CHQ", 0.09),
+    "eft": ("eft_id", "EFT", 0.14),
+    "emt": ("emt_id", "EMT", 0.14),
+    "wire": ("wire_id", "WIRE", 0.09),
+}
+# Channel -> (lognormal mu, sigma, share of debits).
+AMOUNTS = {
+    "abm": (4.6, 0.8, 0.8),
+    "card": (3.6, 1.1, 0.95),
+    "cheque": (7.0, 1.3, 0.5),
+    "eft": (6.5, 1.4, 0.5),
+    "emt": (5.3, 1.1, 0.55),
+    "wire": (8.8, 1.5, 0.5),
+}
+BUSINESS_CHANNELS = ("cheque", "eft", "wire")
+ROUND_AMOUNTS = np.array([100.0, 200.0, 500.0, 1000.0, 2000.0, 5000.0])
+ROUND_SHARE = 0.04
+NEAR_THRESHOLD_SHARE = 0.003
+
+PROVINCES = {
+    "ON": (0.39, ["TORONTO", "MISSISSAUGA", "BRAMPTON", "OTTAWA", "HAMILTON", "LONDON", "MARKHAM", "VAUGHAN",
+                  "KITCHENER", "WINDSOR", "OAKVILLE", "CORNWALL"]),
+    "QC": (0.22, ["MONTREAL", "QUEBEC", "LAVAL", "GATINEAU", "LONGUEUIL", "SHERBROOKE"]),
+    "BC": (0.13, ["VANCOUVER", "SURREY", "BURNABY", "RICHMOND", "VICTORIA", "KELOWNA"]),
+    "AB": (0.12, ["CALGARY", "EDMONTON", "RED DEER", "LETHBRIDGE"]),
+    "MB": (0.04, ["WINNIPEG", "BRANDON"]),
+    "SK": (0.03, ["SASKATOON", "REGINA"]),
+    "NS": (0.03, ["HALIFAX", "DARTMOUTH"]),
+    "NB": (0.02, ["MONCTON", "FREDERICTON", "SAINT JOHN"]),
+    "NL": (0.01, ["ST. JOHN'S"]),
+    "PE": (0.01, ["CHARLOTTETOWN"]),
+}
+FOREIGN_COUNTRIES = np.array(["US", "MX", "GB", "FR", "CN", "IN", "AE", "HK", "BS", "KY"], dtype=object)
+MERCHANT_CATEGORIES = np.array([5411, 5812, 5541, 5999, 5311, 5912, 5814, 4121, 5732, 5651, 5942, 7011, 4511,
+                                5691, 5945, 7832, 5200, 5310, 8011, 8021, 5013, 5047, 5122, 5172, 5933, 5944,
+                                6010, 6011, 6051, 7995, 4829, 5094])
+INDUSTRY_CODES = np.array([4561, 4013, 7771, 6031, 9726, 5961, 4571, 6511, 7511, 8611, 5911, 6211, 4911, 7211,
+                           5411, 6351, 9611, 8631, 5111, 4821, 6111, 7421, 9121, 4111, 5731, 8211, 6591, 4241,
+                           7611, 9911])
+INDUSTRY_NAMES = ["Retail Trade", "Construction", "Consulting Services", "Wholesale Trade", "Carpet Cleaning",
+                  "Jewellery and Watches, Wholesale", "Real Estate Agents", "Restaurants", "Trucking",
+                  "Health Services", "Auto Dealers", "Financial Services", "Agriculture", "Personal Services",
+                  "Clothing Stores", "Insurance", "Money Services", "Education Services", "Manufacturing",
+                  "Transportation", "Banks", "Legal Services", "Religious Organizations", "Mining",
+                  "Software", "Schools", "Holding Companies", "Food Processing", "Repair Services",
+                  "Other Services"]
+
+
+def _zipf_weights(n, exponent=1.1):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def _locations():
+    """(province, city) of every city and its population weight."""
+    provinces, cities, weights = [], [], []
+    for province, (share, names) in PROVINCES.items():
+        for city, weight in zip(names, _zipf_weights(len(names))):
+            provinces.append(province)
+            cities.append(city)
+            weights.append(share * weight)
+    weights = np.array(weights)
+    return np.array(provinces, dtype=object), np.array(cities, dtype=object), weights / weights.sum()
+
+
+# Every second of a day, formatted once; rows index into this (and into
+# _dates()) instead of formatting times and dates row by row.
+_TIMES = np.array([f"{s // 3600:02d}:{s % 3600 // 60:02d}:{s % 60:02d}" for s in range(86400)], dtype=object)
+
+
+def _dates(days, start=START_DATE):
+    dates = pd.date_range(start, periods=days, freq="D")
+    return np.array(dates.strftime("%Y-%m-%d"), dtype=object), dates.weekday.to_numpy()
+
+
+def _with_missing(rng, values, rate):
+    values = values.astype(object)
+    values[rng.random(len(values)) < rate] = None
+    return values
+
+
+def _ids(prefix, start, count, width):
+    numbers = pd.Series(np.arange(start, start + count)).astype(str).str.zfill(width)
+    return (prefix + numbers).to_numpy(dtype=object)
+
+
+class Customers:
+    """
+    The customer population every file is generated from (deterministic in
+    the seed, so worker processes rebuild it instead of receiving it).
+
+    Attributes:
+        ids (np.ndarray): customer_id strings.
+        activity (np.ndarray): Relative transaction rate per customer (Pareto).
+        scale (np.ndarray): Amount multiplier per customer (business size).
+        home (np.ndarray): Index of each customer's home city in _locations().
+    """
+
+    def __init__(self, n_customers, seed=0):
+        rng = np.random.default_rng([seed, 0])
+        self.n = n_customers
+        self.ids = _ids("SYNCID", 0, n_customers, 10)
+        # Classic Pareto with alpha = log(5) / log(4): the 80/20 rule.
+        self.activity = rng.pareto(1.16, n_customers) + 1
+        self.scale = rng.lognormal(0.0, 0.7, n_customers)
+        self.provinces, self.cities, city_weights = _locations()
+        self.home = rng.choice(len(self.cities), n_customers, p=city_weights)
+        self.city_weights = city_weights
+        self.industry = rng.choice(len(INDUSTRY_CODES), n_customers, p=_zipf_weights(len(INDUSTRY_CODES), 0.9))
+        # How much each customer favours each channel.
+        self.affinity = {channel: rng.lognormal(0.0, 1.0, n_customers) for channel in CHANNELS}
+
+    def channel_weights(self, channel):
+        weights = self.activity * self.affinity[channel]
+        return weights / weights.sum()
+
+
+def write_kyc(output_dir, customers, seed=0):
+    """Write kyc.csv and kyc_industry_codes.csv."""
+    rng = np.random.default_rng([seed, 1])
+    pd.DataFrame({"industry_code": INDUSTRY_CODES, "industry": INDUSTRY_NAMES}).to_csv(
+        os.path.join(output_dir, "kyc_industry_codes.csv"), index=False)
+
+    n = customers.n
+    industry = INDUSTRY_CODES[customers.industry].astype(object)
+    industry[rng.random(n) < 0.005] = "other"
+    age_days = np.minimum(rng.exponential(6000, n), 26000).astype(int)
+    established = pd.Timestamp("2022-10-31") - pd.to_timedelta(age_days, unit="D")
+    onboard = established + pd.to_timedelta(rng.integers(0, 3650, n), unit="D")
+    onboard = onboard.where(onboard < pd.Timestamp("2023-06-30"), pd.Timestamp("2023-06-30"))
+    employees = np.round(rng.lognormal(1.5, 1.4, n)).astype(float)
+    sales = np.round(rng.lognormal(13, 1.6, n) * customers.scale, -2)
+    frame = pd.DataFrame({
+        "customer_id": customers.ids,
+        "country": "CA",
+        "province": _with_missing(rng, customers.provinces[customers.home], 0.01),
+        "city": _with_missing(rng, customers.cities[customers.home], 0.05),
+        "industry_code": industry,
+        "employee_count": np.where(rng.random(n) < 0.3, np.nan, employees),
+        "sales": np.where(rng.random(n) < 0.4, np.nan, sales),
+        "established_date": established.strftime("%Y-%m-%d"),
+        "onboard_date": onboard.strftime("%Y-%m-%d"),
+    })
+    frame.to_csv(os.path.join(output_dir, "kyc.csv"), index=False)
+    return len(frame)
+
+
+def channel_chunk(channel, customers, rng, start, count, dates, weekdays):
+    """``count`` rows of one channel file, ids numbered from ``start``."""
+    id_column, prefix, _ = CHANNELS[channel]
+    mu, sigma, debit_share = AMOUNTS[channel]
+    who = rng.choice(customers.n, count, p=customers.channel_weights(channel))
+
+    amount = rng.lognormal(mu, sigma, count) * customers.scale[who]
+    if channel == "abm":
+        amount = np.maximum(np.round(amount / 20) * 20, 20.0)
+    draw = rng.random(count)
+    amount = np.where(draw < ROUND_SHARE, rng.choice(ROUND_AMOUNTS, count), amount)
+    near = (draw >= ROUND_SHARE) & (draw < ROUND_SHARE + NEAR_THRESHOLD_SHARE)
+    amount = np.where(near, rng.uniform(9000, 9999.99, count), amount)
+
+    business = channel in BUSINESS_CHANNELS
+    day_weights = np.where(weekdays >= 5, 0.25 if business else 0.8, 1.0)
+    day = rng.choice(len(dates), count, p=day_weights / day_weights.sum())
+    hour_weights = np.array([1, 0.5, 0.3, 0.2, 0.2, 0.4, 1, 2, 4, 6, 7, 7, 8, 7, 7, 7, 6, 6, 5, 4, 3, 2, 2, 1.5])
+    if business:
+        hour_weights[:7] *= 0.2
+    hour = rng.choice(24, count, p=hour_weights / hour_weights.sum())
+    seconds = hour * 3600 + rng.integers(0, 3600, count)
+
+    frame = {
+        id_column: _ids(prefix, start, count, 20 - len(prefix)),
+        "customer_id": customers.ids[who],
+        "amount_cad": np.round(amount, 2),
+        "debit_credit": np.where(rng.random(count) < debit_share, "debit", "credit"),
+    }
+    if channel == "abm":
+        frame["cash_indicator"] = np.where(rng.random(count) < 0.9, "true", "false")
+    if channel == "card":
+        category = MERCHANT_CATEGORIES[rng.choice(len(MERCHANT_CATEGORIES), count,
+                                                  p=_zipf_weights(len(MERCHANT_CATEGORIES)))].astype(float)
+        category[rng.random(count) < 0.03] = np.nan
+        frame["merchant_category"] = category
+        frame["ecommerce_ind"] = np.where(rng.random(count) < 0.3, "true", "false")
+    if channel in ("abm", "card"):
+        away = rng.random(count)
+        city = np.where(away < 0.8, customers.home[who],
+                        rng.choice(len(customers.cities), count, p=customers.city_weights))
+        abroad = away > (0.985 if channel == "abm" else 0.96)
+        frame["country"] = np.where(abroad, rng.choice(FOREIGN_COUNTRIES, count), "CA").astype(object)
+        frame["province"] = np.where(abroad, None, customers.provinces[city])
+        frame["city"] = np.where(abroad, None, customers.cities[city])
+        missing = rng.random(count) < 0.1
+        for column in ("country", "province", "city"):
+            frame[column] = np.where(missing, None, frame[column])
+    frame["transaction_date"] = dates[day]
+    if channel != "cheque":
+        frame["transaction_time"] = _TIMES[seconds]
+    return pd.DataFrame(frame)
+
+
+def write_channel(output_dir, channel, rows, n_customers, seed=0, days=DAYS, chunk_rows=CHUNK_ROWS):
+    """Write one channel file in chunks; returns (channel, rows written)."""
+    customers = Customers(n_customers, seed)
+    rng = np.random.default_rng([seed, 2, list(CHANNELS).index(channel)])
+    dates, weekdays = _dates(days)
+    path = os.path.join(output_dir, f"{channel}.csv")
+    temporary = f"{path}.tmp"
+    written = 0
+    with open(temporary, "w", newline="") as handle:
+        while True:
+            count = min(chunk_rows, rows - written)
+            chunk = channel_chunk(channel, customers, rng, written, count, dates, weekdays)
+            chunk.to_csv(handle, header=written == 0, index=False)
+            written += count
+            if written >= rows:
+                break
+    os.replace(temporary, path)
+    return channel, written
+
+
+def _run(function, tasks, workers):
+    """Apply ``function`` to every argument tuple, in worker processes when workers > 1."""
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(min(workers, len(tasks))) as pool:
+            return list(pool.map(function, *zip(*tasks)))
+    return [function(*task) for task in tasks]
+
+
+def channel_rows(rows):
+    """Rows per channel file for a total of ``rows`` (shares of CHANNELS)."""
+    counts = {channel: int(rows * share) for channel, (_, _, share) in CHANNELS.items()}
+    counts["card"] += rows - sum(counts.values())
+    return counts
+
+
+def generate(output_dir, rows=DEFAULT_ROWS, customers=None, seed=0, days=DAYS, chunk_rows=CHUNK_ROWS, workers=1):
+    """
+    Write a full synthetic raw dataset.
+
+    Args:
+        output_dir (str): Directory for the eight CSV files.
+        rows (int): Total transaction rows across the six channels.
+        customers (int): Number of customers (default rows / 50, at least 100).
+        seed (int): Random seed.
+        days (int): Length of the transaction window starting at START_DATE.
+        chunk_rows (int): Rows generated and written at a time.
+        workers (int): Channel files generated at once.
+
+    Returns:
+        dict: The generation parameters and row count per file (also saved
+        as OUTPUT_DIR/_synthetic.json).
+    """
+    start = time.perf_counter()
+    customers = customers or max(100, rows // ROWS_PER_CUSTOMER)
+    os.makedirs(output_dir, exist_ok=True)
+    counts = {"kyc": write_kyc(output_dir, Customers(customers, seed), seed),
+              "kyc_industry_codes": len(INDUSTRY_CODES)}
+    tasks = [(output_dir, channel, count, customers, seed, days, chunk_rows)
+             for channel, count in channel_rows(rows).items()]
+    counts.update(_run(write_channel, tasks, workers))
+    manifest = {"rows": rows, "customers": customers, "seed": seed, "days": days, "files": counts,
+                "seconds": time.perf_counter() - start}
+    with open(os.path.join(output_dir, MANIFEST), "w") as handle:
+        json.dump(manifest, handle, indent=1)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate synthetic raw transaction data in the Script1 schema.")
+    parser.add_argument("output_dir")
+    parser.add_argument("--rows", type=int, default=DEFAULT_ROWS, help="Total channel rows (10k to 100M)")
+    parser.add_argument("--customers", type=int, help="Default: rows / 50")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--days", type=int, default=DAYS)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--workers", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    manifest = generate(args.output_dir, args.rows, args.customers, args.seed, args.days, args.chunk_rows,
+                        args.workers)
+    for name, count in manifest["files"].items():
+        print(f"  {name}.csv: {count:,} rows")
+    print(f"Wrote {args.rows:,} transactions for {manifest['customers']:,} customers to {args.output_dir} "
+          f"in {manifest['seconds']:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+TimeSegments.py
+
+Sort-once engine for per-customer time-series features.
+
+CustomerSegments sorts the transactions by (customer_id, date) a single time
+and keeps the start offset of every customer's contiguous block of rows (its
+segment). Gaps, same-day and monthly counts, per-segment statistics and
+trailing-window aggregates are then plain numpy operations on those blocks
+(diff, run detection, bincount, reduceat, searchsorted), with no further
+sorting or groupby calls.
+
+Missing dates (NaT) sort last within their customer, as in
+DataFrame.sort_values; they have no gap and are left out of day/month runs.
+"""
+
+import numpy as np
+import pandas as pd
+
+DAY_NS = 86_400 * 10**9
+
+
+class CustomerSegments:
+    """
+    Transactions sorted by (customer, date) with per-customer segment offsets.
+
+    Attributes:
+        customers (pd.Index): Sorted distinct customer ids, one per segment.
+        order (np.ndarray): Positions of the input rows in sorted order; use
+            take() to bring other columns into that order.
+        starts (np.ndarray): First sorted row of each segment.
+        lengths (np.ndarray): Number of rows in each segment.
+        segment (np.ndarray): Segment number of every sorted row.
+        ns (np.ndarray): Sorted timestamps as int64 nanoseconds.
+        valid (np.ndarray): False where the sorted date is NaT.
+    """
+
+    def __init__(self, customer_id, dates):
+        """
+        Args:
+            customer_id (array-like): Customer of each transaction (no nulls).
+            dates (array-like): Transaction timestamps (datetime-like, NaT allowed).
+        """
+        codes, customers = pd.factorize(np.asarray(customer_id), sort=True)
+        if (codes < 0).any():
+            raise ValueError("customer_id must not contain missing values")
+        dates = pd.DatetimeIndex(dates)
+        valid = ~dates.isna()
+        ns = dates.asi8.copy()
+        # NaT sorts after every real date of the same customer.
+        ns[~valid] = np.iinfo(np.int64).max
+        self.order = np.lexsort((ns, codes))
+
+        self.customers = pd.Index(customers, name="customer_id")
+        self.segment = codes[self.order]
+        self.ns = ns[self.order]
+        self.valid = valid[self.order]
+        self.n_segments = len(customers)
+        self.lengths = np.bincount(self.segment, minlength=self.n_segments)
+        self.starts = np.concatenate(([0], np.cumsum(self.lengths)[:-1]))
+
+    def __len__(self):
+        return len(self.order)
+
+    def take(self, values):
+        """Reorder an input-aligned array (or Series) into segment order."""
+        if isinstance(values, pd.Series):
+            return values.take(self.order).reset_index(drop=True)
+        return np.asarray(values)[self.order]
+
+    def to_series(self, values, name=None):
+        """Wrap one value per segment as a Series indexed by customer_id."""
+        return pd.Series(values, index=self.customers, name=name)
+
+    # -- per-row time series ------------------------------------------------
+
+    def dates(self):
+        """Sorted dates as datetime64[ns] (NaT restored)."""
+        return np.where(self.valid, self.ns, np.iinfo(np.int64).min).view("datetime64[ns]")
+
+    def is_segment_start(self):
+        """True on the first row of every segment."""
+        first = np.zeros(len(self), dtype=bool)
+        first[self.starts[self.lengths > 0]] = True
+        return first
+
+    def gaps(self, unit_ns=DAY_NS):
+        """
+        Time since the previous transaction of the same customer, floored to
+        whole ``unit_ns`` (days by default, like Timedelta.days).
+
+        Returns:
+            np.ndarray: float, NaN on each customer's first row and on NaT rows.
+        """
+        gaps = np.full(len(self), np.nan)
+        if len(self) > 1:
+            current_ok = self.valid[1:] & self.valid[:-1]
+            delta = np.where(current_ok, self.ns[1:] - np.where(current_ok, self.ns[:-1], 0), 0)
+            gaps[1:] = np.where(current_ok, np.floor_divide(delta, unit_ns), np.nan)
+        gaps[self.is_segment_start()] = np.nan
+        return gaps
+
+    def runs(self, keys):
+        """
+        Split every segment into runs of equal consecutive ``keys``.
+
+        ``keys`` must be non-decreasing within a segment in sorted order
+        (e.g. day or month numbers derived from the dates). Rows with NaT
+        dates are excluded.
+
+        Returns:
+            tuple: (run_segment, run_key, run_length) arrays, one entry per run.
+        """
+        rows = np.flatnonzero(self.valid)
+        segment, keys = self.segment[rows], np.asarray(keys)[rows]
+        if not len(rows):
+            empty = np.empty(0, dtype=np.int64)
+            return empty, keys[:0], empty
+        boundary = np.ones(len(rows), dtype=bool)
+        boundary[1:] = (segment[1:] != segment[:-1]) | (keys[1:] != keys[:-1])
+        run_starts = np.flatnonzero(boundary)
+        run_lengths = np.diff(np.append(run_starts, len(rows)))
+        return segment[run_starts], keys[run_starts], run_lengths
+
+    def day_keys(self):
+        """Whole days since the epoch for every sorted row (NaT rows: -1)."""
+        return np.where(self.valid, self.ns // DAY_NS, -1)
+
+    def month_keys(self):
+        """Months since 1970-01 for every sorted row (NaT rows: -1)."""
+        return np.where(self.valid, self.dates().astype("datetime64[M]").astype(np.int64), -1)
+
+    def rolling_sum(self, values, window_ns, include_current=True):
+        """
+        Trailing-window sum per row: ``values`` of the same customer with a
+        timestamp in (t - window_ns, t].
+
+        Uses one searchsorted over packed (segment, time) keys, so it is
+        O(n log n) with no per-customer loop. Rows sharing a timestamp all
+        fall in (or out of) each other's window. NaT rows and NaN values
+        contribute nothing.
+
+        Args:
+            values (np.ndarray): Values in segment order (see take()).
+            window_ns (int): Window length in nanoseconds.
+            include_current (bool): Whether rows at the same timestamp count.
+
+        Returns:
+            np.ndarray: float window sums, NaN on NaT rows.
+        """
+        values = np.where(self.valid & ~np.isnan(values), values, 0.0)
+        cumulative = np.concatenate(([0.0], np.cumsum(values)))
+        begin, end = self.window_bounds(window_ns, include_current)
+        sums = cumulative[end] - cumulative[begin]
+        return np.where(self.valid, sums, np.nan)
+
+    def window_bounds(self, window_ns, include_current=True):
+        """
+        Sorted-row range [begin, end) of every row's trailing window (see
+        rolling_sum); lets callers reduce or locate the rows of a window.
+
+        Returns:
+            tuple: (begin, end) int arrays, one entry per sorted row.
+        """
+        keys, low = self._window_keys(window_ns)
+        side = "right" if include_current else "left"
+        return np.searchsorted(keys, low, side="right"), np.searchsorted(keys, keys, side=side)
+
+    def _window_keys(self, window_ns):
+        """
+        Sorted (segment, time) search keys for the rows and for each row's
+        window start. Packed into one int64 (segment * span + time in the
+        coarsest unit that divides every timestamp) when that fits, else a
+        slower structured array.
+        """
+        ns = self.ns[self.valid]
+        origin = int(ns.min()) if len(ns) else 0
+        for unit in (DAY_NS, 10**9, 10**6, 10**3, 1):
+            if window_ns % unit == 0 and not ((ns - origin) % unit).any():
+                break
+        window = window_ns // unit
+        ticks = np.where(self.valid, self.ns - origin, 0) // unit
+        span = (int(ticks.max()) if len(ticks) else 0) + window + 2
+        # NaT rows sort last within their segment (tick span - 1).
+        ticks = np.where(self.valid, ticks + window, span - 1)
+        if span * max(self.n_segments, 1) < np.iinfo(np.int64).max:
+            base = self.segment.astype(np.int64) * span
+            return base + ticks, base + ticks - window
+        keys = np.rec.fromarrays([self.segment, ticks], names="segment,ticks")
+        return keys, np.rec.fromarrays([self.segment, ticks - window], names="segment,ticks")
+
+    def rolling_count(self, window_ns, include_current=True):
+        """Trailing-window transaction count per row (see rolling_sum)."""
+        return self.rolling_sum(np.ones(len(self)), window_ns, include_current)
+
+    # -- per-segment reductions ----------------------------------------------
+
+    def _reduce_keys(self, segment, values):
+        values = np.asarray(values, dtype=float)
+        keep = ~np.isnan(values)
+        return np.asarray(segment)[keep], values[keep]
+
+    def count_rows(self, mask=None):
+        """Rows per segment, optionally only those where ``mask`` (segment order) is True."""
+        segment = self.segment if mask is None else self.segment[np.asarray(mask, dtype=bool)]
+        return np.bincount(segment, minlength=self.n_segments)
+
+    def count(self, values, segment=None):
+        """Non-NaN values per segment (``segment`` defaults to the row segments)."""
+        segment, values = self._reduce_keys(self.segment if segment is None else segment, values)
+        return np.bincount(segment, minlength=self.n_segments)
+
+    def sum(self, values, segment=None):
+        """Sum of non-NaN values per segment (0 for segments without any)."""
+        segment, values = self._reduce_keys(self.segment if segment is None else segment, values)
+        return np.bincount(segment, weights=values, minlength=self.n_segments)
+
+    def mean(self, values, segment=None):
+        """Mean of non-NaN values per segment (NaN for segments without any)."""
+        counts = self.count(values, segment)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(counts > 0, self.sum(values, segment) / counts, np.nan)
+
+    def std(self, values, segment=None, ddof=1):
+        """Sample std of non-NaN values per segment (NaN below ddof + 1 values)."""
+        segment, values = self._reduce_keys(self.segment if segment is None else segment, values)
+        counts = np.bincount(segment, minlength=self.n_segments)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.bincount(segment, weights=values, minlength=self.n_segments) / counts
+            squares = np.bincount(segment, weights=(values - means[segment]) ** 2, minlength=self.n_segments)
+            return np.where(counts > ddof, np.sqrt(squares / (counts - ddof)), np.nan)
+
+    def min(self, values):
+        """Minimum of non-NaN row values per segment (NaN for segments without any)."""
+        return self._extreme(np.minimum, values, np.inf)
+
+    def max(self, values):
+        """Maximum of non-NaN row values per segment (NaN for segments without any)."""
+        return self._extreme(np.maximum, values, -np.inf)
+
+    def _extreme(self, ufunc, values, identity):
+        values = np.asarray(values, dtype=float)
+        present = self.lengths > 0
+        result = np.full(self.n_segments, np.nan)
+        if present.any():
+            reduced = ufunc.reduceat(np.where(np.isnan(values), identity, values), self.starts[present])
+            result[present] = np.where(np.isinf(reduced) & (reduced == identity), np.nan, reduced)
+        return result
+
+    def count_by(self, codes, n_codes, values=None):
+        """
+        Count (or sum ``values``) per (segment, code) for codes in [0, n_codes).
+
+        Rows with a negative code (or NaN value) are skipped.
+
+        Returns:
+            np.ndarray: shape (n_segments, n_codes).
+        """
+        codes = np.asarray(codes)
+        keep = codes >= 0
+        weights = None
+        if values is not None:
+            values = np.asarray(values, dtype=float)
+            keep &= ~np.isnan(values)
+            weights = values[keep]
+        flat = self.segment[keep] * n_codes + codes[keep]
+        return np.bincount(flat, weights=weights, minlength=self.n_segments * n_codes) \
+            .reshape(self.n_segments, n_codes)
+
+    def repeated_lengths(self, run_segment, run_length):
+        """
+        Per segment, how many distinct run lengths occur in more than one run
+        (e.g. how many monthly transaction counts repeat across months).
+        """
+        if not len(run_length):
+            return np.zeros(self.n_segments, dtype=np.int64)
+        width = int(run_length.max()) + 1
+        pairs, occurrences = np.unique(run_segment * width + run_length, return_counts=True)
+        return np.bincount(pairs[occurrences > 1] // width, minlength=self.n_segments)
@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Velocity.py
+
+Per-customer rolling-window velocity features: for each channel (abm, card,
+cheque, eft, emt, wire) and each window (1, 7, 30, 90 days), the number and
+total amount of the customer's transactions in the trailing window.
+
+The notebook's only windowed feature is sudden_spike_ratio: one fixed "last
+60 days before the latest date" window, recomputed from the full history on
+every run. Here the windows are kept as incremental state instead.
+
+VelocityState holds one ring buffer per (customer, channel). Each buffer
+keeps the transactions still inside the longest window, a head position for
+every window, and that window's running count and sum. A new transaction is
+appended, and each head moves past entries that fell out of its window,
+subtracting them. Every entry is added and expired once per window, so an
+update is O(1) amortized whatever the history length. The expired prefix is
+dropped once it is half the buffer.
+
+The state can be saved with snapshot() and loaded with restore(). A daily
+run then only applies transactions newer than the snapshot's watermark
+instead of re-reading the history. from_history() builds the same state
+from a full history by applying only the rows inside the longest window of
+the latest timestamp, which is all the ring buffers would retain.
+
+Usage:
+    python Velocity.py FINAL_TRANSACTIONS_CSV [--state velocity_state.npz]
+                       [--as-of YYYY-MM-DD] [--output velocity_features.csv]
+"""
+
+import argparse
+import math
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from FeatureEng import CHANNELS
+from TimeSegments import DAY_NS
+
+WINDOWS_DAYS = (1, 7, 30, 90)
+
+
+def feature_columns(channels=tuple(CHANNELS), windows_days=WINDOWS_DAYS):
+    """Output column names, channel by channel: <channel>_count_<d>d, <channel>_amount_<d>d."""
+    return [f"{channel}_{kind}_{days}d" for channel in channels
+            for kind in ("count", "amount") for days in windows_days]
+
+
+def transaction_timestamps(df):
+    """
+    transaction_date plus transaction_time (where a channel has one) as int64 ns.
+
+    Returns:
+        np.ndarray: Nanoseconds since the epoch; rows without a date get NaT's value.
+    """
+    dates = pd.to_datetime(df["transaction_date"])
+    times = pd.to_timedelta(df["transaction_time"], errors="coerce")
+    return (dates + times.fillna(pd.Timedelta(0))).to_numpy(dtype="datetime64[ns]").view(np.int64)
+
+
+class _RingBuffer:
+    """Transactions of one (customer, channel) inside the longest window."""
+
+    __slots__ = ("times", "amounts", "heads", "sums")
+
+    def __init__(self, n_windows):
+        self.times = []
+        self.amounts = []
+        self.heads = [0] * n_windows
+        self.sums = [0.0] * n_windows
+
+    def add(self, timestamp, amount, windows):
+        self.times.append(timestamp)
+        self.amounts.append(amount)
+        for w in range(len(windows)):
+            self.sums[w] += amount
+        self.expire(timestamp, windows)
+
+    def expire(self, now, windows):
+        """Move every window's head past entries at or before ``now - window``."""
+        times, amounts, heads, sums = self.times, self.amounts, self.heads, self.sums
+        for w, length in enumerate(windows):
+            head, cutoff = heads[w], now - length
+            while head < len(times) and times[head] <= cutoff:
+                sums[w] -= amounts[head]
+                head += 1
+            heads[w] = head
+        # windows ascend, so the longest window's head is the oldest live entry.
+        drop = heads[-1]
+        if drop and 2 * drop >= len(times):
+            del times[:drop], amounts[:drop]
+            for w in range(len(heads)):
+                heads[w] -= drop
+                # Re-summing here (amortized O(1)) stops float drift from
+                # the running subtractions.
+                sums[w] = math.fsum(amounts[heads[w]:])
+
+    def totals(self):
+        """(count, sum) per window."""
+        return [len(self.times) - head for head in self.heads], list(self.sums)
+
+
+class VelocityState:
+    """
+    Incremental per-customer, per-channel rolling counts and sums.
+
+    Attributes:
+        windows_days (tuple): Window lengths in days, ascending.
+        channels (tuple): Channel names (transaction ``source`` values).
+        watermark (int): Latest timestamp applied (ns), or None.
+        buffers (dict): (customer_id, channel) -> ring buffer.
+    """
+
+    def __init__(self, windows_days=WINDOWS_DAYS, channels=tuple(CHANNELS)):
+        self.windows_days = tuple(sorted(windows_days))
+        self.channels = tuple(channels)
+        self.windows = tuple(days * DAY_NS for days in self.windows_days)
+        self.watermark = None
+        self.buffers = {}
+
+    def __len__(self):
+        return sum(len(buffer.times) for buffer in self.buffers.values())
+
+    def add(self, customer_id, channel, timestamp, amount):
+        """
+        Apply one transaction (timestamp in ns; NaN amounts count with 0).
+
+        Transactions must arrive in non-decreasing timestamp order.
+
+        Returns:
+            tuple: (counts, sums) per window for this customer and channel,
+            including the transaction.
+        """
+        if self.watermark is not None and timestamp < self.watermark:
+            raise ValueError("transactions must be applied in timestamp order "
+                             f"({timestamp} < watermark {self.watermark})")
+        key = (customer_id, channel)
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            buffer = self.buffers[key] = _RingBuffer(len(self.windows))
+        buffer.add(timestamp, 0.0 if amount != amount else amount, self.windows)
+        self.watermark = timestamp
+        return buffer.totals()
+
+    def add_frame(self, df):
+        """
+        Apply a batch of transactions (final_transactions columns).
+
+        Rows are applied in timestamp order; rows without a date or with an
+        unknown source are skipped.
+
+        Returns:
+            int: Number of transactions applied.
+        """
+        timestamps = transaction_timestamps(df)
+        valid = (timestamps != np.iinfo(np.int64).min) & df["source"].isin(self.channels).to_numpy()
+        order = np.flatnonzero(valid)[np.argsort(timestamps[valid], kind="stable")]
+        if not len(order):
+            return 0
+        if self.watermark is not None and timestamps[order[0]] < self.watermark:
+            raise ValueError("batch contains transactions older than the state's watermark")
+        customers = df["customer_id"].to_numpy()[order].tolist()
+        sources = df["source"].to_numpy()[order].tolist()
+        amounts = df["amount_cad"].to_numpy(dtype=float)[order].tolist()
+        for customer, source, timestamp, amount in zip(customers, sources, timestamps[order].tolist(), amounts):
+            self.add(customer, source, timestamp, amount)
+        return len(order)
+
+    @classmethod
+    def from_history(cls, df, windows_days=WINDOWS_DAYS, channels=tuple(CHANNELS)):
+        """
+        State after applying a full history, without replaying all of it.
+
+        Only rows inside the longest window of the latest timestamp can still
+        be in a ring buffer, so only those are applied.
+        """
+        state = cls(windows_days, channels)
+        timestamps = transaction_timestamps(df)
+        valid = timestamps != np.iinfo(np.int64).min
+        if not valid.any():
+            return state
+        latest = timestamps[valid].max()
+        recent = valid & (timestamps > latest - state.windows[-1])
+        state.add_frame(df.loc[recent])
+        state.expire(latest)
+        return state
+
+    def expire(self, as_of):
+        """Advance every buffer to ``as_of`` (ns) without adding transactions."""
+        if self.watermark is not None and as_of < self.watermark:
+            raise ValueError("as_of is before the state's watermark")
+        for buffer in self.buffers.values():
+            buffer.expire(as_of, self.windows)
+        self.watermark = as_of
+
+    def features(self, as_of=None):
+        """
+        Current window counts and sums per customer.
+
+        Args:
+            as_of (int): Evaluate the windows at this timestamp (ns); defaults
+                to the watermark. Advances the state.
+
+        Returns:
+            pd.DataFrame: One row per customer_id (the index), feature_columns()
+            as columns, 0 where a customer has no transactions in a channel.
+        """
+        if as_of is not None:
+            self.expire(as_of)
+        customers = pd.Index(sorted({customer for customer, _ in self.buffers}), name="customer_id")
+        columns = feature_columns(self.channels, self.windows_days)
+        values = np.zeros((len(customers), len(columns)))
+        position = {customer: i for i, customer in enumerate(customers)}
+        width = 2 * len(self.windows)
+        for (customer, channel), buffer in self.buffers.items():
+            counts, sums = buffer.totals()
+            start = self.channels.index(channel) * width
+            values[position[customer], start:start + width] = counts + sums
+        frame = pd.DataFrame(values, index=customers, columns=columns)
+        count_columns = [column for column in columns if "_count_" in column]
+        return frame.astype({column: np.int64 for column in count_columns})
+
+    def snapshot(self, path):
+        """Save the live ring-buffer entries and the watermark to an .npz file."""
+        keys, times, amounts = [], [], []
+        for key, buffer in self.buffers.items():
+            start = buffer.heads[-1]
+            keys.extend([key] * (len(buffer.times) - start))
+            times.extend(buffer.times[start:])
+            amounts.extend(buffer.amounts[start:])
+        keys = np.array(keys, dtype=object).reshape(-1, 2)
+        np.savez_compressed(
+            path,
+            customer_id=keys[:, 0].astype(str),
+            channel=keys[:, 1].astype(str),
+            time=np.array(times, dtype=np.int64),
+            amount=np.array(amounts, dtype=float),
+            windows_days=np.array(self.windows_days),
+            channels=np.array(self.channels),
+            watermark=np.array([-1 if self.watermark is None else self.watermark], dtype=np.int64),
+        )
+
+    @classmethod
+    def restore(cls, path):
+        """Load a state saved with snapshot()."""
+        with np.load(path) as saved:
+            state = cls(tuple(saved["windows_days"].tolist()), tuple(saved["channels"].tolist()))
+            for customer, channel, timestamp, amount in zip(saved["customer_id"].tolist(), saved["channel"].tolist(),
+                                                            saved["time"].tolist(), saved["amount"].tolist()):
+                key = (customer, channel)
+                buffer = state.buffers.get(key)
+                if buffer is None:
+                    buffer = state.buffers[key] = _RingBuffer(len(state.windows))
+                buffer.add(timestamp, amount, state.windows)
+            watermark = int(saved["watermark"][0])
+        if watermark >= 0:
+            state.expire(watermark)
+        return state
+
+
+def window_totals(df, as_of, windows_days=WINDOWS_DAYS, channels=tuple(CHANNELS)):
+    """
+    Direct (non-incremental) computation of VelocityState.features(as_of)
+    from a full history, for checking the incremental state.
+    """
+    timestamps = transaction_timestamps(df)
+    customers = pd.Index(sorted(df["customer_id"].unique()), name="customer_id")
+    frame = pd.DataFrame(0.0, index=customers, columns=feature_columns(channels, windows_days))
+    amount = df["amount_cad"].fillna(0)
+    for channel in channels:
+        for days in windows_days:
+            inside = (df["source"].to_numpy() == channel) & (timestamps > as_of - days * DAY_NS) \
+                & (timestamps <= as_of)
+            grouped = amount[inside].groupby(df["customer_id"][inside])
+            frame.loc[grouped.size().index, f"{channel}_count_{days}d"] = grouped.size()
+            frame.loc[grouped.sum().index, f"{channel}_amount_{days}d"] = grouped.sum()
+    return frame
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Incremental per-channel rolling velocity features.")
+    parser.add_argument("transactions", help="final_transactions.csv (or any newer extract with its columns)")
+    parser.add_argument("--state", default="velocity_state.npz",
+                        help="Ring-buffer snapshot to resume from and update (default: velocity_state.npz)")
+    parser.add_argument("--as-of", help="Evaluate windows at this date (default: latest transaction)")
+    parser.add_argument("--output", default="velocity_features.csv")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    df = pd.read_csv(args.transactions, low_memory=False)
+    if os.path.exists(args.state):
+        state = VelocityState.restore(args.state)
+        # A snapshot of an empty state has no watermark: every row is new.
+        new = df if state.watermark is None else df.loc[transaction_timestamps(df) > state.watermark]
+        applied = state.add_frame(new)
+        print(f"Restored {len(state):,} buffered transactions; applied {applied:,} newer ones")
+    else:
+        state = VelocityState.from_history(df)
+        print(f"Built state from {len(df):,} transactions ({len(state):,} buffered)")
+
+    as_of = None
+    if args.as_of:
+        as_of = pd.Timestamp(args.as_of).value
+        if state.watermark is not None:
+            as_of = max(as_of, state.watermark)
+    features = state.features(as_of)
+    state.snapshot(args.state)
+    features.to_csv(args.output)
+    print(f"Wrote {args.output} ({len(features):,} customers) and {args.state} "
+          f"in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
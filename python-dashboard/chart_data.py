@@ -0,0 +1,152 @@
+# chart_data.py
+"""
+Server-side reduction of chart data before it is handed to Altair.
+
+Altair embeds every row of its source frame in the Vega-Lite spec, so
+charting raw transactions makes the payload grow with the data (and trips
+Altair's 5000-row limit). The helpers here bin, summarise, keep the top-N
+or sample in numpy/pandas, so each chart ships a bounded number of rows:
+
+- histogram() / histogram_chart(): at most ``maxbins`` rows (binning is
+  shared with QueryBackend.histogram(), which pages use for backend columns).
+- box_summary() / boxplot_chart(): one row per group.
+- top_n(): ``n`` rows plus an optional "Other" bucket.
+- sample_rows(): at most ``max_rows`` rows, deterministic per input.
+"""
+import altair as alt
+import numpy as np
+import pandas as pd
+
+from query_backend import histogram_values
+
+# Altair's default MaxRowsError threshold.
+MAX_CHART_ROWS = 5000
+
+
+def histogram(values, maxbins=30):
+    """
+    Bin numeric values into at most ``maxbins`` equal-width "nice" bins.
+
+    Mirrors what alt.Bin(maxbins=...) would compute in the browser, but
+    only the bin counts leave the server. NaN / inf values are dropped. For
+    a backend column use backend.histogram(), which bins where the data lives
+    (in SQL for DuckDB) instead of pulling the raw values first.
+
+    Args:
+        values (array-like): Numeric values to bin.
+        maxbins (int): Upper bound on the number of bins.
+
+    Returns:
+        pd.DataFrame: bin_start, bin_end, count (one row per bin).
+    """
+    return histogram_values(values, maxbins)
+
+
+def histogram_chart(hist, title, y_title="Frequency"):
+    """
+    Bar chart over a frame produced by histogram().
+
+    Args:
+        hist (pd.DataFrame): Output of histogram().
+        title (str): x-axis title.
+        y_title (str): y-axis title.
+    """
+    return alt.Chart(hist).mark_bar().encode(
+        x=alt.X('bin_start:Q', bin='binned', title=title),
+        x2='bin_end:Q',
+        y=alt.Y('count:Q', title=y_title),
+        tooltip=[alt.Tooltip('bin_start:Q', title='From'),
+                 alt.Tooltip('bin_end:Q', title='To'),
+                 alt.Tooltip('count:Q', title=y_title)]
+    )
+
+
+def box_summary(frame, by, value):
+    """
+    Per-group boxplot statistics (Tukey whiskers at 1.5 x IQR).
+
+    Args:
+        frame (pd.DataFrame): Rows holding the ``by`` and ``value`` columns.
+        by (str): Group column (one box per distinct value).
+        value (str): Numeric column summarised per group.
+
+    Returns:
+        pd.DataFrame: by, count, lower, q1, median, q3, upper per group, where
+        lower/upper are the most extreme values inside the whiskers.
+    """
+    rows = []
+    for key, values in frame.groupby(by, observed=True, sort=True)[value]:
+        values = values.dropna().to_numpy(dtype=float)
+        if not len(values):
+            continue
+        q1, median, q3 = np.percentile(values, [25, 50, 75])
+        reach = 1.5 * (q3 - q1)
+        inside = values[(values >= q1 - reach) & (values <= q3 + reach)]
+        rows.append({by: key, 'count': len(values), 'lower': inside.min(), 'q1': q1,
+                     'median': median, 'q3': q3, 'upper': inside.max()})
+    return pd.DataFrame(rows, columns=[by, 'count', 'lower', 'q1', 'median', 'q3', 'upper'])
+
+
+def boxplot_chart(summary, by, x_title, y_title):
+    """
+    Boxplot drawn from box_summary() output (whisker rule, IQR bar, median tick).
+    """
+    base = alt.Chart(summary).encode(x=alt.X(f'{by}:N', title=x_title))
+    tooltip = [by, 'count', 'lower', 'q1', 'median', 'q3', 'upper']
+    whiskers = base.mark_rule().encode(y=alt.Y('lower:Q', title=y_title), y2='upper:Q')
+    boxes = base.mark_bar(size=20).encode(y='q1:Q', y2='q3:Q', tooltip=tooltip)
+    medians = base.mark_tick(color='white', size=20).encode(y='median:Q')
+    return alt.layer(whiskers, boxes, medians)
+
+
+def top_n(frame, label, value, n=20, other="Other"):
+    """
+    Keep the ``n`` rows with the largest ``value`` and fold the rest into one row.
+
+    Args:
+        frame (pd.DataFrame): One row per category.
+        label (str): Category column; the folded row gets ``other`` here.
+        value (str): Additive column used for ranking and summed for the fold.
+        n (int): Number of categories kept as-is.
+        other (str or None): Label of the folded row; None drops the rest.
+
+    Returns:
+        pd.DataFrame: At most n + 1 rows with the ``label`` and ``value`` columns.
+    """
+    ranked = frame[[label, value]].sort_values(value, ascending=False, kind='stable')
+    head, rest = ranked.iloc[:n], ranked.iloc[n:]
+    if other is None or rest.empty:
+        return head.reset_index(drop=True)
+    folded = pd.DataFrame({label: [other], value: [rest[value].sum()]})
+    return pd.concat([head, folded], ignore_index=True)
+
+
+def sample_rows(frame, max_rows=MAX_CHART_ROWS, keep_largest=None, seed=0):
+    """
+    Cap a scatter-plot frame at ``max_rows`` rows.
+
+    Frames at or under the cap are returned unchanged. Otherwise the rows with
+    the largest ``keep_largest`` values (the points an analyst is looking for)
+    are always kept and the remainder is filled with a seeded uniform sample,
+    so reruns draw the same points.
+
+    Args:
+        frame (pd.DataFrame): Chart source, e.g. one row per customer.
+        max_rows (int): Maximum number of rows returned.
+        keep_largest (str, optional): Column whose top rows are never dropped.
+        seed (int): Seed for the sample.
+
+    Returns:
+        pd.DataFrame: At most ``max_rows`` rows of ``frame``.
+    """
+    if len(frame) <= max_rows:
+        return frame
+    keep = np.empty(0, dtype=np.int64)
+    if keep_largest is not None:
+        n_keep = max_rows // 10
+        order = np.argsort(-frame[keep_largest].to_numpy(dtype=float, na_value=-np.inf), kind='stable')
+        keep = order[:n_keep]
+    rest = np.setdiff1d(np.arange(len(frame)), keep, assume_unique=True)
+    rng = np.random.default_rng(seed)
+    sampled = rng.choice(rest, size=max_rows - len(keep), replace=False)
+    return frame.iloc[np.sort(np.concatenate([keep, sampled]))]
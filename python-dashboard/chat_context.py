@@ -0,0 +1,200 @@
+# chat_context.py
+"""
+Compact LLM context for TransBot.
+
+The pandas agent used to put the uploaded frame's head into its prompt and
+answer everything by writing pandas code against the full frame, and every
+turn re-sent the whole chat history. Prompt size and code-execution time
+both grew with the data and the conversation.
+
+DataFrameContext is built once per uploaded DataFrame (see
+main_chatbot.get_agent). It precomputes a schema summary: row count, and
+per column its dtype, null count, distinct count, numeric quantiles or top
+values. That summary becomes the agent's prompt prefix. It also exposes
+query tools that answer common questions (group-by aggregates, distinct
+values, column statistics) through the dashboard's PandasBackend and its
+FilterIndex. The LLM can use them instead of scanning the frame with
+generated code.
+
+trim_history() keeps the chat history within a token budget: the most
+recent messages verbatim, older user questions folded into one short note.
+Token counts are estimates (about 4 characters per token); the server's own
+prompt_eval_count is reported next to them when available.
+"""
+import json
+
+import numpy as np
+import pandas as pd
+
+from filter_index import FilterIndex
+from query_backend import SUPPORTED_FUNCS, PandasBackend
+
+CHARS_PER_TOKEN = 4
+TOP_VALUES = 5
+MAX_SUMMARY_COLUMNS = 200
+TOOL_RESULT_ROWS = 50
+QUANTILES = (0.25, 0.5, 0.75)
+
+
+def estimate_tokens(text):
+    """Rough token count of ``text`` (no tokenizer needed)."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _format_number(value):
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return "nan"
+    if float(value).is_integer() and abs(value) < 1e15:
+        return f"{int(value):,}"
+    return f"{value:,.4g}"
+
+
+def summarize_column(series, top_values=TOP_VALUES):
+    """
+    One line describing a column: dtype, nulls, distinct count and either
+    min / quartiles / max / mean (numeric) or its most frequent values
+    (one example for identifier-like columns, where every value is unique).
+    """
+    nulls = int(series.isna().sum())
+    distinct = int(series.nunique(dropna=True))
+    line = f"{series.name}: {series.dtype}, {nulls:,} nulls, {distinct:,} distinct"
+    if pd.api.types.is_bool_dtype(series.dtype):
+        counts = series.value_counts()
+        return line + "; " + ", ".join(f"{value}: {count:,}" for value, count in counts.items())
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        values = series.dropna()
+        if len(values):
+            quartiles = values.quantile(list(QUANTILES)).tolist()
+            line += (f"; min {_format_number(values.min())}, p25 {_format_number(quartiles[0])}, "
+                     f"median {_format_number(quartiles[1])}, p75 {_format_number(quartiles[2])}, "
+                     f"max {_format_number(values.max())}, mean {_format_number(values.mean())}")
+        return line
+    if distinct > top_values and distinct == len(series) - nulls:
+        return line + f"; unique per row, e.g. {str(series.dropna().iloc[0])[:40]}"
+    counts = series.value_counts(dropna=True).head(top_values)
+    if len(counts):
+        shown = ", ".join(f"{str(value)[:40]} ({count:,})" for value, count in counts.items())
+        line += f"; top: {shown}"
+    return line
+
+
+class DataFrameContext:
+    """
+    Precomputed summary and query tools for one DataFrame.
+
+    Attributes:
+        n_rows (int): Rows in the frame.
+        columns (dict): column -> summary line.
+        summary (str): The text given to the LLM.
+        backend (PandasBackend): Aggregation backend over the frame.
+    """
+
+    def __init__(self, df, max_columns=MAX_SUMMARY_COLUMNS, top_values=TOP_VALUES):
+        self.n_rows = len(df)
+        self.columns = {str(column): summarize_column(df[column], top_values) for column in df.columns}
+        self.backend = PandasBackend(df, FilterIndex(df))
+        lines = [f"The dataframe `df` has {self.n_rows:,} rows and {len(df.columns):,} columns."]
+        described = list(self.columns.values())
+        lines += [f"- {line}" for line in described[:max_columns]]
+        if len(described) > max_columns:
+            lines.append("- other columns: " + ", ".join(list(self.columns)[max_columns:]))
+        self.summary = "\n".join(lines)
+
+    def prefix(self):
+        """
+        Agent prompt prefix: the summary plus how to use the tools. Braces are
+        escaped because the agent formats the prefix as a prompt template.
+        """
+        text = (
+            "You are working with a pandas dataframe in Python. The name of the dataframe is `df`.\n"
+            "Here is a summary of it (you do not need to recompute these statistics):\n"
+            f"{self.summary}\n"
+            "Prefer the aggregate_table, column_values and column_summary tools, which are fast; "
+            "only write pandas code when they cannot answer the question.\n"
+            "You should use the tools below to answer the question posed of you:"
+        )
+        return text.replace("{", "{{").replace("}", "}}")
+
+    def aggregate_table(self, request):
+        """
+        Tool: group-by aggregate from a JSON request, e.g.
+        {"by": ["trans_province"], "metrics": {"total": ["amount_cad", "sum"]},
+        "where": {"source": "abm"}, "order_by": "total", "limit": 10}.
+        """
+        try:
+            spec = json.loads(request.strip().strip("`"))
+            metrics = {name: tuple(metric) for name, metric in spec["metrics"].items()}
+            result = self.backend.aggregate(spec.get("by", []), metrics, where=spec.get("where"),
+                                            order_by=spec.get("order_by"),
+                                            descending=spec.get("descending", True),
+                                            limit=min(int(spec.get("limit", TOOL_RESULT_ROWS)), TOOL_RESULT_ROWS))
+        except (ValueError, KeyError, TypeError) as e:
+            return f"Invalid request ({e}). Expected JSON with 'by', 'metrics' {{name: [column, func]}}, " \
+                   f"optional 'where', 'order_by', 'limit'; func one of {', '.join(SUPPORTED_FUNCS)}."
+        return result.to_string(index=False, max_rows=TOOL_RESULT_ROWS)
+
+    def column_values(self, column):
+        """Tool: distinct values of a column (at most TOOL_RESULT_ROWS)."""
+        column = column.strip().strip("'\"")
+        if not self.backend.has_column(column):
+            return f"Unknown column '{column}'."
+        values = self.backend.distinct(column)
+        shown = ", ".join(str(value) for value in values[:TOOL_RESULT_ROWS])
+        more = f" ... ({len(values):,} in total)" if len(values) > TOOL_RESULT_ROWS else ""
+        return shown + more
+
+    def column_summary(self, column):
+        """Tool: the precomputed summary line of a column."""
+        column = column.strip().strip("'\"")
+        return self.columns.get(column, f"Unknown column '{column}'.")
+
+    def tools(self):
+        """The query tools as LangChain Tool objects."""
+        from langchain_core.tools import Tool
+
+        return [
+            Tool(name="aggregate_table", func=self.aggregate_table,
+                 # No braces here: the agent formats tool descriptions as a prompt template.
+                 description="Fast group-by aggregation over df. Input: JSON with 'by' (list of columns), "
+                             "'metrics' (object of name -> [column, func], func one of "
+                             + ", ".join(SUPPORTED_FUNCS) + "), optional 'where' (object of column -> value "
+                             "or list), 'order_by' and 'limit'."),
+            Tool(name="column_values", func=self.column_values,
+                 description="Distinct values of one column of df. Input: the column name."),
+            Tool(name="column_summary", func=self.column_summary,
+                 description="dtype, nulls, distinct count and quantiles / top values of one column. "
+                             "Input: the column name."),
+        ]
+
+
+def trim_history(history, budget_tokens):
+    """
+    Fit the chat history into ``budget_tokens``.
+
+    The newest messages are kept verbatim while they fit (the latest one is
+    always kept, cut to the budget if needed). Older user questions are
+    folded into one leading system note in whatever room is left, and older
+    answers are dropped.
+
+    Returns:
+        list: Messages to send, in order.
+    """
+    kept, used = [], 0
+    for position in range(len(history) - 1, -1, -1):
+        message = history[position]
+        cost = estimate_tokens(message["content"])
+        if kept and used + cost > budget_tokens:
+            break
+        if not kept and cost > budget_tokens:
+            message = dict(message, content=message["content"][:budget_tokens * CHARS_PER_TOKEN])
+            cost = budget_tokens
+        kept.append(message)
+        used += cost
+    kept.reverse()
+    older = history[:len(history) - len(kept)]
+    questions = [message["content"] for message in older if message["role"] == "user"]
+    room = (budget_tokens - used) * CHARS_PER_TOKEN
+    if questions and room >= 64:
+        note = "Earlier in this conversation the user asked: " + " | ".join(questions)
+        kept.insert(0, {"role": "system", "content": note[:room]})
+    return kept
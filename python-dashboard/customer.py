@@ -1,73 +1,120 @@
 # customer.py
+import time
+
 import streamlit as st
 import pandas as pd
 import altair as alt
 import plotly.express as px
+from chart_data import box_summary, boxplot_chart, histogram_chart, sample_rows
+from data_layer import cached_aggregate, cached_histogram, cached_select
+
+# Per-customer risk aggregates shared by several charts.
+CUSTOMER_RISK_METRICS = {
+    'total_transactions': ('transaction_id', 'count'),
+    'outlier_count': ('high_txn_outlier', 'sum'),
+    'cash_tnx': ('large_cash_txn', 'sum'),
+    'avg_spending': ('amount_cad', 'mean'),
+    'midnight_txns': ('midnight_txn_count', 'sum'),
+}
 
-def display_customer_analysis(df):
+
+def display_customer_analysis(backend):
     """
     Main function to display the customer risk analysis dashboard.
+
+    The page is split into sections that are only computed when switched on,
+    so an analyst who only needs the overview does not pay for the heavier
+    repeat-amount / merchant / by-hour panels. Aggregates are memoized per
+    filter state (see data_layer.cached_aggregate) and each section's render
+    time is listed in a debug footer.
+
+    Args:
+        backend (QueryBackend): Shared query backend (see data_layer.get_backend).
     """
     st.header("💰 Customer Risk Analysis")
-    df = calculate_features(df)
-    
-    # Top-level metrics and core visualizations
-    display_top_metrics(df)
-    display_transaction_patterns(df)
-    display_risky_customers_table(df)
-    display_customer_anomaly_heatmap(df)
-    
-    # Additional Visualizations (existing)
-    display_high_odd_hour_customers(df)
-    display_customer_clusters_spending_txn(df)
-    # display_high_spending_low_legitimacy(df)
-    display_txn_amount_distribution(df)
-    display_customer_clusters_spending_behavior(df)
-    display_high_risk_frequent_txn(df)
-    display_customers_same_amount(df)
-    display_common_txn_amount_high_risk(df)
-    display_customers_same_merchant(df)
-    
-    # --------------------------------------------
-    # Additional Analysis (new functions)
-    st.markdown("## Additional Analysis")
+
+    timings = []
+    for index, (title, render) in enumerate(CUSTOMER_SECTIONS):
+        if not st.toggle(title, value=index == 0, key=f"customer_section_{index}"):
+            continue
+        start = time.perf_counter()
+        with st.container(border=True):
+            render(backend)
+        timings.append({"Section": title, "Render time (ms)": (time.perf_counter() - start) * 1000})
+
+    display_section_timings(timings)
+
+
+def display_overview_section(backend):
+    """Top-level metrics and core visualizations."""
+    display_top_metrics(backend)
+    display_transaction_patterns(backend)
+    display_risky_customers_table(backend)
+    display_customer_anomaly_heatmap(backend)
+
+
+def display_spending_section(backend):
+    """Odd-hour activity, spending clusters and amount distributions."""
+    display_high_odd_hour_customers(backend)
+    display_customer_clusters_spending_txn(backend)
+    # display_high_spending_low_legitimacy(backend)
+    display_txn_amount_distribution(backend)
+    display_customer_clusters_spending_behavior(backend)
+    display_high_risk_frequent_txn(backend)
+
+
+def display_repetition_section(backend):
+    """Customers repeating the same amounts or merchants."""
+    display_customers_same_amount(backend)
+    display_common_txn_amount_high_risk(backend)
+    display_customers_same_merchant(backend)
+
+
+def display_additional_section(backend):
+    """Additional per-customer rankings and the outlier-by-hour breakdown."""
     colA, colB = st.columns(2)
     with colA:
-        display_customers_most_outliers(df)
+        display_customers_most_outliers(backend)
     with colB:
-        display_customers_most_large_cash(df)
+        display_customers_most_large_cash(backend)
         
     colC, colD = st.columns(2)
     with colC:
-        display_high_frequency_txn_customers(df)
+        display_high_frequency_txn_customers(backend)
     with colD:
-        display_flagged_customers_by_industry(df)
+        display_flagged_customers_by_industry(backend)
     
     # Full-width visualizations for more complex charts
-    display_customers_outlier_txn_by_hour(df)
-    display_recurring_txn_diff_distribution(df)
+    display_customers_outlier_txn_by_hour(backend)
+    display_recurring_txn_diff_distribution(backend)
+
 
+# (title, renderer) in page order; only the first section is open by default.
+CUSTOMER_SECTIONS = [
+    ("📊 Overview", display_overview_section),
+    ("💳 Spending & Activity", display_spending_section),
+    ("🔁 Repeated Amounts & Merchants", display_repetition_section),
+    ("🔎 Additional Analysis", display_additional_section),
+]
 
-def calculate_features(df):
+
+def display_section_timings(timings):
     """
-    Function to calculate new features for the analysis.
+    Debug footer listing how long each open section took to render.
     """
-    if 'txn_hour' in df.columns:
-        df['midnight_txn_count'] = df['txn_hour'].between(0, 5).astype(int)
-    return df
+    with st.expander("Debug: section render times"):
+        if not timings:
+            st.caption("No sections rendered.")
+            return
+        st.dataframe(pd.DataFrame(timings).round(1), hide_index=True)
+        st.caption(f"Total: {sum(t['Render time (ms)'] for t in timings):.1f} ms")
 
 
-def display_top_metrics(df):
+def display_top_metrics(backend):
     """
     Function to display top metrics as cards.
     """
-    customer_stats = df.groupby('customer_id').agg(
-        total_transactions=('transaction_id', 'count'),
-        outlier_count=('high_txn_outlier', 'sum'),
-        cash_tnx=('large_cash_txn', 'sum'),
-        avg_spending=('amount_cad', 'mean'),
-        midnight_txns=('midnight_txn_count', 'sum')
-    ).reset_index()
+    customer_stats = cached_aggregate(backend, ['customer_id'], CUSTOMER_RISK_METRICS)
 
     st.subheader("📊 Top Risk Metrics")
     
@@ -124,12 +171,13 @@ def display_top_metrics(df):
         )
 
 
-def display_transaction_patterns(df):
+def display_transaction_patterns(backend):
     """
     Function to display transaction patterns as a heatmap.
     """
     st.subheader("📅 Transaction Patterns")
-    heatmap_data = df.groupby(['txn_hour', 'trans_province']).size().reset_index(name='counts')
+    heatmap_data = cached_aggregate(backend, ['txn_hour', 'trans_province'],
+                                    {'counts': ('transaction_id', 'size')})
     heatmap = alt.Chart(heatmap_data).mark_rect().encode(
         x='txn_hour:O',
         y='trans_province:N',
@@ -140,23 +188,16 @@ def display_transaction_patterns(df):
     st.altair_chart(heatmap, use_container_width=True)
 
 
-def display_risky_customers_table(df):
+def display_risky_customers_table(backend):
     """
     Function to display a table of top risky customers.
     """
-    customer_stats = df.groupby('customer_id').agg(
-        total_transactions=('transaction_id', 'count'),
-        outlier_count=('high_txn_outlier', 'sum'),
-        cash_tnx=('large_cash_txn', 'sum'),
-        avg_spending=('amount_cad', 'mean'),
-        midnight_txns=('midnight_txn_count', 'sum')
-    ).reset_index()
+    top10 = cached_aggregate(backend, ['customer_id'], CUSTOMER_RISK_METRICS,
+                             order_by='outlier_count', limit=10)
 
     st.subheader("📋 Top 10 Risky Customers")
     st.dataframe(
-        customer_stats.sort_values('outlier_count', ascending=False)
-        .head(10)
-        [['customer_id', 'outlier_count', 'cash_tnx', 'avg_spending', 'midnight_txns']]
+        top10[['customer_id', 'outlier_count', 'cash_tnx', 'avg_spending', 'midnight_txns']]
         .style.background_gradient(cmap='Reds', subset=['outlier_count']),
         height=400
     )
@@ -208,7 +249,7 @@ def make_donut_chart(value, title, color_scheme):
     return alt.layer(donut, text)
 
 
-def display_customer_anomaly_heatmap(df):
+def display_customer_anomaly_heatmap(backend):
     """
     Function to display a customer-wise heatmap of anomaly factors.
     This heatmap shows, for the top 10 customers (by total anomalies), 
@@ -216,11 +257,11 @@ def display_customer_anomaly_heatmap(df):
     """
     st.markdown("### Customer-wise Heatmap of Anomaly Factors (Top 10 Customers)")
     
-    anomaly_df = df.groupby('customer_id').agg(
-        outlier_count=('high_txn_outlier', 'sum'),
-        cash_tnx=('large_cash_txn', 'sum'),
-        midnight_txns=('midnight_txn_count', 'sum')
-    ).reset_index()
+    anomaly_df = cached_aggregate(backend, ['customer_id'], {
+        'outlier_count': ('high_txn_outlier', 'sum'),
+        'cash_tnx': ('large_cash_txn', 'sum'),
+        'midnight_txns': ('midnight_txn_count', 'sum'),
+    })
     
     # Calculate total anomaly factors
     anomaly_df['total_anomalies'] = anomaly_df['outlier_count'] + anomaly_df['cash_tnx'] + anomaly_df['midnight_txns']
@@ -242,15 +283,13 @@ def display_customer_anomaly_heatmap(df):
     st.altair_chart(heatmap, use_container_width=True)
 
 
-def display_high_odd_hour_customers(df):
+def display_high_odd_hour_customers(backend):
     """
     Bar graph: Top 10 customers with the highest odd-hour transactions.
     """
     st.markdown("### Top 10 High Odd-Hour Transaction Customers")
-    odd_df = df.groupby('customer_id').agg(
-        total_odd_hour=('odd_hour_txn', 'sum')
-    ).reset_index()
-    top10 = odd_df.nlargest(10, 'total_odd_hour')
+    top10 = cached_aggregate(backend, ['customer_id'], {'total_odd_hour': ('odd_hour_txn', 'sum')},
+                             order_by='total_odd_hour', limit=10)
     chart = alt.Chart(top10).mark_bar().encode(
         x=alt.X('total_odd_hour:Q', title='Odd-Hour Transactions'),
         y=alt.Y('customer_id:N', title='Customer', sort='-x'),
@@ -259,15 +298,16 @@ def display_high_odd_hour_customers(df):
     st.altair_chart(chart, use_container_width=True)
 
 
-def display_customer_clusters_spending_txn(df):
+def display_customer_clusters_spending_txn(backend):
     """
     Scatter plot: Customer clusters based on total spending and transaction count.
     """
     st.markdown("### Customer Clusters Based on Spending & Transaction Count")
-    clusters = df.groupby('customer_id').agg(
-        total_spent=('amount_cad', 'sum'),
-        txn_count=('transaction_id', 'count')
-    ).reset_index()
+    clusters = cached_aggregate(backend, ['customer_id'], {
+        'total_spent': ('amount_cad', 'sum'),
+        'txn_count': ('transaction_id', 'count'),
+    })
+    clusters = sample_rows(clusters, keep_largest='total_spent')
     chart = alt.Chart(clusters).mark_circle(size=100).encode(
         x=alt.X('txn_count:Q', title='Transaction Count'),
         y=alt.Y('total_spent:Q', title='Total Spent (CAD)'),
@@ -276,19 +316,20 @@ def display_customer_clusters_spending_txn(df):
     st.altair_chart(chart, use_container_width=True)
 
 
-def display_high_spending_low_legitimacy(df):
+def display_high_spending_low_legitimacy(backend):
     """
     Scatter plot: High-spending customers with low business legitimacy.
     Here, we use employee_count as a proxy for business legitimacy.
     """
     st.markdown("### High-Spending Customers with Low Business Legitimacy")
-    clusters = df.groupby('customer_id').agg(
-        total_spent=('amount_cad', 'sum'),
-        employee_count=('employee_count', 'first')
-    ).reset_index()
+    clusters = cached_aggregate(backend, ['customer_id'], {
+        'total_spent': ('amount_cad', 'sum'),
+        'employee_count': ('employee_count', 'first'),
+    })
     median_spent = clusters['total_spent'].median()
     median_emp = clusters['employee_count'].median()
     filtered = clusters[(clusters['total_spent'] > median_spent) & (clusters['employee_count'] < median_emp)]
+    filtered = sample_rows(filtered, keep_largest='total_spent')
     chart = alt.Chart(filtered).mark_circle(size=100, color='red').encode(
         x=alt.X('employee_count:Q', title='Employee Count'),
         y=alt.Y('total_spent:Q', title='Total Spent (CAD)'),
@@ -297,34 +338,32 @@ def display_high_spending_low_legitimacy(df):
     st.altair_chart(chart, use_container_width=True)
 
 
-def display_txn_amount_distribution(df):
+def display_txn_amount_distribution(backend):
     """
     Boxplot: Transaction amount distribution for top 10 customers by transaction count.
     """
     st.markdown("### Transaction Amount Distribution per Customer")
-    txn_counts = df.groupby('customer_id').agg(
-        txn_count=('transaction_id', 'count')
-    ).reset_index()
-    top10_customers = txn_counts.nlargest(10, 'txn_count')['customer_id']
-    filtered = df[df['customer_id'].isin(top10_customers)]
-    chart = alt.Chart(filtered).mark_boxplot().encode(
-        x=alt.X('customer_id:N', title='Customer'),
-        y=alt.Y('amount_cad:Q', title='Transaction Amount (CAD)'),
-        tooltip=['customer_id', 'amount_cad']
-    ).properties(width=600, height=400)
+    top10_customers = cached_aggregate(backend, ['customer_id'], {'txn_count': ('transaction_id', 'count')},
+                                       order_by='txn_count', limit=10)['customer_id']
+    filtered = cached_select(backend, ['customer_id', 'amount_cad'],
+                             where={'customer_id': top10_customers.tolist()})
+    summary = box_summary(filtered, 'customer_id', 'amount_cad')
+    chart = boxplot_chart(summary, 'customer_id', 'Customer',
+                          'Transaction Amount (CAD)').properties(width=600, height=400)
     st.altair_chart(chart, use_container_width=True)
 
 
-def display_customer_clusters_spending_behavior(df):
+def display_customer_clusters_spending_behavior(backend):
     """
     Scatter plot: Customer clusters based on spending behavior.
     Using average spending and standard deviation of monthly transaction amounts.
     """
     st.markdown("### Customer Clusters Based on Spending Behavior")
-    clusters = df.groupby('customer_id').agg(
-        avg_spent=('avg_spent', 'mean'),
-        std_txn_amount_per_month=('std_txn_amount_per_month', 'mean')
-    ).reset_index()
+    clusters = cached_aggregate(backend, ['customer_id'], {
+        'avg_spent': ('avg_spent', 'mean'),
+        'std_txn_amount_per_month': ('std_txn_amount_per_month', 'mean'),
+    })
+    clusters = sample_rows(clusters, keep_largest='std_txn_amount_per_month')
     chart = alt.Chart(clusters).mark_circle(size=100).encode(
         x=alt.X('avg_spent:Q', title='Average Spending (CAD)'),
         y=alt.Y('std_txn_amount_per_month:Q', title='STD of Transaction Amount per Month'),
@@ -333,16 +372,15 @@ def display_customer_clusters_spending_behavior(df):
     st.altair_chart(chart, use_container_width=True)
 
 
-def display_high_risk_frequent_txn(df):
+def display_high_risk_frequent_txn(backend):
     """
     Bar chart: High-risk customers (by outlier count) with their total transaction counts.
     """
     st.markdown("### High-Risk Customers with Frequent Transactions")
-    customer_stats = df.groupby('customer_id').agg(
-        total_transactions=('transaction_id', 'count'),
-        outlier_count=('high_txn_outlier', 'sum')
-    ).reset_index()
-    top10 = customer_stats.nlargest(10, 'outlier_count')
+    top10 = cached_aggregate(backend, ['customer_id'], {
+        'total_transactions': ('transaction_id', 'count'),
+        'outlier_count': ('high_txn_outlier', 'sum'),
+    }, order_by='outlier_count', limit=10)
     chart = alt.Chart(top10).mark_bar().encode(
         x=alt.X('outlier_count:Q', title='High Txn Outliers'),
         y=alt.Y('customer_id:N', title='Customer', sort='-x'),
@@ -351,16 +389,16 @@ def display_high_risk_frequent_txn(df):
     st.altair_chart(chart, use_container_width=True)
 
 
-def display_customers_same_amount(df):
+def display_customers_same_amount(backend):
     """
     Bar chart: Customers frequently transacting the same amount.
     Calculated as the highest frequency of any amount divided by total transactions.
     """
     st.markdown("### Customers Frequently Transacting the Same Amount")
-    freq = df.groupby(['customer_id', 'amount_cad']).size().reset_index(name='count')
-    max_freq = freq.groupby('customer_id')['count'].max().reset_index(name='max_count')
-    txn_count = df.groupby('customer_id').agg(total_txn=('transaction_id', 'count')).reset_index()
-    merged = pd.merge(max_freq, txn_count, on='customer_id')
+    merged = cached_aggregate(backend, ['customer_id'], {
+        'max_count': ('amount_cad', 'mode_count'),
+        'total_txn': ('transaction_id', 'count'),
+    })
     merged['repeat_pct'] = merged['max_count'] / merged['total_txn'] * 100
     top10 = merged.nlargest(10, 'repeat_pct')
     chart = alt.Chart(top10).mark_bar().encode(
@@ -371,18 +409,17 @@ def display_customers_same_amount(df):
     st.altair_chart(chart, use_container_width=True)
 
 
-def display_common_txn_amount_high_risk(df):
+def display_common_txn_amount_high_risk(backend):
     """
     Bar chart: Most common transaction amounts among high-risk customers.
     Filters transactions where high_txn_outlier is flagged.
     """
     st.markdown("### Most Common Transaction Amounts Among High-Risk Customers")
-    high_risk_df = df[df['high_txn_outlier'] == 1]
-    if high_risk_df.empty:
+    top10 = cached_aggregate(backend, ['amount_cad'], {'count': ('transaction_id', 'size')},
+                             where={'high_txn_outlier': 1}, order_by='count', limit=10)
+    if top10.empty:
         st.write("No high-risk transactions available.")
         return
-    common_amounts = high_risk_df.groupby('amount_cad').size().reset_index(name='count')
-    top10 = common_amounts.nlargest(10, 'count')
     chart = alt.Chart(top10).mark_bar().encode(
         x=alt.X('amount_cad:Q', title='Transaction Amount (CAD)'),
         y=alt.Y('count:Q', title='Frequency'),
@@ -391,16 +428,16 @@ def display_common_txn_amount_high_risk(df):
     st.altair_chart(chart, use_container_width=True)
 
 
-def display_customers_same_merchant(df):
+def display_customers_same_merchant(backend):
     """
     Bar chart: Customers repeatedly transacting with the same merchants.
     Calculated as the highest frequency of a merchant per customer divided by total transactions.
     """
     st.markdown("### Customers Repeatedly Transacting with the Same Merchants")
-    freq = df.groupby(['customer_id', 'merchant_category']).size().reset_index(name='count')
-    max_freq = freq.groupby('customer_id')['count'].max().reset_index(name='max_count')
-    txn_count = df.groupby('customer_id').agg(total_txn=('transaction_id', 'count')).reset_index()
-    merged = pd.merge(max_freq, txn_count, on='customer_id')
+    merged = cached_aggregate(backend, ['customer_id'], {
+        'max_count': ('merchant_category', 'mode_count'),
+        'total_txn': ('transaction_id', 'count'),
+    })
     merged['repeat_pct'] = merged['max_count'] / merged['total_txn'] * 100
     top10 = merged.nlargest(10, 'repeat_pct')
     chart = alt.Chart(top10).mark_bar().encode(
@@ -414,13 +451,13 @@ def display_customers_same_merchant(df):
 # -------------------------
 # New Functions for Additional Analysis
 
-def display_customers_most_outliers(df):
+def display_customers_most_outliers(backend):
     """
     Horizontal bar chart: Top 10 customers with the most outlier transactions.
     """
     st.markdown("### Customers with Most Outlier Transactions")
-    cust_outliers = df.groupby('customer_id')['high_txn_outlier'].sum().reset_index()
-    top10 = cust_outliers.nlargest(10, 'high_txn_outlier')
+    top10 = cached_aggregate(backend, ['customer_id'], {'high_txn_outlier': ('high_txn_outlier', 'sum')},
+                             order_by='high_txn_outlier', limit=10)
     chart = alt.Chart(top10).mark_bar().encode(
         y=alt.Y('customer_id:N', title='Customer', sort='-x'),
         x=alt.X('high_txn_outlier:Q', title='Outlier Transactions'),
@@ -429,13 +466,13 @@ def display_customers_most_outliers(df):
     st.altair_chart(chart, use_container_width=True)
 
 
-def display_customers_most_large_cash(df):
+def display_customers_most_large_cash(backend):
     """
     Horizontal bar chart: Top 10 customers with the most large cash transactions.
     """
     st.markdown("### Customers with Most Large Cash Transactions")
-    cust_cash = df.groupby('customer_id')['large_cash_txn'].sum().reset_index()
-    top10 = cust_cash.nlargest(10, 'large_cash_txn')
+    top10 = cached_aggregate(backend, ['customer_id'], {'large_cash_txn': ('large_cash_txn', 'sum')},
+                             order_by='large_cash_txn', limit=10)
     chart = alt.Chart(top10).mark_bar().encode(
         y=alt.Y('customer_id:N', title='Customer', sort='-x'),
         x=alt.X('large_cash_txn:Q', title='Large Cash Transactions'),
@@ -444,13 +481,13 @@ def display_customers_most_large_cash(df):
     st.altair_chart(chart, use_container_width=True)
 
 
-def display_high_frequency_txn_customers(df):
+def display_high_frequency_txn_customers(backend):
     """
     Horizontal bar chart: Top 10 customers by transaction count.
     """
     st.markdown("### High Frequency Transaction Customers")
-    freq = df.groupby('customer_id')['transaction_id'].count().reset_index().rename(columns={'transaction_id': 'txn_count'})
-    top10 = freq.nlargest(10, 'txn_count')
+    top10 = cached_aggregate(backend, ['customer_id'], {'txn_count': ('transaction_id', 'count')},
+                             order_by='txn_count', limit=10)
     chart = alt.Chart(top10).mark_bar().encode(
         y=alt.Y('customer_id:N', title='Customer', sort='-x'),
         x=alt.X('txn_count:Q', title='Transaction Count'),
@@ -459,15 +496,17 @@ def display_high_frequency_txn_customers(df):
     st.altair_chart(chart, use_container_width=True)
 
 
-def display_customers_outlier_txn_by_hour(df):
+def display_customers_outlier_txn_by_hour(backend):
     """
     Grouped bar chart: For the top 10 customers (by outlier count), show outlier transactions by hour.
     """
     st.markdown("### Top 10 Customers' Outlier Transactions by Hour")
-    cust_outliers = df.groupby('customer_id')['high_txn_outlier'].sum().reset_index()
-    top10_customers = cust_outliers.nlargest(10, 'high_txn_outlier')['customer_id']
-    data = df[df['customer_id'].isin(top10_customers)]
-    grouped = data.groupby(['customer_id', 'txn_hour'])['high_txn_outlier'].sum().reset_index()
+    top10_customers = cached_aggregate(backend, ['customer_id'],
+                                       {'high_txn_outlier': ('high_txn_outlier', 'sum')},
+                                       order_by='high_txn_outlier', limit=10)['customer_id']
+    grouped = cached_aggregate(backend, ['customer_id', 'txn_hour'],
+                               {'high_txn_outlier': ('high_txn_outlier', 'sum')},
+                               where={'customer_id': top10_customers.tolist()})
     chart = alt.Chart(grouped).mark_bar().encode(
         x=alt.X('txn_hour:O', title='Transaction Hour'),
         y=alt.Y('high_txn_outlier:Q', title='Outlier Transactions'),
@@ -477,17 +516,17 @@ def display_customers_outlier_txn_by_hour(df):
     st.altair_chart(chart, use_container_width=True)
 
 
-def display_flagged_customers_by_industry(df):
+def display_flagged_customers_by_industry(backend):
     """
     Horizontal bar chart: Group flagged high-risk customers by industry.
     """
     st.markdown("### Flagged High-Risk Customers by Industry")
-    flagged = df.groupby('customer_id').agg(
-         outlier_count=('high_txn_outlier', 'sum'),
-         cash_tnx=('large_cash_txn', 'sum'),
-         midnight_txns=('midnight_txn_count', 'sum'),
-         industry=('industry', 'first')
-    ).reset_index()
+    flagged = cached_aggregate(backend, ['customer_id'], {
+         'outlier_count': ('high_txn_outlier', 'sum'),
+         'cash_tnx': ('large_cash_txn', 'sum'),
+         'midnight_txns': ('midnight_txn_count', 'sum'),
+         'industry': ('industry', 'first'),
+    })
     flagged = flagged[(flagged['outlier_count'] > 5) | (flagged['cash_tnx'] > 3) | (flagged['midnight_txns'] > 10)]
     industry_group = flagged.groupby('industry').size().reset_index(name='flagged_count')
     chart = alt.Chart(industry_group).mark_bar().encode(
@@ -498,24 +537,20 @@ def display_flagged_customers_by_industry(df):
     st.altair_chart(chart, use_container_width=True)
 
 
-def display_recurring_txn_diff_distribution(df):
+def display_recurring_txn_diff_distribution(backend):
     """
     Histogram: Distribution of recurring transaction differences among high-risk customers.
     Uses the 'txn_gap' column if available, otherwise 'avg_gap_between_txns_month'.
     """
     st.markdown("### Distribution of Recurring Transaction Differences Among High-Risk Customers")
     column = None
-    if 'txn_gap' in df.columns:
+    if backend.has_column('txn_gap'):
         column = 'txn_gap'
-    elif 'avg_gap_between_txns_month' in df.columns:
+    elif backend.has_column('avg_gap_between_txns_month'):
         column = 'avg_gap_between_txns_month'
     if column:
-        high_risk = df[df['high_txn_outlier'] == 1]
-        chart = alt.Chart(high_risk).mark_bar().encode(
-            x=alt.X(f'{column}:Q', bin=alt.Bin(maxbins=30), title=column),
-            y=alt.Y('count()', title='Frequency'),
-            tooltip=[f'{column}', 'count()']
-        ).properties(width=600, height=300)
+        gaps = cached_histogram(backend, column, maxbins=30, where={'high_txn_outlier': 1})
+        chart = histogram_chart(gaps, column).properties(width=600, height=300)
         st.altair_chart(chart, use_container_width=True)
     else:
         st.write("No recurring transaction difference data available.")
@@ -0,0 +1,161 @@
+# data_layer.py
+import json
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+from filter_index import FilterIndex
+from query_backend import DuckDBBackend, PandasBackend
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Scripts"))
+from CategoryDictionary import normalize_labels  # noqa: E402
+
+MONTH_ORDER = ["January", "February", "March", "April", "May", "June",
+               "July", "August", "September", "October", "November", "December"]
+WEEKDAY_ORDER = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+
+def add_derived_features(df):
+    """
+    Derive the calendar and time-of-day columns used by the pages.
+
+    month and weekday are ordered categoricals, day_of_month is a small
+    nullable integer and is_weekend / midnight_txn_count are compact flags.
+    Returns a new DataFrame; the input is left untouched.
+    """
+    dates = pd.to_datetime(df['transaction_date'], errors='coerce')
+    valid = dates.notna().to_numpy()
+    month_codes = np.where(valid, dates.dt.month.fillna(0).to_numpy(dtype=np.int64) - 1, -1)
+    weekday_codes = np.where(valid, dates.dt.weekday.fillna(0).to_numpy(dtype=np.int64), -1)
+
+    derived = {
+        'transaction_date': dates,
+        'month': pd.Categorical.from_codes(month_codes, categories=MONTH_ORDER, ordered=True),
+        'day_of_month': dates.dt.day.astype('Int8'),
+        'weekday': pd.Categorical.from_codes(weekday_codes, categories=WEEKDAY_ORDER, ordered=True),
+        'is_weekend': weekday_codes >= 5,
+    }
+    if 'txn_hour' in df.columns:
+        derived['midnight_txn_count'] = df['txn_hour'].between(0, 5).astype(np.int8)
+    return df.assign(**derived)
+
+
+def apply_category_dictionary(df, path):
+    """
+    Turn the location / industry / merchant columns into categoricals whose
+    codes are the pipeline's shared dictionary codes.
+
+    The dictionary (Scripts/CategoryDictionary.py) lists each field's values
+    in code order and maps column names to fields. Cells are normalized the
+    way the dictionary normalized them (normalize_labels: stripped text,
+    "nan" / empty as missing, 5411.0 as "5411"), whatever the column's dtype.
+    Values missing from it are appended after its codes rather than dropped.
+    Returns a new DataFrame.
+    """
+    with open(path, encoding="utf-8") as handle:
+        dictionary = json.load(handle)
+    encoded = {}
+    for column, field in dictionary["columns"].items():
+        if column not in df.columns:
+            continue
+        # Normalize each distinct value once, then expand back to the rows.
+        codes, uniques = pd.factorize(df[column], use_na_sentinel=True)
+        labels = normalize_labels(list(uniques))
+        values = np.array(labels + [None], dtype=object)[codes]
+        categories = list(dictionary["fields"][field])
+        unseen = {label for label in labels if label is not None}.difference(categories)
+        encoded[column] = pd.Categorical(values, categories=categories + sorted(unseen))
+    return df.assign(**encoded)
+
+
+@st.cache_resource(show_spinner="Loading transaction features...")
+def load_features(path):
+    """
+    Load the feature CSV once per server process and derive page columns.
+
+    When a category_dictionary.json sits next to the CSV (or TRANSACT_DICTIONARY
+    points to one), its columns are loaded as dictionary categoricals.
+
+    The returned DataFrame is shared by every session and rerun, so pages
+    must treat it as read-only: filter through get_filter_index() and build
+    new frames rather than assigning columns on it.
+    """
+    df = pd.read_csv(path)
+    dictionary = os.environ.get("TRANSACT_DICTIONARY",
+                                os.path.join(os.path.dirname(path), "category_dictionary.json"))
+    if os.path.exists(dictionary):
+        df = apply_category_dictionary(df, dictionary)
+    return add_derived_features(df)
+
+
+@st.cache_resource(hash_funcs={pd.DataFrame: id})
+def get_filter_index(df):
+    """
+    Build (once per DataFrame) the shared FilterIndex over the filter columns.
+
+    The DataFrame is keyed by identity, which is stable because
+    load_features() hands out the same object to every rerun.
+    """
+    return FilterIndex(df)
+
+
+@st.cache_resource(show_spinner="Connecting to the query backend...")
+def get_backend(kind, path):
+    """
+    Create the shared query backend the pages request aggregates from.
+
+    Args:
+        kind (str): 'pandas' (in-memory features frame) or 'duckdb'.
+        path (str): imi_features.csv for pandas, the DuckDB file for duckdb.
+
+    Returns:
+        QueryBackend: PandasBackend or DuckDBBackend.
+    """
+    if kind == "duckdb":
+        return DuckDBBackend(path)
+    if kind != "pandas":
+        raise ValueError(f"Unknown backend '{kind}' (expected 'pandas' or 'duckdb')")
+    df = load_features(path)
+    return PandasBackend(df, get_filter_index(df))
+
+
+def backend_from_env():
+    """
+    Pick the backend from TRANSACT_BACKEND ('pandas' by default) and its data
+    file from TRANSACT_DATA (imi_features.csv / imi_features.duckdb).
+    """
+    kind = os.environ.get("TRANSACT_BACKEND", "pandas").lower()
+    default_path = "imi_features.duckdb" if kind == "duckdb" else "imi_features.csv"
+    return get_backend(kind, os.environ.get("TRANSACT_DATA", default_path))
+
+
+# Backends are process-wide singletons (get_backend), so identity is a stable
+# cache key; the remaining arguments (including the ``where`` filter state)
+# are hashed by value.
+_BACKEND_HASH_FUNCS = {PandasBackend: id, DuckDBBackend: id}
+
+
+@st.cache_data(hash_funcs=_BACKEND_HASH_FUNCS, max_entries=1024, show_spinner=False)
+def cached_aggregate(backend, by, metrics, where=None, order_by=None, descending=True, limit=None):
+    """
+    backend.aggregate() memoized per backend and per argument/filter state.
+
+    Each caller gets its own copy of the cached frame, so pages may add
+    columns to the result.
+    """
+    return backend.aggregate(by, metrics, where=where, order_by=order_by,
+                             descending=descending, limit=limit)
+
+
+@st.cache_data(hash_funcs=_BACKEND_HASH_FUNCS, max_entries=256, show_spinner=False)
+def cached_select(backend, columns, where=None, limit=None):
+    """backend.select() memoized per backend and per argument/filter state."""
+    return backend.select(columns, where=where, limit=limit)
+
+
+@st.cache_data(hash_funcs=_BACKEND_HASH_FUNCS, max_entries=256, show_spinner=False)
+def cached_histogram(backend, column, maxbins=30, where=None):
+    """backend.histogram() memoized per backend and per argument/filter state."""
+    return backend.histogram(column, maxbins=maxbins, where=where)
@@ -1,27 +1,30 @@
 import streamlit as st
-import pandas as pd
 import altair as alt
-import plotly.express as px
+from data_layer import WEEKDAY_ORDER
 
-def display_enterprise_analysis(df):
+def display_enterprise_analysis(backend):
     """
     Display enterprise-level analyses and visualizations. 
     Covers high-risk industries, fraud patterns, business legitimacy, and more.
     Now arranged in two-column rows for side-by-side charts.
+    All aggregates are requested from the query backend.
     """
     st.header("🏢 Enterprise Analysis")
     
-    # Ensure transaction_date is datetime, create day-of-week if needed
-    if 'transaction_date' in df.columns:
-        df['transaction_date'] = pd.to_datetime(df['transaction_date'], errors='coerce')
-        df['weekday'] = df['transaction_date'].dt.day_name()
-        df['txn_hour'] = df['transaction_date'].dt.hour
-
     # Pre-calculate some aggregates used across multiple charts
-    outlier_by_industry = df.groupby('industry')['high_txn_outlier'].sum().reset_index(name='Outliers')
-    cust_risk = df.groupby('customer_id')['high_txn_outlier'].sum().reset_index(name='outlier_sum')
-    high_risk_cust = cust_risk[cust_risk['outlier_sum'] > 5]['customer_id']
-    df_high_risk = df[df['customer_id'].isin(high_risk_cust)]
+    industry_stats = backend.aggregate(['industry'], {
+        'Outliers': ('high_txn_outlier', 'sum'),
+        'LargeCash': ('large_cash_txn', 'sum'),
+        'UniqueCust': ('customer_id', 'nunique')
+    })
+    outlier_by_industry = industry_stats[['industry', 'Outliers']]
+    # industry comes from KYC, so it is constant per customer and the
+    # customer-level table is enough to count high-risk customers per industry.
+    cust_risk = backend.aggregate(['customer_id'], {
+        'outlier_sum': ('high_txn_outlier', 'sum'),
+        'industry': ('industry', 'first')
+    })
+    cust_high_risk = cust_risk[cust_risk['outlier_sum'] > 5]
 
     # -----------------------
     # Row 1: (1) Industries with Most Outliers | (2) Industries with Most Large Cash Transactions
@@ -36,7 +39,7 @@ def display_enterprise_analysis(df):
         st.altair_chart(chart1, use_container_width=True)
     with col2:
         st.markdown("### Top 10 Industries with High-Risk Customers")
-        dist_industries = df_high_risk.groupby('industry')['customer_id'].nunique().reset_index(name='HighRiskCustCount')
+        dist_industries = cust_high_risk.groupby('industry')['customer_id'].nunique().reset_index(name='HighRiskCustCount')
         top10_hr = dist_industries.nlargest(10, 'HighRiskCustCount')
         chart6 = alt.Chart(top10_hr).mark_bar().encode(
             x=alt.X('HighRiskCustCount:Q', title='High-Risk Customers'),
@@ -59,8 +62,9 @@ def display_enterprise_analysis(df):
         st.altair_chart(chart3, use_container_width=True)
     with col2:
         st.markdown("### Industry-wise Outlier by Hour")
-        if 'txn_hour' in df.columns:
-            hour_outliers = df[df['high_txn_outlier'] == 1].groupby(['industry','txn_hour']).size().reset_index(name='count')
+        if backend.has_column('txn_hour'):
+            hour_outliers = backend.aggregate(['industry', 'txn_hour'], {'count': ('transaction_id', 'size')},
+                                              where={'high_txn_outlier': 1})
             heatmap = alt.Chart(hour_outliers).mark_rect().encode(
                 x=alt.X('txn_hour:O', title='Hour'),
                 y=alt.Y('industry:N', title='Industry'),
@@ -76,7 +80,7 @@ def display_enterprise_analysis(df):
     col1, col2 = st.columns(2)
     with col1:
         st.markdown("### Distribution of Industries Among High-Risk Customers")
-        dist_industries = df_high_risk.groupby('industry')['customer_id'].nunique().reset_index(name='HighRiskCustCount')
+        dist_industries = cust_high_risk.groupby('industry')['customer_id'].nunique().reset_index(name='HighRiskCustCount')
         chart5 = alt.Chart(dist_industries).mark_bar().encode(
             x=alt.X('HighRiskCustCount:Q', title='High-Risk Customers'),
             y=alt.Y('industry:N', sort='-x', title='Industry'),
@@ -94,8 +98,8 @@ def display_enterprise_analysis(df):
     col1, col2 = st.columns(2)
     with col1:
         st.markdown("### Fraud Patterns by Business Category (Wholesale vs. Retail)")
-        if 'merchant_category' in df.columns:
-            cat_agg = df.groupby('merchant_category')['high_txn_outlier'].sum().reset_index(name='Outliers')
+        if backend.has_column('merchant_category'):
+            cat_agg = backend.aggregate(['merchant_category'], {'Outliers': ('high_txn_outlier', 'sum')})
             chart8 = alt.Chart(cat_agg).mark_bar().encode(
                 x=alt.X('Outliers:Q', title='Outlier Transactions'),
                 y=alt.Y('merchant_category:N', sort='-x', title='Business Category'),
@@ -107,7 +111,7 @@ def display_enterprise_analysis(df):
     with col2:
         # fix this - why are some values zero?
         st.markdown("### Industries with Most Large Cash Transactions")
-        cash_by_industry = df.groupby('industry')['large_cash_txn'].sum().reset_index(name='LargeCash')
+        cash_by_industry = industry_stats[['industry', 'LargeCash']]
         chart2 = alt.Chart(cash_by_industry).mark_bar().encode(
             x=alt.X('LargeCash:Q', title='Large Cash Transactions'),
             y=alt.Y('industry:N', sort='-x', title='Industry'),
@@ -120,14 +124,12 @@ def display_enterprise_analysis(df):
     # col1, col2 = st.columns(2)
     # with col1:
     st.markdown("### Recurring Transactions by Day of the Week")
-    if 'weekday' in df.columns:
-        # Example approach for 'recurring'
-        recurring = df.groupby(['weekday', 'customer_id']).size().reset_index(name='count')
-        recurring_agg = recurring.groupby('weekday')['count'].sum().reset_index()
-        weekday_order = ["Monday","Tuesday","Wednesday","Thursday","Friday","Saturday","Sunday"]
-        recurring_agg['weekday'] = pd.Categorical(recurring_agg['weekday'], categories=weekday_order, ordered=True)
+    if backend.has_column('weekday'):
+        # Example approach for 'recurring': summing per-(weekday, customer) counts
+        # over customers is the weekday transaction count.
+        recurring_agg = backend.aggregate(['weekday'], {'count': ('transaction_id', 'size')})
         chart9 = alt.Chart(recurring_agg).mark_bar().encode(
-            x=alt.X('weekday:N', sort=weekday_order, title='Day of Week'),
+            x=alt.X('weekday:N', sort=WEEKDAY_ORDER, title='Day of Week'),
             y=alt.Y('count:Q', title='Recurring Transaction Count'),
             tooltip=['weekday', 'count']
         ).properties(width=600, height=300)
@@ -162,12 +164,12 @@ def display_enterprise_analysis(df):
     col1, col2 = st.columns(2)
     with col1:
         st.markdown("### Fraud Patterns by Business Category (Detailed)")
-        if 'merchant_category' in df.columns:
-            bc_agg = df.groupby('merchant_category').agg(
-                outliers=('high_txn_outlier','sum'),
-                large_cash=('large_cash_txn','sum'),
-                total_txn=('transaction_id','count')
-            ).reset_index()
+        if backend.has_column('merchant_category'):
+            bc_agg = backend.aggregate(['merchant_category'], {
+                'outliers': ('high_txn_outlier', 'sum'),
+                'large_cash': ('large_cash_txn', 'sum'),
+                'total_txn': ('transaction_id', 'count')
+            })
             chart11 = alt.Chart(bc_agg).mark_bar().encode(
                 x=alt.X('outliers:Q', title='Outliers'),
                 y=alt.Y('merchant_category:N', sort='-x', title='Business Category'),
@@ -179,7 +181,7 @@ def display_enterprise_analysis(df):
             st.write("No 'merchant_category' column available.")
     with col2:
         st.markdown("### Fraud-Prone Business Categories")
-        if 'merchant_category' in df.columns:
+        if backend.has_column('merchant_category'):
             # Reuse bc_agg from above
             bc_agg['fraud_score'] = bc_agg['outliers'] / bc_agg['total_txn'].replace(0,1)
             chart12 = alt.Chart(bc_agg.nlargest(10,'fraud_score')).mark_bar().encode(
@@ -194,8 +196,8 @@ def display_enterprise_analysis(df):
     col1, col2 = st.columns(2)
     with col1:
         st.markdown("### High Risk Customer Transactions by Industry")
-        hr_transactions = df[df['high_txn_outlier'] == 1]
-        hr_industry_agg = hr_transactions.groupby('industry')['transaction_id'].count().reset_index(name='HighRiskTxCount')
+        hr_industry_agg = backend.aggregate(['industry'], {'HighRiskTxCount': ('transaction_id', 'count')},
+                                            where={'high_txn_outlier': 1})
         chart13 = alt.Chart(hr_industry_agg).mark_bar().encode(
             x=alt.X('HighRiskTxCount:Q', title='High-Risk Transactions'),
             y=alt.Y('industry:N', sort='-x', title='Industry'),
@@ -204,11 +206,11 @@ def display_enterprise_analysis(df):
         st.altair_chart(chart13, use_container_width=True)
     with col2:
         st.markdown("### Industries with Transactions Exceeding Reported Sales")
-        if 'sales' in df.columns:
-            sales_agg = df.groupby('industry').agg(
-                total_amount=('amount_cad','sum'),
-                reported_sales=('sales','max')
-            ).reset_index()
+        if backend.has_column('sales'):
+            sales_agg = backend.aggregate(['industry'], {
+                'total_amount': ('amount_cad', 'sum'),
+                'reported_sales': ('sales', 'max')
+            })
             exceeding = sales_agg[sales_agg['total_amount'] > sales_agg['reported_sales']]
             chart14 = alt.Chart(exceeding).mark_bar().encode(
                 x=alt.X('total_amount:Q', title='Total Transaction Amount'),
@@ -238,9 +240,7 @@ def display_enterprise_analysis(df):
     #         st.write("No 'fraud_prone_location' column available.")
     # with col2:
     st.markdown("### Flagged Customers Linked to Fraud Prone Industries")
-    flagged_customers = cust_risk[cust_risk['outlier_sum']>5]['customer_id']
-    flagged_df = df[df['customer_id'].isin(flagged_customers)]
-    flagged_ind = flagged_df.groupby('industry')['customer_id'].nunique().reset_index(name='FlaggedCustCount')
+    flagged_ind = cust_high_risk.groupby('industry')['customer_id'].nunique().reset_index(name='FlaggedCustCount')
     chart16 = alt.Chart(flagged_ind).mark_bar().encode(
         x=alt.X('FlaggedCustCount:Q', title='Flagged Customers'),
         y=alt.Y('industry:N', sort='-x', title='Industry'),
@@ -253,7 +253,7 @@ def display_enterprise_analysis(df):
     col1, col2 = st.columns(2)
     with col1:
         st.markdown("### Industries with the Most Shared Customer Transactions")
-        cust_per_ind = df.groupby('industry')['customer_id'].nunique().reset_index(name='UniqueCust')
+        cust_per_ind = industry_stats[['industry', 'UniqueCust']]
         chart17 = alt.Chart(cust_per_ind.nlargest(10,'UniqueCust')).mark_bar().encode(
             x=alt.X('UniqueCust:Q', title='Number of Unique Customers'),
             y=alt.Y('industry:N', sort='-x', title='Industry'),
@@ -262,7 +262,8 @@ def display_enterprise_analysis(df):
         st.altair_chart(chart17, use_container_width=True)
     with col2:
         st.markdown("### High Transaction Merchant Categories")
-        high_merch = df[df['high_txn_outlier'] == 1].groupby('merchant_category').size().reset_index(name='count')
+        high_merch = backend.aggregate(['merchant_category'], {'count': ('transaction_id', 'size')},
+                                       where={'high_txn_outlier': 1})
         high_merch_chart = alt.Chart(high_merch).mark_bar().encode(
             x=alt.X('count:Q', title="Count"),
             y=alt.Y('merchant_category:N', sort='-x', title="Merchant Category"),
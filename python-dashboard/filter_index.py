@@ -0,0 +1,152 @@
+# filter_index.py
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Columns the pages filter on through selectboxes / multiselects.
+FILTER_COLUMNS = ("trans_province", "trans_city", "trans_country", "source")
+
+
+class FilterIndex:
+    """
+    In-memory inverted index over the dashboard filter columns.
+
+    For every indexed column the index keeps, per distinct value, the sorted
+    array of row positions holding that value (int32 while the frame has fewer
+    than 2**31 rows). A filter combination is resolved by taking the union of
+    the selected values' arrays within a column and intersecting across
+    columns, so no full boolean scan of the frame is needed. Resolved subsets
+    are memoized per filter combination with LRU eviction. Categorical
+    columns (the shared dictionary codes, see data_layer.load_features) are
+    bucketed on their integer codes instead of hashing the labels.
+
+    One instance is shared by all sessions (see data_layer.get_filter_index),
+    so the returned arrays are read-only and the cache is guarded by a lock.
+    """
+
+    def __init__(self, df, columns=FILTER_COLUMNS, cache_size=256):
+        """
+        Args:
+            df (pd.DataFrame): The shared features DataFrame.
+            columns (iterable): Columns to index; absent columns are skipped.
+            cache_size (int): Maximum number of memoized filter combinations.
+        """
+        self.n_rows = len(df)
+        self.cache_size = cache_size
+        self._row_dtype = np.int32 if self.n_rows < 2**31 else np.int64
+        self._postings = {}
+        for column in columns:
+            if column not in df.columns:
+                continue
+            if isinstance(df[column].dtype, pd.CategoricalDtype):
+                groups = self._code_groups(df[column])
+            else:
+                groups = df.groupby(column, observed=True, sort=True).indices
+            self._postings[column] = {
+                value: self._freeze(rows.astype(self._row_dtype, copy=False))
+                for value, rows in sorted(groups.items())
+            }
+        self.columns = tuple(self._postings)
+        self._all_rows = self._freeze(np.arange(self.n_rows, dtype=self._row_dtype))
+        self._empty = self._freeze(np.empty(0, dtype=self._row_dtype))
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _code_groups(values):
+        """value -> row positions of a categorical column, from one stable argsort of its codes."""
+        codes = values.cat.codes.to_numpy()
+        order = np.argsort(codes, kind="stable")
+        counts = np.bincount(codes + 1, minlength=len(values.cat.categories) + 1)
+        # Bucket 0 holds the missing (-1) rows, which are not indexed.
+        buckets = np.split(order, np.cumsum(counts)[:-1])[1:]
+        return {value: rows for value, rows in zip(values.cat.categories, buckets) if len(rows)}
+
+    @staticmethod
+    def _freeze(rows):
+        rows.flags.writeable = False
+        return rows
+
+    def values(self, column):
+        """Sorted distinct non-null values of an indexed column."""
+        return list(self._postings[column])
+
+    def count(self, column, value):
+        """Number of rows holding ``value`` in ``column`` without materializing them."""
+        return len(self._postings[column].get(value, ()))
+
+    @staticmethod
+    def _normalize(selections):
+        """
+        Turn a selection mapping into a hashable, order-insensitive cache key.
+        None or an empty list means "no filter" on that column.
+        """
+        key = []
+        for column, selected in selections.items():
+            if selected is None:
+                continue
+            if isinstance(selected, (list, tuple, set, frozenset)):
+                if not selected:
+                    continue
+                selected = tuple(sorted(set(selected), key=repr))
+            else:
+                selected = (selected,)
+            key.append((column, selected))
+        return tuple(sorted(key))
+
+    def _column_rows(self, column, selected):
+        postings = self._postings[column]
+        arrays = [postings[value] for value in selected if value in postings]
+        if not arrays:
+            return self._empty
+        if len(arrays) == 1:
+            return arrays[0]
+        # Values are disjoint within a column, so the union is a sorted concat.
+        return np.sort(np.concatenate(arrays), kind="stable")
+
+    def resolve(self, selections):
+        """
+        Resolve a filter combination to the sorted row positions matching it.
+
+        Args:
+            selections (dict): column -> value or list of values. Columns map
+                to an equality (single value) or membership (list) predicate,
+                and predicates on different columns are ANDed.
+
+        Returns:
+            np.ndarray: Read-only, sorted row positions for df.take().
+        """
+        key = self._normalize(selections)
+        with self._lock:
+            rows = self._cache.get(key)
+            if rows is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return rows
+            self.misses += 1
+
+        if not key:
+            rows = self._all_rows
+        else:
+            per_column = sorted((self._column_rows(column, selected) for column, selected in key), key=len)
+            rows = per_column[0]
+            for other in per_column[1:]:
+                if not len(rows):
+                    break
+                rows = np.intersect1d(rows, other, assume_unique=True)
+            rows = self._freeze(rows)
+
+        with self._lock:
+            self._cache[key] = rows
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return rows
+
+    def take(self, df, selections):
+        """Return the rows of ``df`` matching ``selections`` (a new DataFrame)."""
+        return df.take(self.resolve(selections))
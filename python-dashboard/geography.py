@@ -3,21 +3,35 @@ import streamlit as st
 import pandas as pd
 import altair as alt
 import plotly.express as px
+from chart_data import sample_rows, top_n
 
-def display_geography_analysis(df):
+def display_geography_analysis(backend):
     """
     Function to display geographical insights.
     The page is split into two columns where possible, with full-width charts for bigger graphs.
+    Aggregates come from the query backend; each location level is aggregated
+    once and reused by the charts below.
     """
     st.header("🌍 Geographical Insights")
     
     # ----------------------------------------------------
     # Metrics: Top 3 High-Risk Provinces
-    province_stats = df.groupby('trans_province').agg(
-        Outlier_Count=('high_txn_outlier', 'sum'),
-        Cash_Transactions=('large_cash_txn', 'sum'),
-        Late_Night=('odd_hour_txn', 'sum')
-    ).reset_index().rename(columns={'trans_province': 'Province_Name'})
+    province_metrics = {
+        'Outlier_Count': ('high_txn_outlier', 'sum'),
+        'Cash_Transactions': ('large_cash_txn', 'sum'),
+        'Late_Night': ('odd_hour_txn', 'sum')
+    }
+    province_stats = backend.aggregate(['trans_province'], province_metrics).rename(
+        columns={'trans_province': 'Province_Name'})
+    location_metrics = {
+        'Outlier_Count': ('high_txn_outlier', 'sum'),
+        'Transactions': ('transaction_id', 'count')
+    }
+    city_stats = backend.aggregate(['trans_city'], location_metrics)
+    country_metrics = {**location_metrics, 'high_outliers': ('high_txn_outlier', 'sum')}
+    if backend.has_column('low_txn_outlier'):
+        country_metrics['low_outliers'] = ('low_txn_outlier', 'sum')
+    country_stats = backend.aggregate(['trans_country'], country_metrics)
     
     if not province_stats.empty:
         top_provinces = province_stats.nlargest(3, 'Outlier_Count')
@@ -38,10 +52,7 @@ def display_geography_analysis(df):
     with col2:
         st.markdown("### Top High-Risk Cities")
         # Add metrics for top 3 high-risk cities
-        city_risk = df.groupby('trans_city').agg(
-            Transactions=('transaction_id', 'count'),
-            Outliers=('high_txn_outlier', 'sum')
-        ).reset_index()
+        city_risk = city_stats.rename(columns={'Outlier_Count': 'Outliers'})
         top_cities = city_risk.nlargest(3, 'Outliers')
         st.markdown("#### Top 3 High-Risk Cities")
         city_cols = st.columns(3)
@@ -75,12 +86,11 @@ def display_geography_analysis(df):
             selected_province = None
     with cols[2]:
         if selected_province:
-            province_data = province_stats[province_stats['Province_Name'] == selected_province].melt(
-                id_vars=['Province_Name'],
-                value_vars=['Outlier_Count', 'Cash_Transactions', 'Late_Night'],
-                var_name='Metric',
-                value_name='Count'
-            )
+            # Aggregated over the selected province's rows only.
+            province_totals = backend.aggregate([], province_metrics,
+                                                where={'trans_province': selected_province})
+            province_data = province_totals.melt(var_name='Metric', value_name='Count')
+            province_data.insert(0, 'Province_Name', selected_province)
             st.markdown(f"### {selected_province} Anomaly Factors")
             bar_chart = alt.Chart(province_data).mark_bar().encode(
                 x=alt.X('Metric:N', title='Metric'),
@@ -110,9 +120,8 @@ def display_geography_analysis(df):
     # ----------------------------------------------------
     # Full-width visualization: Province-wise Outlier Transactions by Hour
     st.markdown("### Province-wise Outlier Transactions by Hour")
-    province_hour = df.groupby(['trans_province', 'txn_hour']).agg(
-        Outliers=('high_txn_outlier', 'sum')
-    ).reset_index()
+    province_hour = backend.aggregate(['trans_province', 'txn_hour'],
+                                      {'Outliers': ('high_txn_outlier', 'sum')})
     hour_chart = alt.Chart(province_hour).mark_bar().encode(
         x=alt.X('txn_hour:O', title='Transaction Hour'),
         y=alt.Y('Outliers:Q', title='Outlier Transactions'),
@@ -124,10 +133,7 @@ def display_geography_analysis(df):
     # ----------------------------------------------------
     # New Addition: Aggregate High and Low Transactions by Country
     st.markdown("### Aggregate High and Low Transactions by Country")
-    country_agg = df.groupby('trans_country').agg(
-        high_outliers=('high_txn_outlier', 'sum'),
-        low_outliers=('low_txn_outlier', 'sum') if 'low_txn_outlier' in df.columns else ('low_txn_outlier', 'sum')
-    ).reset_index()
+    country_agg = country_stats
     country_agg_chart = alt.Chart(country_agg).mark_bar().encode(
         x=alt.X('trans_country:N', title="Country"),
         y=alt.Y('high_outliers:Q', title="High Outlier Transactions"),
@@ -140,19 +146,16 @@ def display_geography_analysis(df):
     # Continue with existing full-width visualizations
     st.markdown("### Riskiest Provinces, Cities, and Countries")
     # Riskiest Provinces
-    riskiest_provinces = df.groupby('trans_province').agg(
-        Outliers=('high_txn_outlier', 'sum')
-    ).nlargest(5, 'Outliers').reset_index().rename(columns={'trans_province':'Region'})
+    riskiest_provinces = province_stats.nlargest(5, 'Outlier_Count')[['Province_Name', 'Outlier_Count']]
+    riskiest_provinces.columns = ['Region', 'Outliers']
     riskiest_provinces['Type'] = 'Province'
     # Riskiest Cities
-    riskiest_cities = df.groupby('trans_city').agg(
-        Outliers=('high_txn_outlier', 'sum')
-    ).nlargest(5, 'Outliers').reset_index().rename(columns={'trans_city':'Region'})
+    riskiest_cities = city_stats.nlargest(5, 'Outlier_Count')[['trans_city', 'Outlier_Count']]
+    riskiest_cities.columns = ['Region', 'Outliers']
     riskiest_cities['Type'] = 'City'
     # Riskiest Countries
-    riskiest_countries = df.groupby('trans_country').agg(
-        Outliers=('high_txn_outlier', 'sum')
-    ).nlargest(5, 'Outliers').reset_index().rename(columns={'trans_country':'Region'})
+    riskiest_countries = country_stats.nlargest(5, 'Outlier_Count')[['trans_country', 'Outlier_Count']]
+    riskiest_countries.columns = ['Region', 'Outliers']
     riskiest_countries['Type'] = 'Country'
     combined = pd.concat([riskiest_provinces, riskiest_cities, riskiest_countries])
     risk_chart = alt.Chart(combined).mark_bar().encode(
@@ -174,11 +177,7 @@ def display_geography_analysis(df):
     st.altair_chart(prov_chart, use_container_width=True)
     
     st.markdown("### Comprehensive City Analysis")
-    city_stats = df.groupby('trans_city').agg(
-        Outlier_Count=('high_txn_outlier', 'sum'),
-        Transactions=('transaction_id', 'count')
-    ).reset_index()
-    city_chart = alt.Chart(city_stats).mark_circle(size=100).encode(
+    city_chart = alt.Chart(sample_rows(city_stats, keep_largest='Outlier_Count')).mark_circle(size=100).encode(
         x=alt.X('Transactions:Q', title='Total Transactions'),
         y=alt.Y('Outlier_Count:Q', title='Outlier Transactions'),
         color=alt.Color('trans_city:N', legend=None),
@@ -187,11 +186,7 @@ def display_geography_analysis(df):
     st.altair_chart(city_chart, use_container_width=True)
     
     st.markdown("### Comprehensive Country Analysis")
-    country_stats = df.groupby('trans_country').agg(
-        Outlier_Count=('high_txn_outlier', 'sum'),
-        Transactions=('transaction_id', 'count')
-    ).reset_index()
-    country_chart = alt.Chart(country_stats).mark_circle(size=100).encode(
+    country_chart = alt.Chart(sample_rows(country_stats, keep_largest='Outlier_Count')).mark_circle(size=100).encode(
         x=alt.X('Transactions:Q', title='Total Transactions'),
         y=alt.Y('Outlier_Count:Q', title='Outlier Transactions'),
         color=alt.Color('trans_country:N', legend=None),
@@ -231,7 +226,7 @@ def display_geography_analysis(df):
     st.altair_chart(comp_city_chart, use_container_width=True)
     
     st.markdown("### Comparison of Anomaly Factors by Country")
-    comp_country = country_stats.melt(
+    comp_country = country_stats[['trans_country', 'Outlier_Count', 'Transactions']].melt(
         id_vars=['trans_country'], 
         value_vars=['Outlier_Count', 'Transactions'], 
         var_name='Metric', 
@@ -246,9 +241,8 @@ def display_geography_analysis(df):
     st.altair_chart(comp_country_chart, use_container_width=True)
     
     st.markdown("### Geographic Distribution of High-Risk Transactions")
-    geo_dist = df.groupby('trans_province').agg(
-        High_Risk_Transactions=('high_txn_outlier', 'sum')
-    ).reset_index().rename(columns={'trans_province': 'Region'})
+    geo_dist = province_stats[['Province_Name', 'Outlier_Count']].rename(
+        columns={'Province_Name': 'Region', 'Outlier_Count': 'High_Risk_Transactions'})
     geo_chart = alt.Chart(geo_dist).mark_bar().encode(
         x=alt.X('Region:N', title='Province'),
         y=alt.Y('High_Risk_Transactions:Q', title='High-Risk Transactions'),
@@ -258,9 +252,8 @@ def display_geography_analysis(df):
     st.altair_chart(geo_chart, use_container_width=True)
     
     st.markdown("### Cities with the Most High Risk Transactions")
-    city_dist = df.groupby('trans_city').agg(
-        High_Risk_Transactions=('high_txn_outlier', 'sum')
-    ).reset_index()
+    city_dist = top_n(city_stats.rename(columns={'Outlier_Count': 'High_Risk_Transactions'}),
+                      'trans_city', 'High_Risk_Transactions', n=20, other="Other cities")
     city_dist_chart = alt.Chart(city_dist).mark_bar().encode(
         x=alt.X('High_Risk_Transactions:Q', title='High-Risk Transactions'),
         y=alt.Y('trans_city:N', sort='-x', title='City'),
@@ -270,10 +263,7 @@ def display_geography_analysis(df):
     st.altair_chart(city_dist_chart, use_container_width=True)
     
     st.markdown("### Cities with Suspicious Customer Transactions")
-    city_total = df.groupby('trans_city').agg(
-        Total_Transactions=('transaction_id', 'count'),
-        Outliers=('high_txn_outlier', 'sum')
-    ).reset_index()
+    city_total = city_stats.rename(columns={'Transactions': 'Total_Transactions', 'Outlier_Count': 'Outliers'})
     city_total['Suspicious_Ratio'] = city_total['Outliers'] / city_total['Total_Transactions'] * 100
     top_cities = city_total.nlargest(10, 'Suspicious_Ratio')
     suspicious_chart = alt.Chart(top_cities).mark_bar().encode(
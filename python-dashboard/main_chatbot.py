@@ -1,10 +1,35 @@
 # app/core.py
+import hashlib
+import os
+import queue
+import re
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
 import streamlit as st
 from langchain.agents import AgentType
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tools import Tool
 from langchain_experimental.agents import create_pandas_dataframe_agent
 from langchain_ollama import ChatOllama
 
+from chat_context import DataFrameContext, estimate_tokens, trim_history
+from sandbox import SandboxExecutor
+
+# The LLM endpoint can be pointed at a local stub (stub_llm_server.py).
+LLM_MODEL = os.environ.get("TRANSBOT_MODEL", "gemma:2b")
+LLM_BASE_URL = os.environ.get("TRANSBOT_LLM_URL", "http://localhost:8502/")
+SYSTEM_PROMPT = "You are a helpful data analysis assistant"
+RESPONSE_CACHE_SIZE = 256
+# A turn producing no final answer within this many seconds is abandoned.
+RESPONSE_TIMEOUT_S = float(os.environ.get("TRANSBOT_TIMEOUT", 120))
+# Estimated tokens of chat history sent per turn (see chat_context.trim_history).
+HISTORY_TOKEN_BUDGET = int(os.environ.get("TRANSBOT_HISTORY_TOKENS", 1500))
+
+
 def safe_page_config():
     """Handle page config in a way that prevents multiple calls"""
     try:
@@ -18,48 +43,366 @@ def safe_page_config():
             return
         raise e
 
+
+def dataframe_fingerprint(df):
+    """
+    Content hash of a DataFrame (columns, dtypes and every value).
+
+    Two uploads of the same data get the same fingerprint, so the agent and
+    cached answers built for one are reused for the other.
+    """
+    digest = hashlib.sha1()
+    digest.update(repr([(str(column), str(dtype)) for column, dtype in df.dtypes.items()]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy(dtype=np.uint64).tobytes())
+    return digest.hexdigest()
+
+
+@st.cache_resource(show_spinner=False)
+def get_llm(model=LLM_MODEL, base_url=LLM_BASE_URL):
+    """One ChatOllama client per (model, endpoint), shared by every session."""
+    return ChatOllama(model=model, temperature=0, base_url=base_url)
+
+
+class ResponseCache:
+    """
+    LRU cache of final answers keyed by (data fingerprint, model, question,
+    earlier turns).
+
+    Questions are compared after collapsing case and whitespace. The earlier
+    turns are the trimmed history the agent is sent before the question, so a
+    follow-up ("and for the second one?") only reuses an answer given after
+    the same conversation; first questions share one entry. Only
+    successful answers are stored. One instance is shared by all sessions
+    (see get_response_cache), so it is guarded by a lock.
+    """
+
+    def __init__(self, max_entries=RESPONSE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _normalize(text):
+        return re.sub(r"\s+", " ", text).strip().lower()
+
+    @classmethod
+    def key(cls, fingerprint, model, question, history=()):
+        digest = hashlib.sha1()
+        for message in history:
+            digest.update(f"{message['role']}\0{cls._normalize(message['content'])}\0".encode())
+        return fingerprint, model, cls._normalize(question), digest.hexdigest() if history else None
+
+    def get(self, key):
+        with self._lock:
+            answer = self._entries.get(key)
+            if answer is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return answer
+
+    def put(self, key, answer):
+        with self._lock:
+            self._entries[key] = answer
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+@st.cache_resource(max_entries=4, show_spinner="Starting the code sandbox...")
+def get_sandbox(fingerprint, _df):
+    """
+    The SandboxExecutor for a DataFrame, shared by every session that uploaded
+    it. An evicted executor stops its workers and frees its shared memory
+    once no agent refers to it.
+    """
+    return SandboxExecutor(_df)
+
+
+@st.cache_resource(show_spinner=False)
+def get_response_cache():
+    """The process-wide ResponseCache."""
+    return ResponseCache()
+
+
+def get_agent(state, llm=None):
+    """
+    The pandas agent for the session's DataFrame, built once per upload.
+
+    The agent and its DataFrameContext (schema summary used as the prompt
+    prefix instead of the frame's rows, plus the pre-aggregated query tools)
+    are kept in ``state`` with the fingerprint they were built for, and only
+    rebuilt when a different DataFrame is uploaded. The agent's python tool
+    is swapped for one running the generated code in the shared sandbox
+    (sandbox.py) instead of inside the Streamlit process.
+
+    Args:
+        state (MutableMapping): st.session_state, or any dict holding
+            ``df`` and ``df_fingerprint``.
+        llm: Chat model to use (default: get_llm()).
+    """
+    if state.get("agent_fingerprint") != state["df_fingerprint"]:
+        context = DataFrameContext(state["df"])
+        state["context"] = context
+        state["agent"] = create_pandas_dataframe_agent(
+            llm or get_llm(),
+            state["df"],
+            verbose=True,
+            agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+            prefix=context.prefix(),
+            include_df_in_prompt=False,
+            extra_tools=context.tools(),
+            allow_dangerous_code=True
+        )
+        sandbox = get_sandbox(state["df_fingerprint"], state["df"])
+        state["agent"].tools = [
+            Tool(name=tool.name, func=sandbox.run, description=tool.description)
+            if tool.name == "python_repl_ast" else tool
+            for tool in state["agent"].tools
+        ]
+        state["agent_fingerprint"] = state["df_fingerprint"]
+    return state["agent"]
+
+
 def initialize_session_state():
     if "chat_history" not in st.session_state:
         st.session_state.chat_history = []
     if "df" not in st.session_state:
         st.session_state.df = None
+    if "turn_metrics" not in st.session_state:
+        st.session_state.turn_metrics = []
+
 
 def handle_file_upload():
     uploaded_file = st.file_uploader("Choose a file", type=["csv", "xlsx", "xls"])
     if uploaded_file:
-        st.session_state.df = pd.read_csv(uploaded_file) if uploaded_file.name.endswith(".csv") else pd.read_excel(uploaded_file)
+        # The uploader hands back the same file on every rerun; only parse and
+        # fingerprint it when a new file arrives.
+        if st.session_state.get("upload_id") != uploaded_file.file_id:
+            df = pd.read_csv(uploaded_file) if uploaded_file.name.endswith(".csv") else pd.read_excel(uploaded_file)
+            st.session_state.df = df
+            st.session_state.df_fingerprint = dataframe_fingerprint(df)
+            st.session_state.upload_id = uploaded_file.file_id
         st.write("DataFrame Preview:")
         st.dataframe(st.session_state.df.head())
 
+
+def display_turn_metrics(metrics):
+    source = "cached answer" if metrics["cached"] else "LLM"
+    ttft = "" if metrics.get("ttft_s") is None else f", first token after {metrics['ttft_s']:.2f}s"
+    tokens = ""
+    if metrics.get("prompt_tokens_est") is not None:
+        tokens = f", prompt ~{metrics['prompt_tokens_est']:,} tokens"
+        if metrics.get("prompt_tokens"):
+            tokens += f" ({metrics['prompt_tokens']:,} evaluated by the model)"
+    st.caption(f"{source} in {metrics['latency_s']:.2f}s{ttft}{tokens}")
+
+
 def display_chat_history():
+    assistant_turn = 0
     for message in st.session_state.chat_history:
         with st.chat_message(message["role"]):
             st.markdown(message["content"])
+            if message["role"] == "assistant" and assistant_turn < len(st.session_state.turn_metrics):
+                display_turn_metrics(st.session_state.turn_metrics[assistant_turn])
+        if message["role"] == "assistant":
+            assistant_turn += 1
+
+
+class TurnCancelled(Exception):
+    """Raised inside the agent thread to abort a cancelled or timed-out turn."""
+
+
+class StreamEvents(BaseCallbackHandler):
+    """
+    Forwards LLM tokens and agent steps from the agent thread to a queue.
+
+    Streamlit elements can only be updated from the script thread, so the
+    agent runs in a worker thread and the script drains the queue. Every
+    token also checks ``cancel``: raising from the callback (raise_error) is
+    what stops a generation in progress.
+    """
+
+    raise_error = True
+
+    def __init__(self, events, cancel):
+        self.events = events
+        self.cancel = cancel
+
+    def _check(self):
+        if self.cancel.is_set():
+            raise TurnCancelled()
+
+    def on_llm_new_token(self, token, **kwargs):
+        self._check()
+        self.events.put(("token", token))
+
+    def on_agent_action(self, action, **kwargs):
+        self._check()
+        self.events.put(("step", f"{action.tool}: {action.tool_input}"))
+
+    def on_tool_end(self, output, **kwargs):
+        self._check()
+        self.events.put(("step", f"observation: {output}"))
+
+    def on_llm_end(self, response, **kwargs):
+        # Ollama reports the prompt tokens it evaluated with the last chunk.
+        for generations in response.generations:
+            for generation in generations:
+                count = (generation.generation_info or {}).get("prompt_eval_count")
+                if count:
+                    self.events.put(("usage", count))
+
+
+def stream_answer(state, prompt, llm=None, model=LLM_MODEL, cache=None, timeout=RESPONSE_TIMEOUT_S, cancel=None):
+    """
+    Answer ``prompt`` about the session's DataFrame as a stream of events.
+
+    The agent runs in a daemon thread. Its tokens and intermediate steps are
+    yielded as they arrive, followed by one final event:
+
+    * ("token", text) - a piece of the LLM output;
+    * ("step", text) - an agent action or tool observation;
+    * ("done", answer, metrics) - the final answer;
+    * ("error", message, metrics) - failed, timed out or cancelled.
+
+    metrics holds latency_s, ttft_s (time to the first token; the whole
+    latency for a cached answer), cached, prompt_tokens_est (the estimated
+    size of the context sent: schema summary plus the trimmed history) and
+    prompt_tokens (as reported by the model server over all agent steps). Closing the generator early
+    (Streamlit stopping the script when the user presses Stop) or setting
+    ``cancel`` aborts the agent at its next token. A timed-out turn is
+    abandoned the same way.
+
+    Args:
+        state (MutableMapping): Session state (see get_agent), with
+            ``chat_history`` already holding the prompt.
+        prompt (str): The user's question.
+        llm: Chat model (default: get_llm()).
+        model (str): Model name, part of the response cache key (with the
+            question and the trimmed earlier turns).
+        cache (ResponseCache): Default: get_response_cache().
+        timeout (float): Seconds before the turn is abandoned.
+        cancel (threading.Event): Set to cancel the turn from elsewhere.
+    """
+    start = time.perf_counter()
+    cache = get_response_cache() if cache is None else cache
+    history = trim_history(state["chat_history"], HISTORY_TOKEN_BUDGET)
+    # The prompt is the last history message; what precedes it is context.
+    earlier = history[:-1] if history and history[-1]["role"] == "user" else history
+    key = ResponseCache.key(state["df_fingerprint"], model, prompt, earlier)
+    cached = cache.get(key)
+    if cached is not None:
+        latency = time.perf_counter() - start
+        yield "done", cached, {"latency_s": latency, "ttft_s": latency, "cached": True}
+        return
+
+    events = queue.Queue()
+    cancel = cancel or threading.Event()
+    agent = get_agent(state, llm)
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}, *history]
+    prompt_tokens_est = estimate_tokens(state["context"].prefix()) \
+        + sum(estimate_tokens(message["content"]) for message in messages)
+
+    def run():
+        try:
+            response = agent.invoke(messages, config={"callbacks": [StreamEvents(events, cancel)]})
+            events.put(("result", response["output"]))
+        except TurnCancelled:
+            events.put(("cancelled", None))
+        except Exception as e:
+            events.put(("failed", f"Error processing request: {str(e)}"))
+
+    threading.Thread(target=run, daemon=True).start()
+    metrics = {"ttft_s": None, "cached": False, "prompt_tokens_est": prompt_tokens_est, "prompt_tokens": 0}
+    deadline = start + timeout
+    try:
+        while True:
+            try:
+                kind, payload = events.get(timeout=max(min(deadline - time.perf_counter(), 0.1), 0))
+            except queue.Empty:
+                if cancel.is_set() or time.perf_counter() >= deadline:
+                    cancel.set()
+                    metrics["latency_s"] = time.perf_counter() - start
+                    reason = "Cancelled." if time.perf_counter() < deadline else f"Timed out after {timeout:g}s."
+                    yield "error", reason, metrics
+                    return
+                continue
+            if kind == "usage":
+                metrics["prompt_tokens"] += payload
+                continue
+            if kind == "token" and metrics["ttft_s"] is None:
+                metrics["ttft_s"] = time.perf_counter() - start
+            if kind in ("token", "step"):
+                yield kind, payload
+                continue
+            metrics["latency_s"] = time.perf_counter() - start
+            if kind == "result":
+                cache.put(key, payload)
+                yield "done", payload, metrics
+            else:
+                yield "error", payload or "Cancelled.", metrics
+            return
+    finally:
+        # Reached on completion and when the consumer stops early; either
+        # way a still-running agent should stop spending tokens.
+        cancel.set()
+
+
+def answer(state, prompt, llm=None, model=LLM_MODEL, cache=None, timeout=RESPONSE_TIMEOUT_S):
+    """
+    Blocking form of stream_answer().
+
+    Returns:
+        tuple: (answer or error text, metrics dict).
+    """
+    for event in stream_answer(state, prompt, llm, model, cache, timeout):
+        if event[0] in ("done", "error"):
+            return event[1], event[2]
+
 
 def handle_user_input(prompt: str):
+    """
+    Stream the answer to ``prompt`` into the current chat message.
+
+    Tokens render as they arrive and agent steps go to a collapsed status
+    box. A Stop button cancels the turn: pressing it reruns the script, which
+    interrupts this function, and the finally block records the partial turn.
+    """
+    start = time.perf_counter()
+    response, metrics, failed = None, {"ttft_s": None, "cached": False}, False
+    stop = st.empty()
+    steps = st.status("Thinking...", expanded=False)
+    text = st.empty()
+    streamed = ""
     try:
-        llm = ChatOllama(
-            model="gemma:2b",
-            temperature=0,
-            base_url="http://localhost:8502/"
-        )
-        
-        agent = create_pandas_dataframe_agent(
-            llm,
-            st.session_state.df,
-            verbose=True,
-            agent_type=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-            allow_dangerous_code=True
-        )
+        if st.session_state.df is None:
+            response = "Please upload a file first."
+            return response
+        stop.button("Stop", key=f"stop_{len(st.session_state.chat_history)}")
+        for event in stream_answer(st.session_state, prompt):
+            if event[0] == "token":
+                streamed += event[1]
+                text.markdown(streamed + "▌")
+            elif event[0] == "step":
+                steps.write(event[1])
+            else:
+                response, metrics, failed = event[1], event[2], event[0] == "error"
+        return response
+    finally:
+        stop.empty()
+        steps.update(label="Agent steps", state="error" if failed or response is None else "complete")
+        if response is None:
+            response = (streamed + "\n\n_(cancelled)_").strip()
+        text.markdown(response)
+        metrics["latency_s"] = time.perf_counter() - start
+        st.session_state.chat_history.append({"role": "assistant", "content": response})
+        st.session_state.turn_metrics.append(metrics)
+        display_turn_metrics(metrics)
 
-        response = agent.invoke([
-            {"role": "system", "content": "You are a helpful data analysis assistant"},
-            *st.session_state.chat_history
-        ])
-        
-        return response["output"]
-    except Exception as e:
-        return f"Error processing request: {str(e)}"
 
 def chatbot_main():
     """Chatbot component without page config"""
@@ -72,8 +415,5 @@ def chatbot_main():
         st.chat_message("user").markdown(prompt)
         st.session_state.chat_history.append({"role": "user", "content": prompt})
 
-        response = handle_user_input(prompt)
-        
-        st.session_state.chat_history.append({"role": "assistant", "content": response})
         with st.chat_message("assistant"):
-            st.markdown(response)
+            handle_user_input(prompt)
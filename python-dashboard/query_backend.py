@@ -0,0 +1,463 @@
+# query_backend.py
+"""
+Pluggable query backends for the dashboard pages.
+
+Pages never touch the raw transaction frame; they ask a backend for
+aggregates (small DataFrames) through a single interface:
+
+    backend.aggregate(by, metrics, where=None, order_by=None, limit=None)
+    backend.histogram(column, maxbins=30, where=None)
+
+``metrics`` uses pandas named-aggregation form, ``{name: (column, func)}``,
+with func one of sum, count, size, mean, nunique, first, min, max, std or
+mode_count (how many times the most frequent value of ``column`` occurs in
+the group). ``where`` maps a column to a value (equality) or a list of values
+(membership); None or an empty list means no filter on that column.
+
+PandasBackend answers from the in-memory features frame (filters go through
+the shared FilterIndex). DuckDBBackend runs the same aggregations as SQL
+against a local DuckDB file built from the Parquet features, so the
+transaction history no longer has to fit in the Streamlit process.
+
+Build the DuckDB file with:
+    python query_backend.py imi_features.csv --parquet imi_features.parquet --db imi_features.duckdb
+"""
+import argparse
+import threading
+
+import numpy as np
+import pandas as pd
+
+SUPPORTED_FUNCS = ("sum", "count", "size", "mean", "nunique", "first", "min", "max", "std", "mode_count")
+TABLE_NAME = "features"
+
+
+def _is_multi(selected):
+    return isinstance(selected, (list, tuple, set, frozenset, np.ndarray, pd.Index))
+
+
+def _active_filters(where):
+    """Drop "no filter" entries (None / empty list) from a where mapping."""
+    active = {}
+    for column, selected in (where or {}).items():
+        if selected is None or (_is_multi(selected) and len(selected) == 0):
+            continue
+        active[column] = list(selected) if _is_multi(selected) else selected
+    return active
+
+
+def _nice_step(span, maxbins):
+    """Smallest 1/2/5 x 10^k step that covers ``span`` in at most ``maxbins`` bins."""
+    raw = span / maxbins
+    magnitude = 10 ** np.floor(np.log10(raw))
+    for multiple in (1, 2, 5, 10):
+        if multiple * magnitude >= raw:
+            return multiple * magnitude
+    return 10 * magnitude
+
+
+def histogram_layout(low, high, maxbins):
+    """
+    Equal-width "nice" bins covering [low, high], as alt.Bin(maxbins=...) would
+    choose them in the browser.
+
+    Returns:
+        tuple: (start, step, n_bins). Value x falls in bin
+        floor((x - start) / step), clipped to [0, n_bins - 1].
+    """
+    step = _nice_step(high - low, maxbins)
+    start = np.floor(low / step) * step
+    n_bins = max(int(np.ceil((high - start) / step)), 1)
+    # The last edge must include ``high`` itself.
+    if start + n_bins * step <= high:
+        n_bins += 1
+    return start, step, n_bins
+
+
+def _histogram_frame(edges, counts):
+    return pd.DataFrame({'bin_start': edges[:-1], 'bin_end': edges[1:], 'count': counts})
+
+
+def _empty_histogram(low=None, count=0):
+    if not count:
+        return pd.DataFrame({'bin_start': [], 'bin_end': [], 'count': []})
+    # Every value is ``low``: one unit-wide bin.
+    return _histogram_frame(np.array([low, low + 1]), np.array([count]))
+
+
+def histogram_values(values, maxbins=30):
+    """
+    Bin numeric values into at most ``maxbins`` bins (see histogram_layout).
+
+    NaN / inf values are dropped.
+
+    Returns:
+        pd.DataFrame: bin_start, bin_end, count (one row per bin).
+    """
+    values = np.asarray(values, dtype=float)
+    values = values[np.isfinite(values)]
+    if not len(values):
+        return _empty_histogram()
+    low, high = values.min(), values.max()
+    if low == high:
+        return _empty_histogram(low, len(values))
+    start, step, n_bins = histogram_layout(low, high, maxbins)
+    bins = np.clip(np.floor((values - start) / step), 0, n_bins - 1).astype(np.int64)
+    counts = np.bincount(bins, minlength=n_bins)
+    return _histogram_frame(start + step * np.arange(n_bins + 1), counts)
+
+
+def _check_metrics(metrics):
+    for name, (column, func) in metrics.items():
+        if func not in SUPPORTED_FUNCS:
+            raise ValueError(f"Unsupported aggregation '{func}' for metric '{name}'")
+
+
+class QueryBackend:
+    """Interface shared by the pandas and DuckDB backends."""
+
+    name = "base"
+
+    def aggregate(self, by, metrics, where=None, order_by=None, descending=True, limit=None):
+        """
+        Group the (filtered) transactions and compute named metrics.
+
+        Args:
+            by (list): Group-by columns; an empty list gives a single row.
+            metrics (dict): name -> (column, func).
+            where (dict): column -> value or list of values.
+            order_by (str): Optional metric/column to sort the result by.
+            descending (bool): Sort direction for ``order_by``.
+            limit (int): Optional top-N after sorting.
+
+        Returns:
+            pd.DataFrame: One row per group, group columns first. Groups with
+            a missing key are dropped, as with pandas groupby defaults.
+        """
+        raise NotImplementedError
+
+    def distinct(self, column, where=None):
+        """Sorted distinct non-null values of ``column``."""
+        raise NotImplementedError
+
+    def histogram(self, column, maxbins=30, where=None):
+        """
+        Bin counts of a numeric column over the filtered rows, computed by
+        the backend so only the bins leave it (see histogram_values()).
+
+        Returns:
+            pd.DataFrame: bin_start, bin_end, count (at most ``maxbins`` + 1 rows).
+        """
+        raise NotImplementedError
+
+    def select(self, columns, where=None, limit=None):
+        """Raw rows (only ``columns``) matching ``where``, as a DataFrame."""
+        raise NotImplementedError
+
+    def column_values(self, column, where=None, limit=None):
+        """Raw values of one column for the filtered rows, as a numpy array."""
+        return self.select([column], where=where, limit=limit)[column].to_numpy()
+
+    def has_column(self, column):
+        return column in self.columns
+
+
+class PandasBackend(QueryBackend):
+    """Answers aggregate requests from the in-memory features DataFrame."""
+
+    name = "pandas"
+
+    def __init__(self, df, filter_index=None):
+        """
+        Args:
+            df (pd.DataFrame): The shared, read-only features DataFrame.
+            filter_index (FilterIndex): Optional index used for the filter columns.
+        """
+        self.df = df
+        self.filter_index = filter_index
+        self.columns = list(df.columns)
+
+    def _indexed(self, column):
+        return self.filter_index is not None and column in self.filter_index.columns
+
+    def _frame(self, columns, where):
+        """Build a narrow frame of ``columns`` restricted to the rows matching ``where``."""
+        where = _active_filters(where)
+        indexed = {c: v for c, v in where.items() if self._indexed(c)}
+        rows = self.filter_index.resolve(indexed) if indexed else None
+
+        residual = {c: v for c, v in where.items() if c not in indexed}
+        needed = list(dict.fromkeys(list(columns) + list(residual)))
+        if rows is None:
+            frame = self.df[needed]
+        else:
+            frame = pd.DataFrame({c: self.df[c].take(rows) for c in needed})
+
+        if residual:
+            mask = np.ones(len(frame), dtype=bool)
+            for column, selected in residual.items():
+                if isinstance(selected, list):
+                    mask &= frame[column].isin(selected).to_numpy()
+                else:
+                    mask &= (frame[column] == selected).to_numpy()
+            frame = frame[mask]
+        return frame
+
+    def aggregate(self, by, metrics, where=None, order_by=None, descending=True, limit=None):
+        _check_metrics(metrics)
+        by = list(by)
+        metric_columns = [column for column, _ in metrics.values()]
+        frame = self._frame(by + metric_columns, where)
+
+        standard = {name: spec for name, spec in metrics.items() if spec[1] != "mode_count"}
+        if by:
+            grouped = frame.groupby(by, observed=True, sort=True)
+            if standard:
+                result = grouped.agg(**standard).reset_index()
+            else:
+                result = grouped.size().reset_index()[by]
+            for name, (column, func) in metrics.items():
+                if func == "mode_count":
+                    counts = frame.groupby(by + [column], observed=True).size()
+                    mode_counts = counts.groupby(level=list(range(len(by)))).max().rename(name).reset_index()
+                    result = result.merge(mode_counts, on=by, how="left")
+        else:
+            values = {}
+            for name, (column, func) in metrics.items():
+                if func == "size":
+                    values[name] = len(frame)
+                elif func == "mode_count":
+                    counts = frame[column].value_counts()
+                    values[name] = counts.max() if len(counts) else 0
+                elif func == "first":
+                    present = frame[column].dropna()
+                    values[name] = present.iloc[0] if len(present) else np.nan
+                else:
+                    values[name] = frame[column].agg(func)
+            result = pd.DataFrame([values])
+        result = result[by + list(metrics)]
+
+        if order_by is not None:
+            if limit is not None:
+                pick = result.nlargest if descending else result.nsmallest
+                result = pick(limit, order_by)
+            else:
+                result = result.sort_values(order_by, ascending=not descending, kind="stable")
+        elif limit is not None:
+            result = result.head(limit)
+        return result.reset_index(drop=True)
+
+    def distinct(self, column, where=None):
+        if not _active_filters(where) and self._indexed(column):
+            return self.filter_index.values(column)
+        return sorted(self._frame([column], where)[column].dropna().unique())
+
+    def histogram(self, column, maxbins=30, where=None):
+        values = self._frame([column], where)[column]
+        return histogram_values(values.to_numpy(dtype=float, na_value=np.nan), maxbins)
+
+    def select(self, columns, where=None, limit=None):
+        frame = self._frame(list(columns), where)[list(columns)]
+        return (frame if limit is None else frame.head(limit)).reset_index(drop=True)
+
+
+def _quote(identifier):
+    return '"' + str(identifier).replace('"', '""') + '"'
+
+
+def _literal(text):
+    return "'" + str(text).replace("'", "''") + "'"
+
+
+class DuckDBBackend(QueryBackend):
+    """Answers aggregate requests with SQL against a local DuckDB file."""
+
+    name = "duckdb"
+
+    _SQL_FUNCS = {
+        "sum": "COALESCE(SUM({c}), 0)",
+        "count": "COUNT({c})",
+        "size": "COUNT(*)",
+        "mean": "AVG({c})",
+        "nunique": "COUNT(DISTINCT {c})",
+        # 'first' is only used for per-customer constants (industry, employee_count),
+        # so any non-null value of the group is equivalent.
+        "first": "ANY_VALUE({c})",
+        "min": "MIN({c})",
+        "max": "MAX({c})",
+        "std": "STDDEV_SAMP({c})",
+    }
+
+    def __init__(self, db_path, table=TABLE_NAME):
+        """
+        Args:
+            db_path (str): DuckDB file created by build_database().
+            table (str): Table holding the features.
+        """
+        try:
+            import duckdb
+        except ImportError as e:
+            raise ImportError("The DuckDB backend requires the 'duckdb' package (pip install duckdb).") from e
+        self.db_path = db_path
+        self.table = _quote(table)
+        self._con = duckdb.connect(db_path, read_only=True)
+        self._local = threading.local()
+        self.columns = [row[0] for row in self._con.execute(f"DESCRIBE {self.table}").fetchall()]
+
+    def _cursor(self):
+        # DuckDB connections are not thread-safe; each Streamlit session thread
+        # gets its own cursor on the shared database instance.
+        cursor = getattr(self._local, "cursor", None)
+        if cursor is None:
+            cursor = self._con.cursor()
+            self._local.cursor = cursor
+        return cursor
+
+    def _where_sql(self, where, extra=()):
+        clauses, params = list(extra), []
+        for column, selected in _active_filters(where).items():
+            if isinstance(selected, list):
+                clauses.append(f"{_quote(column)} IN ({', '.join('?' for _ in selected)})")
+                params.extend(selected)
+            else:
+                clauses.append(f"{_quote(column)} = ?")
+                params.append(selected)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _query(self, sql, params):
+        return self._cursor().execute(sql, params).df()
+
+    def aggregate(self, by, metrics, where=None, order_by=None, descending=True, limit=None):
+        _check_metrics(metrics)
+        by_cols = [_quote(c) for c in by]
+        by_sql = ", ".join(by_cols)
+        group_sql = f" GROUP BY {by_sql}" if by_cols else ""
+        # pandas groupby drops groups with a missing key; mirror that in SQL.
+        where_sql, params = self._where_sql(where, extra=[f"{c} IS NOT NULL" for c in by_cols])
+
+        main_exprs = by_cols + ["COUNT(*) AS __rows"]
+        outputs = [f"main.{c}" for c in by_cols]
+        ctes, joins = [], []
+        for i, (name, (column, func)) in enumerate(metrics.items()):
+            alias = _quote(name)
+            if func == "mode_count":
+                cte = f"mode_{i}"
+                keys = ", ".join(by_cols + [_quote(column)])
+                counts = (f"SELECT {keys}, COUNT(*) AS n FROM base "
+                          f"WHERE {_quote(column)} IS NOT NULL GROUP BY {keys}")
+                lead = f"{by_sql}, " if by_cols else ""
+                ctes.append(f"{cte} AS (SELECT {lead}COALESCE(MAX(n), 0) AS {alias} FROM ({counts}){group_sql})")
+                joins.append(f" LEFT JOIN {cte} USING ({by_sql})" if by_cols else f" CROSS JOIN {cte}")
+                outputs.append(f"{cte}.{alias}")
+            else:
+                main_exprs.append(f"{self._SQL_FUNCS[func].format(c=_quote(column))} AS {alias}")
+                outputs.append(f"main.{alias}")
+
+        ctes = [f"base AS (SELECT * FROM {self.table}{where_sql})",
+                f"main AS (SELECT {', '.join(main_exprs)} FROM base{group_sql})"] + ctes
+        sql = f"WITH {', '.join(ctes)} SELECT {', '.join(outputs)} FROM main{''.join(joins)}"
+
+        order = []
+        if order_by is not None:
+            order.append(f"{_quote(order_by)} {'DESC' if descending else 'ASC'}")
+        order.extend(by_cols)
+        if order:
+            sql += " ORDER BY " + ", ".join(order)
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return self._query(sql, params)
+
+    def distinct(self, column, where=None):
+        where_sql, params = self._where_sql(where, extra=[f"{_quote(column)} IS NOT NULL"])
+        sql = f"SELECT DISTINCT {_quote(column)} FROM {self.table}{where_sql} ORDER BY 1"
+        return self._query(sql, params)[column].tolist()
+
+    def histogram(self, column, maxbins=30, where=None):
+        # Two passes over the column: its range, then counts per bin. Only the
+        # bins come back from DuckDB.
+        value = f"CAST({_quote(column)} AS DOUBLE)"
+        where_sql, params = self._where_sql(where, extra=[f"{_quote(column)} IS NOT NULL", f"isfinite({value})"])
+        low, high, count = self._cursor().execute(
+            f"SELECT MIN({value}), MAX({value}), COUNT(*) FROM {self.table}{where_sql}", params).fetchone()
+        if not count or low == high:
+            return _empty_histogram(low, count)
+        start, step, n_bins = histogram_layout(low, high, maxbins)
+        bin_sql = f"LEAST(GREATEST(CAST(FLOOR(({value} - ?) / ?) AS BIGINT), 0), ?)"
+        rows = self._cursor().execute(
+            f"SELECT {bin_sql} AS bin, COUNT(*) AS n FROM {self.table}{where_sql} GROUP BY 1",
+            [start, step, n_bins - 1] + params).fetchall()
+        counts = np.zeros(n_bins, dtype=np.int64)
+        for index, n in rows:
+            counts[index] = n
+        return _histogram_frame(start + step * np.arange(n_bins + 1), counts)
+
+    def select(self, columns, where=None, limit=None):
+        where_sql, params = self._where_sql(where)
+        sql = f"SELECT {', '.join(_quote(c) for c in columns)} FROM {self.table}{where_sql}"
+        if limit is not None:
+            sql += f" LIMIT {int(limit)}"
+        return self._query(sql, params)
+
+
+# Columns derived at build time so the SQL backend exposes the same schema as
+# data_layer.add_derived_features().
+_DERIVED_SQL = {
+    "month": "monthname(CAST(transaction_date AS DATE))",
+    "day_of_month": "CAST(dayofmonth(CAST(transaction_date AS DATE)) AS TINYINT)",
+    "weekday": "dayname(CAST(transaction_date AS DATE))",
+    "is_weekend": "isodow(CAST(transaction_date AS DATE)) >= 6",
+    "midnight_txn_count": "CAST(txn_hour BETWEEN 0 AND 5 AS TINYINT)",
+}
+
+
+def csv_to_parquet(csv_path, parquet_path):
+    """Convert the features CSV to Parquet with DuckDB (streaming, no pandas copy)."""
+    import duckdb
+    con = duckdb.connect()
+    con.execute(f"COPY (SELECT * FROM read_csv_auto({_literal(csv_path)})) "
+                f"TO {_literal(parquet_path)} (FORMAT PARQUET)")
+    con.close()
+
+
+def build_database(parquet_path, db_path, table=TABLE_NAME):
+    """
+    Build (or rebuild) the DuckDB features table from the Parquet features.
+
+    Args:
+        parquet_path (str): Parquet file (or glob) with the transaction features.
+        db_path (str): Output DuckDB file.
+        table (str): Table name to create.
+    """
+    import duckdb
+    con = duckdb.connect(db_path)
+    source = f"read_parquet({_literal(parquet_path)})"
+    existing = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {source}").fetchall()]
+    derived = {name: expr for name, expr in _DERIVED_SQL.items()
+               if name != "midnight_txn_count" or "txn_hour" in existing}
+    clashing = [c for c in existing if c in derived or c == "transaction_date"]
+    exclude = f" EXCLUDE ({', '.join(_quote(c) for c in clashing)})" if clashing else ""
+    select = [f"* {exclude}".strip(), "CAST(transaction_date AS DATE) AS transaction_date"]
+    select += [f"{expr} AS {_quote(name)}" for name, expr in derived.items()]
+    con.execute(f"CREATE OR REPLACE TABLE {_quote(table)} AS SELECT {', '.join(select)} FROM {source}")
+    con.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the DuckDB backend for the TransACT dashboard.")
+    parser.add_argument("features", help="imi_features.csv or an existing Parquet file")
+    parser.add_argument("--parquet", default="imi_features.parquet", help="Parquet file to write/read")
+    parser.add_argument("--db", default="imi_features.duckdb", help="DuckDB file to create")
+    args = parser.parse_args(argv)
+
+    parquet_path = args.features
+    if args.features.lower().endswith(".csv"):
+        print(f"Converting {args.features} to {args.parquet}...")
+        csv_to_parquet(args.features, args.parquet)
+        parquet_path = args.parquet
+    print(f"Building {args.db} from {parquet_path}...")
+    build_database(parquet_path, args.db)
+    print("Done.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,413 @@
+# sandbox.py
+"""
+Out-of-process, resource-bounded execution of chatbot-generated pandas code.
+
+The pandas agent's python_repl_ast tool ran generated code inside the
+Streamlit process. A runaway loop, or a cross join that exhausts memory,
+then froze or killed the dashboard for every user. SandboxExecutor runs that
+code in separate worker processes instead:
+
+* the DataFrame is copied once into a shared-memory block (SharedFrame).
+  Every worker maps it as read-only numpy arrays, so no per-worker or
+  per-call copy is made and generated code cannot modify the data. Text and
+  other object columns are stored as factorized codes; a worker rebuilds
+  them once as read-only object arrays pointing at one copy of each
+  distinct value. Categoricals (with their categories and ordering) and
+  nullable integer / float / boolean columns keep their dtypes;
+* each call gets a CPU-time budget (RLIMIT_CPU, raising inside the code)
+  and a wall-clock timeout (the worker is killed and replaced). Each worker
+  also has an address-space cap (RLIMIT_AS) on top of what it uses once the
+  frame is mapped;
+* only text crosses back: stdout plus the value of the last expression,
+  rendered with bounded pandas display options and cut to max_chars;
+* workers are shared by sessions up to max_workers, and a call waiting for a
+  free worker is bounded by the same timeout. One slow question therefore
+  only ties up its own worker.
+
+Code runs like the agent's REPL tool: statements are executed and the value
+of a trailing expression is returned, with ``df``, ``pd`` and ``np`` in
+scope. Each call sees a fresh shallow copy of ``df``, so columns it adds do
+not leak into later calls.
+"""
+import ast
+import contextlib
+import io
+import math
+import multiprocessing as mp
+import threading
+import time
+import weakref
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+
+TIMEOUT_S = 30.0
+CPU_SECONDS = 20
+MEMORY_MB = 1024
+MAX_CHARS = 4000
+MAX_WORKERS = 2
+DISPLAY_ROWS = 50
+DISPLAY_COLUMNS = 30
+_ALIGN = 64
+
+
+def _stored_column(values):
+    """
+    (arrays to place in shared memory, how to rebuild the column).
+
+    numpy-native numeric / bool / datetime columns are stored as they are.
+    Categoricals keep their codes, categories and ordering; nullable
+    integer / float / boolean columns their values plus the NA mask.
+    Everything else (object, strings, other extension dtypes) is stored as
+    factorize codes plus the uniques, and extension dtypes are cast back.
+    """
+    dtype = values.dtype
+    if isinstance(dtype, np.dtype) and dtype.kind in "biufcmM":
+        return [np.ascontiguousarray(values.to_numpy())], {"encoding": "plain"}
+    if isinstance(dtype, pd.CategoricalDtype):
+        return [np.ascontiguousarray(values.cat.codes.to_numpy())], {
+            "encoding": "categorical", "categories": list(dtype.categories),
+            "categories_dtype": dtype.categories.dtype.str if isinstance(dtype.categories.dtype, np.dtype) else None,
+            "ordered": bool(dtype.ordered)}
+    if isinstance(values.array, pd.api.extensions.ExtensionArray) and dtype.kind in "biuf" \
+            and hasattr(dtype, "numpy_dtype"):
+        mask = values.isna().to_numpy()
+        data = values.to_numpy(dtype=dtype.numpy_dtype, na_value=dtype.numpy_dtype.type(0))
+        return [np.ascontiguousarray(data), mask], {"encoding": "masked", "extension_dtype": str(dtype)}
+    codes, uniques = pd.factorize(values, use_na_sentinel=True)
+    codes = codes.astype(np.int32 if len(uniques) < 2**31 else np.int64)
+    return [codes], {"encoding": "factorized", "uniques": list(uniques),
+                     "extension_dtype": None if dtype == object else str(dtype)}
+
+
+def _rebuild_column(arrays, meta):
+    """Inverse of _stored_column(), over read-only views of the stored arrays."""
+    encoding = meta["encoding"]
+    if encoding == "plain":
+        return arrays[0]
+    if encoding == "categorical":
+        categories = meta["categories"]
+        if meta["categories_dtype"] is not None:
+            categories = pd.Index(np.array(categories, dtype=np.dtype(meta["categories_dtype"])))
+        return pd.Categorical.from_codes(arrays[0], categories=categories, ordered=meta["ordered"])
+    if encoding == "masked":
+        array_type = pd.api.types.pandas_dtype(meta["extension_dtype"]).construct_array_type()
+        return array_type(arrays[0], arrays[1])
+    uniques = np.array(meta["uniques"] + [np.nan], dtype=object)
+    values = uniques[arrays[0]]
+    values.flags.writeable = False
+    if meta["extension_dtype"] is not None:
+        # One converted copy per worker (e.g. string, tz-aware datetimes).
+        return pd.array(values, dtype=meta["extension_dtype"])
+    return values
+
+
+class SharedFrame:
+    """
+    A DataFrame copied once into a shared-memory block.
+
+    Attributes:
+        spec (dict): Picklable description (block name, column layout)
+            that attach() turns back into a read-only DataFrame.
+    """
+
+    def __init__(self, df):
+        stored, layout, offset = [], [], 0
+        entries = [("column", name, df[name]) for name in df.columns]
+        if not isinstance(df.index, pd.RangeIndex):
+            entries.append(("index", df.index.name, pd.Series(df.index)))
+        for kind, name, values in entries:
+            arrays, meta = _stored_column(values)
+            parts = []
+            for array in arrays:
+                parts.append({"dtype": array.dtype.str, "offset": offset})
+                stored.append(array)
+                offset += -(-array.nbytes // _ALIGN) * _ALIGN
+            layout.append({"kind": kind, "name": name, "arrays": parts, **meta})
+        self.shm = shared_memory.SharedMemory(create=True, size=max(offset, 1))
+        parts = [part for entry in layout for part in entry["arrays"]]
+        for array, part in zip(stored, parts):
+            target = np.ndarray(array.shape, dtype=array.dtype, buffer=self.shm.buf, offset=part["offset"])
+            target[:] = array
+            del target
+        self.spec = {"name": self.shm.name, "n_rows": len(df), "layout": layout,
+                     "range_index": (df.index.start, df.index.step) if isinstance(df.index, pd.RangeIndex)
+                     else None}
+
+    def close(self):
+        """Release and remove the shared-memory block."""
+        self.shm.close()
+        with contextlib.suppress(FileNotFoundError):
+            self.shm.unlink()
+
+
+def attach(spec):
+    """
+    Map a SharedFrame in this process.
+
+    Returns:
+        tuple: (SharedMemory handle, read-only DataFrame viewing it).
+    """
+    # Workers share their parent's resource tracker, so attaching does not
+    # make them responsible for the block; SharedFrame.close() removes it.
+    shm = shared_memory.SharedMemory(name=spec["name"])
+    n = spec["n_rows"]
+    columns, index = {}, None
+    for entry in spec["layout"]:
+        arrays = []
+        for part in entry["arrays"]:
+            array = np.ndarray((n,), dtype=np.dtype(part["dtype"]), buffer=shm.buf, offset=part["offset"])
+            array.flags.writeable = False
+            arrays.append(array)
+        values = _rebuild_column(arrays, entry)
+        if entry["kind"] == "index":
+            index = pd.Index(values, name=entry["name"])
+        else:
+            columns[entry["name"]] = values
+    if index is None:
+        start, step = spec["range_index"]
+        index = pd.RangeIndex(start, start + step * n, step)
+    return shm, pd.DataFrame(columns, index=index, copy=False)
+
+
+class CPUTimeExceeded(Exception):
+    """Raised (via SIGXCPU) in a worker whose call used up its CPU budget."""
+
+
+def _address_space():
+    """This process's current virtual memory size in bytes."""
+    with open("/proc/self/status") as status:
+        for line in status:
+            if line.startswith("VmSize:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+
+def _set_limits(memory_mb):
+    import resource
+    import signal
+
+    def on_xcpu(signum, frame):
+        raise CPUTimeExceeded()
+
+    signal.signal(signal.SIGXCPU, on_xcpu)
+    if memory_mb:
+        with contextlib.suppress(OSError, ValueError):
+            limit = _address_space() + memory_mb * 2**20
+            resource.setrlimit(resource.RLIMIT_AS, (limit, resource.getrlimit(resource.RLIMIT_AS)[1]))
+
+
+def _cpu_budget(seconds):
+    """Arm (seconds) or disarm (None) this process's CPU-time soft limit."""
+    import resource
+    hard = resource.getrlimit(resource.RLIMIT_CPU)[1]
+    if seconds is None:
+        resource.setrlimit(resource.RLIMIT_CPU, (resource.RLIM_INFINITY, hard))
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = math.ceil(usage.ru_utime + usage.ru_stime + seconds)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _render(value):
+    with pd.option_context("display.max_rows", DISPLAY_ROWS, "display.max_columns", DISPLAY_COLUMNS,
+                           "display.width", 200, "display.max_colwidth", 80):
+        return str(value)
+
+
+def _truncate(text, max_chars):
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars] + f"\n... (output truncated, {len(text) - max_chars:,} more characters)"
+
+
+def execute(code, df, max_chars=MAX_CHARS):
+    """
+    Run ``code`` against ``df`` the way the agent's REPL tool does.
+
+    Returns:
+        str: Captured stdout followed by the trailing expression's value (or
+        "<ErrorType>: message"), at most about ``max_chars`` characters.
+    """
+    code = code.strip().strip("`")
+    if code.startswith("python\n"):
+        code = code[len("python\n"):]
+    scope = {"df": df.copy(deep=False), "pd": pd, "np": np}
+    output = io.StringIO()
+    try:
+        tree = ast.parse(code)
+        last = tree.body[-1] if tree.body and isinstance(tree.body[-1], ast.Expr) else None
+        body = ast.Module(tree.body[:-1] if last else tree.body, type_ignores=[])
+        with contextlib.redirect_stdout(output):
+            exec(compile(body, "<chatbot>", "exec"), scope)
+            value = eval(compile(ast.Expression(last.value), "<chatbot>", "eval"), scope) if last else None
+        text = output.getvalue()
+        if value is not None:
+            text += _render(value)
+    except CPUTimeExceeded:
+        text = output.getvalue() + "CPUTimeExceeded: the code used up its CPU-time budget"
+    except MemoryError:
+        text = output.getvalue() + "MemoryError: the code exceeded the sandbox memory limit"
+    except Exception as e:
+        text = output.getvalue() + f"{type(e).__name__}: {e}"
+    return _truncate(text, max_chars)
+
+
+def _worker_main(conn, spec, cpu_seconds, memory_mb, max_chars):
+    shm, df = attach(spec)
+    _set_limits(memory_mb)
+    while True:
+        try:
+            code = conn.recv()
+        except (EOFError, OSError):
+            break
+        if code is None:
+            break
+        _cpu_budget(cpu_seconds)
+        try:
+            result = execute(code, df, max_chars)
+        finally:
+            _cpu_budget(None)
+        conn.send(result)
+
+
+class _Worker:
+    __slots__ = ("process", "conn")
+
+    def __init__(self, process, conn):
+        self.process = process
+        self.conn = conn
+
+    def kill(self):
+        if self.process is None:
+            return
+        with contextlib.suppress(Exception):
+            self.conn.close()
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join(timeout=5)
+
+
+def _shutdown(frame, workers):
+    for worker in list(workers):
+        worker.kill()
+    workers.clear()
+    frame.close()
+
+
+class SandboxExecutor:
+    """
+    Pool of sandboxed worker processes over one shared, read-only DataFrame.
+
+    Attributes:
+        stats (dict): runs, timeouts, crashes and busy (calls that found no
+            free worker in time).
+    """
+
+    def __init__(self, df, max_workers=MAX_WORKERS, timeout=TIMEOUT_S, cpu_seconds=CPU_SECONDS,
+                 memory_mb=MEMORY_MB, max_chars=MAX_CHARS, prestart=1, mp_context="spawn"):
+        """
+        Args:
+            df (pd.DataFrame): The frame generated code runs against.
+            max_workers (int): Concurrent executions (worker processes).
+            timeout (float): Wall-clock seconds per call, including waiting
+                for a free worker.
+            cpu_seconds (int): CPU-time budget per call.
+            memory_mb (int): Address space a worker may add after mapping
+                the frame; 0 disables the cap.
+            max_chars (int): Size bound of a returned result.
+            prestart (int): Workers started right away, so the first
+                question does not pay the process start-up.
+            mp_context (str): multiprocessing start method.
+        """
+        self.frame = SharedFrame(df)
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cpu_seconds = cpu_seconds
+        self.memory_mb = memory_mb
+        self.max_chars = max_chars
+        self.stats = {"runs": 0, "timeouts": 0, "crashes": 0, "busy": 0}
+        self._context = mp.get_context(mp_context)
+        self._idle = []
+        self._workers = set()
+        self._condition = threading.Condition()
+        self._finalizer = weakref.finalize(self, _shutdown, self.frame, self._workers)
+        for _ in range(min(prestart, max_workers)):
+            self._idle.append(self._spawn())
+
+    def _spawn(self):
+        parent, child = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main, daemon=True, name="chatbot-sandbox",
+            args=(child, self.frame.spec, self.cpu_seconds, self.memory_mb, self.max_chars))
+        process.start()
+        child.close()
+        worker = _Worker(process, parent)
+        with self._condition:
+            self._workers.add(worker)
+        return worker
+
+    def _acquire(self, deadline):
+        with self._condition:
+            while not self._idle and len(self._workers) >= self.max_workers:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._condition.wait(remaining)
+            if self._idle:
+                return self._idle.pop()
+            # Reserve the slot before spawning outside the lock.
+            placeholder = _Worker(None, None)
+            self._workers.add(placeholder)
+        try:
+            return self._spawn()
+        finally:
+            with self._condition:
+                self._workers.discard(placeholder)
+
+    def _release(self, worker, healthy):
+        with self._condition:
+            if healthy:
+                self._idle.append(worker)
+            else:
+                self._workers.discard(worker)
+            self._condition.notify()
+        if not healthy:
+            worker.kill()
+
+    def run(self, code, timeout=None):
+        """
+        Execute ``code`` in a sandbox worker.
+
+        Returns:
+            str: The bounded result text, or a message saying why the call
+            was stopped (timeout, CPU or memory limit, worker crash).
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        worker = self._acquire(deadline)
+        if worker is None:
+            self.stats["busy"] += 1
+            return f"Sandbox busy: no worker became free within {timeout:g}s; try again."
+        self.stats["runs"] += 1
+        try:
+            worker.conn.send(code)
+            if worker.conn.poll(max(deadline - time.monotonic(), 0)):
+                result = worker.conn.recv()
+                self._release(worker, True)
+                return result
+        except (EOFError, OSError):
+            self.stats["crashes"] += 1
+            worker.process.join(timeout=1)
+            self._release(worker, False)
+            return f"Execution stopped: the sandbox worker exited (code {worker.process.exitcode})."
+        self.stats["timeouts"] += 1
+        self._release(worker, False)
+        return f"Execution stopped: no result within {timeout:g}s."
+
+    def close(self):
+        """Stop every worker and remove the shared-memory block."""
+        self._finalizer()
@@ -0,0 +1,183 @@
+# stub_llm_server.py
+"""
+Local stand-in for the Ollama server TransBot talks to.
+
+It answers Ollama's /api/chat and /api/generate, streamed (NDJSON) or not,
+with a fixed ReAct-style final answer after an optional delay. It also
+counts the requests it has served (GET /stats). TransBot can then be run and
+timed without a model. The response cache can be checked by confirming that
+a repeated question does not reach the server.
+
+Usage:
+    python stub_llm_server.py [--port 8502] [--delay 0.5] [--answer TEXT]
+    TRANSBOT_LLM_URL=http://localhost:8502/ streamlit run app.py
+
+    # per-turn latency and time to first token of main_chatbot.answer()
+    # against the stub (streamed through the same path as the chat page)
+    python stub_llm_server.py --bench data.csv [--token-delay 0.05] [--question "How many rows?" ...]
+"""
+
+import argparse
+import json
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_ANSWER = "The data has been analysed."
+
+
+class StubLLMServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server speaking the subset of the Ollama API ChatOllama uses.
+
+    Attributes:
+        answer (str): Final answer returned to every prompt.
+        delay (float): Seconds to wait before the first token.
+        token_delay (float): Seconds between streamed tokens.
+        requests (int): Number of generation requests served.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 8502), answer=DEFAULT_ANSWER, delay=0.0, token_delay=0.0):
+        super().__init__(address, _Handler)
+        self.answer = answer
+        self.delay = delay
+        self.token_delay = token_delay
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def completion(self):
+        """The model output: a ReAct final answer the agent's parser accepts."""
+        return f"Thought: I now know the final answer\nFinal Answer: {self.answer}"
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def handle_error(self, request, client_address):
+        # A client whose turn was cancelled or timed out hangs up mid-stream.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def start(self):
+        """Serve from a daemon thread; returns self."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/api/tags":
+            self._send_json({"models": [{"name": "stub"}]})
+        elif self.path.rstrip("/") == "/stats":
+            self._send_json({"requests": self.server.requests})
+        else:
+            self._send_json({"status": "Ollama is running"})
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        request = json.loads(self.rfile.read(length) or b"{}")
+        if self.path.rstrip("/") not in ("/api/chat", "/api/generate"):
+            self._send_json({"error": f"unknown endpoint {self.path}"}, status=404)
+            return
+        self.server.count_request()
+        chat = self.path.rstrip("/") == "/api/chat"
+        model = request.get("model", "stub")
+        time.sleep(self.server.delay)
+
+        def chunk(text, done):
+            created = datetime.now(timezone.utc).isoformat()
+            payload = {"model": model, "created_at": created, "done": done}
+            if chat:
+                payload["message"] = {"role": "assistant", "content": text}
+            else:
+                payload["response"] = text
+            if done:
+                payload.update(done_reason="stop", prompt_eval_count=0, eval_count=0)
+            return payload
+
+        text = self.server.completion()
+        if not request.get("stream", True):
+            self._send_json(chunk(text, True))
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.end_headers()
+        for token in text.split(" "):
+            self.wfile.write((json.dumps(chunk(token + " ", False)) + "\n").encode())
+            self.wfile.flush()
+            time.sleep(self.server.token_delay)
+        self.wfile.write((json.dumps(chunk("", True)) + "\n").encode())
+
+
+def bench(path, questions, server):
+    """
+    Ask ``questions`` over the CSV at ``path`` in two identical conversations;
+    print per-turn latency and TTFT. The second conversation is served from
+    the response cache.
+    """
+    import pandas as pd
+    from main_chatbot import ResponseCache, answer, dataframe_fingerprint, get_llm
+
+    df = pd.read_csv(path)
+    start = time.perf_counter()
+    state = {"df": df, "df_fingerprint": dataframe_fingerprint(df), "chat_history": []}
+    print(f"fingerprint of {len(df):,} rows: {time.perf_counter() - start:.3f}s")
+    llm, cache = get_llm("stub", server.url), ResponseCache()
+    for round_name in ("first", "repeat"):
+        state["chat_history"] = []
+        for question in questions:
+            state["chat_history"].append({"role": "user", "content": question})
+            before = server.requests
+            output, metrics = answer(state, question, llm=llm, model="stub", cache=cache)
+            state["chat_history"].append({"role": "assistant", "content": output})
+            ttft = "   -   " if metrics["ttft_s"] is None else f"{metrics['ttft_s']:7.3f}"
+            print(f"{round_name:>6} {metrics['latency_s']:7.3f}s ttft={ttft}s cached={metrics['cached']!s:5} "
+                  f"llm_requests={server.requests - before}  {question}")
+    print(f"cache hits {cache.hits}, misses {cache.misses}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Stub Ollama server for TransBot.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8502)
+    parser.add_argument("--answer", default=DEFAULT_ANSWER)
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds between streamed tokens")
+    parser.add_argument("--bench", metavar="CSV", help="Time main_chatbot turns over this file and exit")
+    parser.add_argument("--question", action="append", help="Question for --bench (repeatable)")
+    args = parser.parse_args(argv)
+
+    port = 0 if args.bench else args.port
+    server = StubLLMServer((args.host, port), args.answer, args.delay, args.token_delay)
+    if args.bench:
+        server.start()
+        bench(args.bench, args.question or ["How many rows are there?", "Which column has the most nulls?"],
+              server)
+        server.shutdown()
+        return
+    print(f"Stub LLM listening on {server.url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
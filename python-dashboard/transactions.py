@@ -1,24 +1,20 @@
 # transactions.py
 import streamlit as st
-import pandas as pd
 import altair as alt
-import plotly.express as px
+from chart_data import histogram_chart
+from data_layer import MONTH_ORDER, WEEKDAY_ORDER
 
-def display_transactions_analysis(df):
+def display_transactions_analysis(backend):
     """
     Display a comprehensive transaction analysis dashboard. Users can:
       - Filter by a location field (province, city, or country) via dropdowns.
       - Filter by transaction type using a multiselect (from the 'source' column).
       - Then see various charts arranged into rows/columns.
+    Every chart asks the query backend for its aggregate under the current
+    filters; calendar columns (month, day_of_month, weekday, is_weekend) are
+    precomputed by the backend.
     """
     st.header("📈 Transaction Analysis")
-    
-    # Prepare date/time columns
-    df['transaction_date'] = pd.to_datetime(df['transaction_date'])
-    df['month'] = df['transaction_date'].dt.month_name()
-    df['day_of_month'] = df['transaction_date'].dt.day
-    df['weekday'] = df['transaction_date'].dt.day_name()
-    df['is_weekend'] = df['transaction_date'].dt.weekday >= 5
 
     # -------------------------
     # LOCATION FILTERS (Single Field)
@@ -37,7 +33,7 @@ def display_transactions_analysis(df):
         default_value = "TORONTO"
     elif location_field == "trans_country":
         default_value = "Canada"
-    unique_vals = sorted(df[location_field].dropna().unique())
+    unique_vals = backend.distinct(location_field)
     # Use the default if present; otherwise, the first available value.
     if default_value in unique_vals:
         default_index = unique_vals.index(default_value)
@@ -48,7 +44,6 @@ def display_transactions_analysis(df):
         options=unique_vals,
         index=default_index
     )
-    filtered_df = df[df[location_field] == selected_location]
 
     # -------------------------
     # TRANSACTION TYPE FILTER (Multi-select)
@@ -61,36 +56,29 @@ def display_transactions_analysis(df):
         options=transaction_types,
         default=transaction_types
     )
-    if selected_types:
-        filtered_df = filtered_df[filtered_df['source'].isin(selected_types)]
-    
+    # An empty type selection means no type filter, as before.
+    filters = {location_field: selected_location, 'source': selected_types}
+    outlier_filters = {**filters, 'high_txn_outlier': 1}
+    row_count = {'count': ('transaction_id', 'size')}
+
     # --------------------------------------
-    # Now proceed with the same charts using filtered_df
+    # Now proceed with the same charts, each aggregated under `filters`
     # --------------------------------------
     
     # Row 1: Monthly Trend & Outlier Transactions by Day of Month
     col1, col2 = st.columns(2)
     with col1:
         st.markdown("### Monthly Trend of Outlier Transactions")
-        monthly_outliers = (
-            filtered_df[filtered_df['high_txn_outlier'] == 1]
-            .groupby('month').size().reset_index(name='count')
-        )
-        month_order = ["January", "February", "March", "April", "May", "June",
-                       "July", "August", "September", "October", "November", "December"]
-        monthly_outliers['month'] = pd.Categorical(monthly_outliers['month'], categories=month_order, ordered=True)
+        monthly_outliers = backend.aggregate(['month'], row_count, where=outlier_filters)
         monthly_chart = alt.Chart(monthly_outliers).mark_line(point=True).encode(
-            x=alt.X('month:N', sort=month_order, title="Month"),
+            x=alt.X('month:N', sort=MONTH_ORDER, title="Month"),
             y=alt.Y('count:Q', title="Outlier Transactions"),
             tooltip=['month', 'count']
         ).properties(width=300, height=300)
         st.altair_chart(monthly_chart, use_container_width=True)
     with col2:
         st.markdown("### Outlier Transactions by Day of the Month")
-        daily_outliers = (
-            filtered_df[filtered_df['high_txn_outlier'] == 1]
-            .groupby('day_of_month').size().reset_index(name='count')
-        )
+        daily_outliers = backend.aggregate(['day_of_month'], row_count, where=outlier_filters)
         daily_chart = alt.Chart(daily_outliers).mark_bar().encode(
             x=alt.X('day_of_month:O', title="Day of Month"),
             y=alt.Y('count:Q', title="Outlier Transactions"),
@@ -102,24 +90,16 @@ def display_transactions_analysis(df):
     col1, col2 = st.columns(2)
     with col1:
         st.markdown("### Outlier Transactions by Day of the Week")
-        weekday_outliers = (
-            filtered_df[filtered_df['high_txn_outlier'] == 1]
-            .groupby('weekday').size().reset_index(name='count')
-        )
-        weekday_order = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
-        weekday_outliers['weekday'] = pd.Categorical(weekday_outliers['weekday'], categories=weekday_order, ordered=True)
+        weekday_outliers = backend.aggregate(['weekday'], row_count, where=outlier_filters)
         weekday_chart = alt.Chart(weekday_outliers).mark_bar().encode(
-            x=alt.X('weekday:N', sort=weekday_order, title="Day of Week"),
+            x=alt.X('weekday:N', sort=WEEKDAY_ORDER, title="Day of Week"),
             y=alt.Y('count:Q', title="Outlier Transactions"),
             tooltip=['weekday', 'count']
         ).properties(width=300, height=300)
         st.altair_chart(weekday_chart, use_container_width=True)
     with col2:
         st.markdown("### Hourly Trend of Outlier Transactions")
-        hourly_outliers = (
-            filtered_df[filtered_df['high_txn_outlier'] == 1]
-            .groupby('txn_hour').size().reset_index(name='count')
-        )
+        hourly_outliers = backend.aggregate(['txn_hour'], row_count, where=outlier_filters)
         hourly_chart = alt.Chart(hourly_outliers).mark_line(point=True).encode(
             x=alt.X('txn_hour:O', title="Hour of Day"),
             y=alt.Y('count:Q', title="Outlier Transactions"),
@@ -129,10 +109,7 @@ def display_transactions_analysis(df):
 
     # Row 3: Weekday vs. Weekend Outlier Trends (full width)
     st.markdown("### Weekday vs. Weekend Outlier Trends")
-    weekend_outliers = (
-        filtered_df[filtered_df['high_txn_outlier'] == 1]
-        .groupby('is_weekend').size().reset_index(name='count')
-    )
+    weekend_outliers = backend.aggregate(['is_weekend'], row_count, where=outlier_filters)
     weekend_outliers['is_weekend'] = weekend_outliers['is_weekend'].map({True: "Weekend", False: "Weekday"})
     weekend_chart = alt.Chart(weekend_outliers).mark_bar().encode(
         x=alt.X('is_weekend:N', title="Day Type"),
@@ -142,17 +119,21 @@ def display_transactions_analysis(df):
     st.altair_chart(weekend_chart, use_container_width=True)
 
     # Row 4: High vs. Low Transaction Outliers Summary (metrics)
+    outlier_metrics = {'high': ('high_txn_outlier', 'sum')}
+    if backend.has_column('low_txn_outlier'):
+        outlier_metrics['low'] = ('low_txn_outlier', 'sum')
+    outlier_totals = backend.aggregate([], outlier_metrics, where=filters).iloc[0]
     col1, col2 = st.columns(2)
     with col1:
-        high_outliers_count = filtered_df['high_txn_outlier'].sum()
+        high_outliers_count = outlier_totals['high']
         st.metric("Total High Outlier Transactions", f"{int(high_outliers_count):,}")
     with col2:
-        low_outliers_count = filtered_df['low_txn_outlier'].sum() if 'low_txn_outlier' in filtered_df.columns else 0
+        low_outliers_count = outlier_totals.get('low', 0)
         st.metric("Total Low Outlier Transactions", f"{int(low_outliers_count):,}")
 
     # Row 6: Transaction Trends Over Time (full width)
     st.markdown("### Transaction Trends Over Time")
-    time_trend = filtered_df.groupby('transaction_date').size().reset_index(name='count')
+    time_trend = backend.aggregate(['transaction_date'], row_count, where=filters)
     time_chart = alt.Chart(time_trend).mark_line().encode(
         x=alt.X('transaction_date:T', title="Date"),
         y=alt.Y('count:Q', title="Total Transactions"),
@@ -162,7 +143,7 @@ def display_transactions_analysis(df):
 
     # Row 7: Transaction Activity by Hour of the Day (full width)
     st.markdown("### Transaction Activity by Hour of the Day")
-    hour_activity = filtered_df.groupby('txn_hour').size().reset_index(name='count')
+    hour_activity = backend.aggregate(['txn_hour'], row_count, where=filters)
     hour_activity_chart = alt.Chart(hour_activity).mark_bar().encode(
         x=alt.X('txn_hour:O', title="Hour of Day"),
         y=alt.Y('count:Q', title="Transaction Count"),
@@ -172,24 +153,16 @@ def display_transactions_analysis(df):
 
     # Row 8: Transaction Amount Distribution (full width)
     st.markdown("### Transaction Amount Distribution")
-    amount_chart = (
-        alt.Chart(filtered_df)
-        .mark_bar()
-        .encode(
-            x=alt.X('amount_cad:Q', bin=alt.Bin(maxbins=30), title="Transaction Amount (CAD)"),
-            y=alt.Y('count()', title="Frequency"),
-            tooltip=['count()']
-        )
-        .properties(width=600, height=300)
-    )
+    amounts = backend.histogram('amount_cad', maxbins=30, where=filters)
+    amount_chart = histogram_chart(amounts, "Transaction Amount (CAD)").properties(width=600, height=300)
     st.altair_chart(amount_chart, use_container_width=True)
 
     # Row 9: Flagged Transactions by Payment Method (full width)
     st.markdown("### Flagged Transactions by Payment Method")
-    if 'debit_credit' in filtered_df.columns:
-        payment_flag = filtered_df.groupby('debit_credit').agg(
-            flagged_transactions=('high_txn_outlier', 'sum')
-        ).reset_index()
+    if backend.has_column('debit_credit'):
+        payment_flag = backend.aggregate(
+            ['debit_credit'], {'flagged_transactions': ('high_txn_outlier', 'sum')}, where=filters
+        )
         payment_chart = alt.Chart(payment_flag).mark_bar().encode(
             x=alt.X('debit_credit:N', title="Payment Method"),
             y=alt.Y('flagged_transactions:Q', title="Flagged Transactions"),
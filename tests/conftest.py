@@ -0,0 +1,7 @@
+import os
+import sys
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+for directory in ("Code", "Scripts", "python-dashboard"):
+    sys.path.insert(0, os.path.join(ROOT, directory))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
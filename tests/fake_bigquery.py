@@ -0,0 +1,140 @@
+"""
+In-memory stand-in for the part of google.cloud.bigquery.Client that
+BigQueryExport.py uses (see its module docstring).
+"""
+
+import types
+
+import pyarrow as pa
+
+
+class FakeField:
+    def __init__(self, name, field_type, mode="NULLABLE"):
+        self.name = name
+        self.field_type = field_type
+        self.mode = mode
+
+
+class FakeRow:
+    def __init__(self, values):
+        self._values = values
+
+    def items(self):
+        return self._values.items()
+
+
+class FakeTable:
+    def __init__(self, table_id, schema, rows):
+        self.table_id = table_id
+        self.schema = schema
+        self.rows = rows
+
+    @property
+    def num_rows(self):
+        return len(self.rows)
+
+
+class PageFailure(Exception):
+    """Raised by a FakeClient set to fail part way through a table."""
+
+
+class FakeRowIterator:
+    """list_rows() result serving Row pages (the path without the Storage API)."""
+
+    def __init__(self, client, rows, page_size):
+        self.client = client
+        self._rows = rows
+        self._page_size = page_size
+
+    def _chunks(self):
+        for start in range(0, len(self._rows), self._page_size):
+            if self.client.fail_after_pages is not None and self.client.pages_served >= self.client.fail_after_pages:
+                raise PageFailure(f"failed after {self.client.pages_served} pages")
+            self.client.pages_served += 1
+            yield self._rows[start:start + self._page_size]
+
+    @property
+    def pages(self):
+        for chunk in self._chunks():
+            yield [FakeRow(row) for row in chunk]
+
+
+class FakeArrowRowIterator(FakeRowIterator):
+    """list_rows() result that also offers Arrow record batches, like the real client."""
+
+    def to_arrow_iterable(self):
+        for chunk in self._chunks():
+            yield pa.RecordBatch.from_pylist(chunk)
+
+
+class FakeClient:
+    """
+    Tables held as lists of dicts.
+
+    Attributes:
+        tables (dict): "project.dataset.table" -> FakeTable.
+        arrow (bool): Serve pages through to_arrow_iterable().
+        fail_after_pages (int): Raise PageFailure once this many pages have
+            been served (None: never).
+        list_rows_calls (list): (table_id, start_index) of every list_rows() call.
+    """
+
+    def __init__(self, tables, arrow=False, fail_after_pages=None):
+        self.tables = {table.table_id: table for table in tables}
+        self.arrow = arrow
+        self.fail_after_pages = fail_after_pages
+        self.pages_served = 0
+        self.list_rows_calls = []
+
+    def list_datasets(self, project):
+        datasets = sorted({table_id.split(".")[1] for table_id in self.tables if table_id.startswith(project + ".")})
+        return [types.SimpleNamespace(dataset_id=dataset) for dataset in datasets]
+
+    def list_tables(self, dataset_id):
+        return [types.SimpleNamespace(table_id=table_id.split(".")[2]) for table_id in sorted(self.tables)
+                if table_id.split(".")[1] == dataset_id]
+
+    def get_table(self, table_id):
+        return self.tables[table_id]
+
+    def list_rows(self, table, start_index=0, page_size=None):
+        self.list_rows_calls.append((table.table_id, start_index))
+        iterator = FakeArrowRowIterator if self.arrow else FakeRowIterator
+        return iterator(self, table.rows[start_index:], page_size or len(table.rows) or 1)
+
+
+class FakeQueryJob:
+    """query() result: statement_type plus result().to_arrow()."""
+
+    def __init__(self, statement_type, table):
+        self.statement_type = statement_type
+        self._table = table
+
+    def result(self):
+        return self
+
+    def to_arrow(self):
+        return self._table
+
+
+class FakeQueryClient:
+    """
+    Stand-in for bigquery.Client.query() as used by BiqueryAPI.run_query().
+
+    Every query returns a one-column table numbered by the call, so a cached
+    result can be told from a fresh one. The statement type is the query's
+    first keyword (SELECT / INSERT / ...).
+
+    Attributes:
+        queries (list): (sql, job_config) of every query sent.
+    """
+
+    def __init__(self, project="imi-datathon", location=None):
+        self.project = project
+        self.location = location
+        self.queries = []
+
+    def query(self, query, job_config=None):
+        self.queries.append((query, job_config))
+        statement_type = query.split(None, 1)[0].upper() if query.strip() else "SELECT"
+        return FakeQueryJob(statement_type, pa.table({"call": [len(self.queries)]}))
@@ -0,0 +1,134 @@
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+import BigQueryExport
+from fake_bigquery import FakeClient, FakeField, FakeTable, PageFailure
+
+TABLE_ID = "imi-datathon.IMI_Dataset.abm"
+SCHEMA = [FakeField("customer_id", "STRING"), FakeField("amount_cad", "FLOAT"), FakeField("cash_indicator", "BOOLEAN"),
+          FakeField("transaction_date", "DATE")]
+
+
+def make_rows(count):
+    return [{"customer_id": f"SYNCID{row % 7:010d}", "amount_cad": row * 1.5, "cash_indicator": row % 2 == 0,
+             "transaction_date": pd.Timestamp("2023-01-01").date() + pd.Timedelta(days=row % 30)}
+            for row in range(count)]
+
+
+def manifest(output_dir):
+    with open(os.path.join(output_dir, "IMI_Dataset", "abm", BigQueryExport.MANIFEST)) as handle:
+        return json.load(handle)
+
+
+@pytest.fixture(params=[False, True], ids=["rows", "arrow"])
+def arrow(request):
+    return request.param
+
+
+def test_export_reads_back_in_order(tmp_path, arrow):
+    rows = make_rows(35)
+    client = FakeClient([FakeTable(TABLE_ID, SCHEMA, rows)], arrow=arrow)
+
+    result = BigQueryExport.export_table(client, TABLE_ID, tmp_path, page_rows=10)
+
+    assert (result["rows"], result["parts"], result["resumed_from"], result["skipped"]) == (35, 4, 0, False)
+    df = BigQueryExport.read_table(tmp_path, "IMI_Dataset", "abm")
+    assert df["amount_cad"].tolist() == [row["amount_cad"] for row in rows]
+    assert str(df["cash_indicator"].dtype) == "bool"
+
+
+def test_page_types_follow_the_bigquery_schema(tmp_path, arrow):
+    # An INTEGER column whose values arrive as strings is cast, in both page paths.
+    schema = [FakeField("customer_id", "STRING"), FakeField("count", "INTEGER")]
+    rows = [{"customer_id": "a", "count": "1"}, {"customer_id": "b", "count": "2"}]
+    client = FakeClient([FakeTable(TABLE_ID, schema, rows)], arrow=arrow)
+
+    BigQueryExport.export_table(client, TABLE_ID, tmp_path, page_rows=1)
+
+    table = pq.read_table(os.path.join(tmp_path, "IMI_Dataset", "abm"))
+    assert table.schema.field("count").type == pa.int64()
+    assert table.column("count").to_pylist() == [1, 2]
+
+
+def test_failure_mid_table_resumes_at_the_first_missing_row(tmp_path, arrow):
+    rows = make_rows(35)
+    client = FakeClient([FakeTable(TABLE_ID, SCHEMA, rows)], arrow=arrow, fail_after_pages=2)
+
+    with pytest.raises(PageFailure):
+        BigQueryExport.export_table(client, TABLE_ID, tmp_path, page_rows=10)
+    partial = manifest(tmp_path)
+    assert (partial["rows"], len(partial["parts"]), partial["complete"]) == (20, 2, False)
+
+    client.fail_after_pages = None
+    result = BigQueryExport.export_table(client, TABLE_ID, tmp_path, page_rows=10)
+
+    assert client.list_rows_calls[-1] == (TABLE_ID, 20)
+    assert (result["resumed_from"], result["rows"], result["parts"]) == (20, 35, 4)
+    df = BigQueryExport.read_table(tmp_path, "IMI_Dataset", "abm")
+    assert df["amount_cad"].tolist() == [row["amount_cad"] for row in rows]
+
+
+def test_leftover_uncommitted_part_is_removed_on_resume(tmp_path):
+    client = FakeClient([FakeTable(TABLE_ID, SCHEMA, make_rows(30))], fail_after_pages=1)
+    with pytest.raises(PageFailure):
+        BigQueryExport.export_table(client, TABLE_ID, tmp_path, page_rows=10)
+    stray = os.path.join(tmp_path, "IMI_Dataset", "abm", "part-000000000010.parquet")
+    open(stray, "wb").close()
+
+    client.fail_after_pages = None
+    BigQueryExport.export_table(client, TABLE_ID, tmp_path, page_rows=10)
+
+    assert len(BigQueryExport.read_table(tmp_path, "IMI_Dataset", "abm")) == 30
+
+
+def test_changed_row_count_exports_from_scratch(tmp_path, arrow):
+    table = FakeTable(TABLE_ID, SCHEMA, make_rows(35))
+    client = FakeClient([table], arrow=arrow, fail_after_pages=2)
+    with pytest.raises(PageFailure):
+        BigQueryExport.export_table(client, TABLE_ID, tmp_path, page_rows=10)
+
+    table.rows = make_rows(42)
+    client.fail_after_pages = None
+    result = BigQueryExport.export_table(client, TABLE_ID, tmp_path, page_rows=10)
+
+    assert client.list_rows_calls[-1] == (TABLE_ID, 0)
+    assert (result["resumed_from"], result["rows"], result["parts"]) == (0, 42, 5)
+    assert len(BigQueryExport.read_table(tmp_path, "IMI_Dataset", "abm")) == 42
+
+
+def test_completed_table_is_skipped(tmp_path, arrow):
+    client = FakeClient([FakeTable(TABLE_ID, SCHEMA, make_rows(12))], arrow=arrow)
+    BigQueryExport.export_table(client, TABLE_ID, tmp_path, page_rows=10)
+    calls = len(client.list_rows_calls)
+
+    result = BigQueryExport.export_table(client, TABLE_ID, tmp_path, page_rows=10)
+
+    assert result["skipped"] and result["rows"] == 12
+    assert len(client.list_rows_calls) == calls
+
+
+def test_empty_table_keeps_its_schema(tmp_path, arrow):
+    client = FakeClient([FakeTable(TABLE_ID, SCHEMA, [])], arrow=arrow)
+
+    result = BigQueryExport.export_table(client, TABLE_ID, tmp_path)
+
+    assert (result["rows"], result["parts"]) == (0, 1)
+    df = BigQueryExport.read_table(tmp_path, "IMI_Dataset", "abm")
+    assert list(df.columns) == [field.name for field in SCHEMA] and df.empty
+
+
+def test_export_tables_reports_failed_tables_and_finishes_the_rest(tmp_path):
+    other = "imi-datathon.IMI_Dataset.card"
+    client = FakeClient([FakeTable(TABLE_ID, SCHEMA, make_rows(5)), FakeTable(other, SCHEMA, make_rows(5))])
+    table_ids = BigQueryExport.list_table_ids(client, "imi-datathon", tables=["abm", "card"])
+    client.tables[TABLE_ID].schema = [FakeField("amount_cad", "DATE")]  # 1.5 cannot be cast to a date
+
+    results = BigQueryExport.export_tables(client, table_ids, tmp_path, workers=2)
+
+    assert [result["table"] for result in results] == [TABLE_ID, other]
+    assert "error" in results[0] and results[1]["rows"] == 5
@@ -0,0 +1,115 @@
+import types
+
+import pytest
+
+import BiqueryAPI
+from BiqueryAPI import QueryCache, QueryMetrics, cacheable, normalize_sql, run_query
+from fake_bigquery import FakeQueryClient
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1_000_000.0]
+    monkeypatch.setattr(BiqueryAPI.time, "time", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return QueryCache(str(tmp_path), ttl_seconds=60, max_bytes=2**30)
+
+
+def ask(client, cache, query, metrics, **kwargs):
+    return int(run_query(client, query, cache=cache, metrics=metrics, **kwargs)["call"].iloc[0])
+
+
+def test_comment_and_whitespace_variants_share_a_cache_entry(cache):
+    client, metrics = FakeQueryClient(), QueryMetrics()
+    variants = ["SELECT 1\nFROM t", "SELECT 1 -- c\n FROM t", "SELECT 1 # c\nFROM /* x */ t;", "  SELECT 1   FROM t"]
+
+    calls = [ask(client, cache, query, metrics) for query in variants]
+
+    assert calls == [1, 1, 1, 1] and len(client.queries) == 1
+    assert normalize_sql("SELECT '-- #x'  -- c\n FROM t") == "SELECT '-- #x' FROM t"
+
+
+def test_different_parameters_or_job_context_miss(cache, monkeypatch):
+    monkeypatch.setattr(BiqueryAPI, "query_parameters", lambda params: list(params.items()))
+    client, metrics = FakeQueryClient(), QueryMetrics()
+    query = "SELECT * FROM abm WHERE customer_id = @id"
+    config = lambda dataset: types.SimpleNamespace(default_dataset=dataset, query_parameters=None)  # noqa: E731
+
+    ask(client, cache, query, metrics, params={"id": "a"}, job_config=config("imi-datathon.d1"))
+    ask(client, cache, query, metrics, params={"id": "b"}, job_config=config("imi-datathon.d1"))
+    ask(client, cache, query, metrics, params={"id": "a"}, job_config=config("imi-datathon.d2"))
+    ask(FakeQueryClient(project="other"), cache, query, metrics, params={"id": "a"},
+        job_config=config("imi-datathon.d1"))
+    ask(client, cache, query, metrics, params={"id": "a"}, job_config=config("imi-datathon.d1"))
+
+    assert (metrics.misses, metrics.hits) == (4, 1)
+
+
+def test_expired_entries_are_queried_again(cache, clock):
+    client, metrics = FakeQueryClient(), QueryMetrics()
+
+    assert ask(client, cache, "SELECT 1", metrics) == 1
+    clock[0] += 59
+    assert ask(client, cache, "SELECT 1", metrics) == 1
+    clock[0] += 2
+    assert ask(client, cache, "SELECT 1", metrics) == 2
+
+
+def test_least_recently_used_entries_are_evicted(cache, clock):
+    client, metrics = FakeQueryClient(), QueryMetrics()
+    ask(client, cache, "SELECT 1", metrics)
+    entry_bytes = cache.entries()[0][1]["bytes"]
+    cache.max_bytes = int(2.5 * entry_bytes)
+
+    clock[0] += 1
+    ask(client, cache, "SELECT 2", metrics)
+    clock[0] += 1
+    ask(client, cache, "SELECT 1", metrics)  # hit: now the most recently used
+    clock[0] += 1
+    ask(client, cache, "SELECT 3", metrics)  # evicts SELECT 2
+
+    assert sorted(meta["sql"] for _, meta in cache.entries()) == ["SELECT 1", "SELECT 3"]
+    assert ask(client, cache, "SELECT 2", metrics) == len(client.queries)
+
+
+@pytest.mark.parametrize("query", [
+    "INSERT INTO t VALUES (1)",
+    "SELECT CURRENT_DATE",
+    "SELECT current_timestamp() AS now",
+    "SELECT * FROM t WHERE d = CURRENT_DATE()",
+    "SELECT RAND() AS r",
+])
+def test_dml_and_nondeterministic_queries_are_not_stored(cache, query):
+    client, metrics = FakeQueryClient(), QueryMetrics()
+
+    ask(client, cache, query, metrics)
+    ask(client, cache, query, metrics)
+
+    assert len(client.queries) == 2 and metrics.hits == 0
+    assert cache.entries() == []
+
+
+def test_cacheable_ignores_names_in_literals_and_identifiers():
+    assert not cacheable("SELECT CURRENT_DATE")
+    assert not cacheable("SELECT current_datetime()")
+    assert cacheable("SELECT 'CURRENT_DATE', `current_date` FROM t")
+    assert cacheable("SELECT current_date_col FROM t")
+
+
+def test_metrics_count_hits_misses_and_bytes(cache):
+    client, metrics = FakeQueryClient(), QueryMetrics()
+
+    for _ in range(3):
+        ask(client, cache, "SELECT 1", metrics)
+    ask(client, cache, "SELECT 2", metrics)
+    stats = metrics.as_dict()
+
+    assert (stats["hits"], stats["misses"]) == (2, 2)
+    assert stats["hit_rate"] == 0.5
+    assert stats["transfer_bytes"] > 0 and stats["transfer_seconds"] >= 0 and stats["cache_read_seconds"] >= 0
+    metrics.reset()
+    assert metrics.as_dict()["hits"] == 0
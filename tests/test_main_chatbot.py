@@ -0,0 +1,149 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+pytest.importorskip("langchain_experimental")
+pytest.importorskip("langchain_ollama")
+
+from main_chatbot import ResponseCache, answer, dataframe_fingerprint, get_llm, stream_answer  # noqa: E402
+from stub_llm_server import StubLLMServer  # noqa: E402
+
+QUESTION = "How many rows are there?"
+
+
+class ScriptedServer(StubLLMServer):
+    """StubLLMServer answering with ``completions`` in turn (the last one repeats)."""
+
+    def __init__(self, completions, **kwargs):
+        super().__init__(("127.0.0.1", 0), **kwargs)
+        self.completions = completions
+
+    def completion(self):
+        return self.completions[min(self.requests, len(self.completions)) - 1]
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(server=None, **kwargs):
+        server = (server or StubLLMServer(("127.0.0.1", 0), **kwargs)).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def new_state(question=QUESTION):
+    df = pd.DataFrame({"customer_id": ["a", "b", "c"], "amount_cad": [1.0, 2.5, 4.0]})
+    return {"df": df, "df_fingerprint": dataframe_fingerprint(df),
+            "chat_history": [{"role": "user", "content": question}]}
+
+
+def test_stream_yields_tokens_then_the_answer_with_metrics(serve):
+    server = serve(token_delay=0.01)
+
+    events = list(stream_answer(new_state(), QUESTION, llm=get_llm("stub", server.url), model="stub",
+                                cache=ResponseCache()))
+
+    tokens = [event[1] for event in events if event[0] == "token"]
+    assert "Final Answer:" in "".join(tokens)
+    kind, output, metrics = events[-1]
+    assert (kind, output) == ("done", server.answer)
+    assert not metrics["cached"] and metrics["prompt_tokens_est"] > 0
+    assert 0 < metrics["ttft_s"] <= metrics["latency_s"]
+    assert server.requests == 1
+
+
+def test_agent_steps_are_streamed(serve):
+    server = serve(ScriptedServer([
+        "Thought: I should count the rows\nAction: python_repl_ast\nAction Input: print(len(df))",
+        "Thought: I now know the final answer\nFinal Answer: There are 3 rows.",
+    ]))
+
+    events = list(stream_answer(new_state(), QUESTION, llm=get_llm("stub", server.url), model="stub",
+                                cache=ResponseCache()))
+
+    steps = [event[1] for event in events if event[0] == "step"]
+    assert steps[0].startswith("python_repl_ast:")
+    assert steps[1].startswith("observation:") and "3" in steps[1]
+    assert events[-1][:2] == ("done", "There are 3 rows.")
+    assert server.requests == 2
+
+
+def test_answer_returns_the_final_answer_and_metrics(serve):
+    server = serve()
+
+    output, metrics = answer(new_state(), QUESTION, llm=get_llm("stub", server.url), model="stub",
+                             cache=ResponseCache())
+
+    assert output == server.answer
+    assert metrics["latency_s"] >= metrics["ttft_s"] > 0
+
+
+def test_slow_model_times_out(serve):
+    server = serve(delay=3.0)
+    start = time.perf_counter()
+
+    output, metrics = answer(new_state(), QUESTION, llm=get_llm("stub", server.url), model="stub",
+                             cache=ResponseCache(), timeout=0.5)
+
+    assert output == "Timed out after 0.5s."
+    assert metrics["ttft_s"] is None and 0.5 <= metrics["latency_s"] < 2.0
+    assert time.perf_counter() - start < 2.0
+
+
+def test_cancel_event_ends_the_turn(serve):
+    server = serve(delay=3.0)
+    cancel = threading.Event()
+    threading.Timer(0.3, cancel.set).start()
+
+    events = list(stream_answer(new_state(), QUESTION, llm=get_llm("stub", server.url), model="stub",
+                                cache=ResponseCache(), cancel=cancel))
+
+    assert events[-1][:2] == ("error", "Cancelled.")
+    assert events[-1][2]["latency_s"] < 2.0
+
+
+def test_closing_the_stream_early_cancels_the_agent(serve):
+    server = serve(token_delay=0.2)
+    cancel = threading.Event()
+    cache = ResponseCache()
+    stream = stream_answer(new_state(), QUESTION, llm=get_llm("stub", server.url), model="stub", cache=cache,
+                           cancel=cancel)
+
+    assert next(stream)[0] == "token"
+    stream.close()
+
+    assert cancel.is_set()
+    time.sleep(0.5)
+    assert len(cache._entries) == 0
+
+
+def test_repeated_question_is_served_from_the_cache(serve):
+    server = serve()
+    llm, cache = get_llm("stub", server.url), ResponseCache()
+
+    first, _ = answer(new_state(), QUESTION, llm=llm, model="stub", cache=cache)
+    again, metrics = answer(new_state("how many  ROWS are there?"), "how many  ROWS are there?", llm=llm,
+                            model="stub", cache=cache)
+
+    assert again == first and metrics["cached"]
+    assert server.requests == 1 and cache.hits == 1
+
+
+def test_follow_up_in_another_conversation_is_not_a_cache_hit(serve):
+    server = serve()
+    llm, cache = get_llm("stub", server.url), ResponseCache()
+    follow_up = "and for the second one?"
+
+    for earlier in ("Top customers by amount?", "Top provinces by amount?"):
+        state = new_state(earlier)
+        state["chat_history"] += [{"role": "assistant", "content": "..."}, {"role": "user", "content": follow_up}]
+        answer(state, follow_up, llm=llm, model="stub", cache=cache)
+
+    assert server.requests == 2 and cache.hits == 0
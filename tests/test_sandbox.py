@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from sandbox import SharedFrame, attach
+
+
+@pytest.fixture
+def roundtrip():
+    handles = []
+
+    def share(df):
+        frame = SharedFrame(df)
+        shm, shared = attach(frame.spec)
+        handles.append((frame, shm))
+        return shared
+
+    yield share
+    for frame, shm in handles:
+        shm.close()
+        frame.close()
+
+
+def test_dtypes_survive_the_shared_copy(roundtrip):
+    months = pd.Categorical(["Jan", "Mar", "Feb", "Jan"], categories=["Jan", "Feb", "Mar"], ordered=True)
+    df = pd.DataFrame({
+        "month": months,
+        "codes": pd.Categorical([3, 1, None, 3]),
+        "count": pd.array([1, None, 3, 4], dtype="Int8"),
+        "share": pd.array([0.5, None, 1.0, 2.0], dtype="Float64"),
+        "flag": pd.array([True, None, False, True], dtype="boolean"),
+        "label": pd.array(["x", None, "y", "x"], dtype="string"),
+        "when": pd.to_datetime(["2023-01-01"] * 4).tz_localize("UTC"),
+        "amount": [1.0, 2.0, 3.0, 4.0],
+        "city": ["a", None, "b", "a"],
+    }, index=pd.Index(["w", "x", "y", "z"], name="key"))
+
+    shared = roundtrip(df)
+
+    assert shared.dtypes.to_dict() == df.dtypes.to_dict()
+    assert shared.sort_values("month")["month"].tolist() == ["Jan", "Jan", "Feb", "Mar"]
+    assert shared["count"].isna().tolist() == [False, True, False, False] and shared["count"].sum() == 8
+    pd.testing.assert_frame_equal(shared.drop(columns="city"), df.drop(columns="city"))
+    assert shared["city"].tolist()[::2] == ["a", "b"] and pd.isna(shared["city"].iloc[1])
+
+
+def test_shared_columns_are_read_only(roundtrip):
+    shared = roundtrip(pd.DataFrame({"amount": np.arange(4.0), "count": pd.array([1, 2, None, 4], dtype="Int8")}))
+
+    with pytest.raises(ValueError, match="read-only"):
+        shared["amount"].to_numpy()[0] = 9.0
+    with pytest.raises(ValueError, match="read-only"):
+        shared["count"].array._data[0] = 9